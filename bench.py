@@ -0,0 +1,294 @@
+"""Scale benchmarks against simulated BMCs (sim/ipmitool), plus parser checks against recorded output.
+
+    python bench.py                          # 10, 100, 1000 and 5000 nodes
+    python bench.py --nodes 100 --ticks 10 --latency 0.05 --timeout-rate 0.01
+    python bench.py --replay-dir fixtures/   # poll the recorded output of real BMCs instead
+    python bench.py parsers fixtures/ [--update]
+"""
+import argparse
+import glob
+import ipaddress
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIM_DIR = os.path.join(HERE, "sim")
+DEFAULT_SCALES = "10,100,1000,5000"
+SAMPLE_INTERVAL = 0.2   # Seconds between process tree samples
+
+
+def fake_ips(count):
+    """Addresses spread over /24s the way a big site would be (254 hosts each)."""
+    base = int(ipaddress.ip_address("10.0.0.0"))
+    return [str(ipaddress.ip_address(base + (i // 254) * 256 + i % 254 + 1)) for i in range(count)]
+
+
+def process_tree(pid):
+    """Return the pids of a process and all its descendants (Linux /proc)."""
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        for task in glob.glob(f"/proc/{pids[i]}/task/*/children"):
+            try:
+                with open(task) as f:
+                    pids.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        i += 1
+    return pids
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class TreeSampler:
+    """Background thread tracking peak threads, child processes and total RSS of this process tree."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_processes = 0
+        self.peak_rss_kb = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="bench-sampler", daemon=True)
+
+    def sample(self):
+        pids = process_tree(os.getpid())
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+        self.peak_processes = max(self.peak_processes, len(pids) - 1)
+        self.peak_rss_kb = max(self.peak_rss_kb, sum(rss_kb(pid) for pid in pids))
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else None
+
+
+def run_scale(nodes, ticks, interval):
+    """Poll `nodes` simulated BMCs for `ticks` ticks in this process and return the measurements."""
+    import asyncio
+    import ipmi
+    from ipmi_sched import PollScheduler
+    from ipmi_sdr import SdrCache
+
+    ipmi.sdr_cache = SdrCache(cache_dir=tempfile.mkdtemp(prefix="ipmi-bench-sdr-"))
+    ip_list = fake_ips(nodes)
+    status_func = ipmi.get_cpu_temps
+    frames = []
+    latencies = []
+    errors = 0
+
+    cpu_start = cpu_seconds()
+    with TreeSampler() as sampler:
+        # First tick opens every session and downloads every SDR
+        start = time.perf_counter()
+        cold = ipmi.fetch_data_in_parallel(ip_list, status_func)
+        cold_latency = time.perf_counter() - start
+        cold_errors = sum(1 for text in cold.values() if "Error" in text)
+
+        # No stagger, so a tick's latency is the work itself rather than the spread across the interval
+        scheduler = PollScheduler(ipmi.fetch_engine, interval=interval, stagger=False)
+
+        def render(tick, results):
+            nonlocal errors
+            # Same frame the block redraw builds, so rendering is part of the tick
+            lines = []
+            for ip in ip_list:
+                ok, result = results.get(ip, (True, "Waiting for first reading..."))
+                errors += not ok
+                lines.append(f"{ip}:\n{ipmi.format_fetch_result(ok, result)}\n{'-' * 40}")
+            frames.append("\n".join(lines))
+            latencies.append(loop.time() - (tick_zero + tick * interval))
+
+        async def poll():
+            nonlocal loop, tick_zero
+            loop = asyncio.get_running_loop()
+            tick_zero = loop.time()
+            await scheduler.run(ip_list, status_func, on_tick_done=render, ticks=ticks)
+
+        loop = tick_zero = None
+        asyncio.run(poll())
+        ipmi.shutdown()
+    own_cpu, child_cpu = cpu_seconds()
+
+    return {
+        'nodes': nodes,
+        'ticks': len(latencies),
+        'cold_tick_s': round(cold_latency, 3),
+        'cold_errors': cold_errors,
+        'tick_p50_s': round(percentile(latencies, 50), 3) if latencies else None,
+        'tick_max_s': round(max(latencies), 3) if latencies else None,
+        'errors': errors,
+        'overruns': scheduler.overruns,
+        'skipped_ticks': scheduler.skipped_ticks,
+        'sensor_reads': ipmi.sampler.reads,
+        'sensor_reads_skipped': ipmi.sampler.skips,
+        'cpu_self_s': round(own_cpu - cpu_start[0], 2),
+        'cpu_children_s': round(child_cpu - cpu_start[1], 2),
+        'peak_rss_self_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_rss_tree_mb': round(sampler.peak_rss_kb / 1024, 1),
+        'peak_threads': sampler.peak_threads,
+        'peak_processes': sampler.peak_processes,
+    }
+
+
+def sim_env(args):
+    env = dict(os.environ)
+    env['PATH'] = SIM_DIR + os.pathsep + env.get('PATH', "")
+    env['IPMI_SIM_STATE_DIR'] = tempfile.mkdtemp(prefix="ipmi-bench-state-")
+    env['IPMI_SIM_LATENCY'] = str(args.latency)
+    env['IPMI_SIM_JITTER'] = str(args.jitter)
+    env['IPMI_SIM_TIMEOUT_RATE'] = str(args.timeout_rate)
+    env['IPMI_SIM_PROFILE'] = args.profile
+    if args.replay_dir:
+        env['IPMI_SIM_REPLAY_DIR'] = os.path.abspath(args.replay_dir)
+    return env
+
+
+def failures(r, ticks, interval):
+    """Return why a scale did not hold up: errors, overruns, skipped or missing ticks, ticks slower than the interval."""
+    reasons = []
+    if r['cold_errors'] or r['errors']:
+        reasons.append(f"{r['cold_errors'] + r['errors']} errors")
+    if r['overruns']:
+        reasons.append(f"{r['overruns']} overruns")
+    if r['skipped_ticks']:
+        reasons.append(f"{r['skipped_ticks']} ticks skipped")
+    if r['ticks'] < ticks:
+        reasons.append(f"{r['ticks']}/{ticks} ticks finished")
+    if r['tick_p50_s'] is not None and r['tick_p50_s'] > interval:
+        reasons.append(f"tick p50 {r['tick_p50_s']}s over the {interval}s interval")
+    return reasons
+
+
+def run_benchmarks(args):
+    """Run each scale in its own process so peak memory and CPU are not carried over; returns 1 if any failed."""
+    results = []
+    failed = False
+    header = (f"{'nodes':>6} {'cold s':>8} {'tick p50':>9} {'tick max':>9} {'errors':>7} {'overrun':>8} "
+              f"{'cpu self':>9} {'cpu sim':>8} {'rss MB':>8} {'tree MB':>8} {'threads':>8} {'procs':>6}  result")
+    print(header)
+    for nodes in [int(n) for n in args.nodes.split(",")]:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", str(nodes),
+                   "--ticks", str(args.ticks), "--interval", str(args.interval)]
+        proc = subprocess.run(command, env=sim_env(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+        if proc.returncode != 0:
+            failed = True
+            print(f"{nodes:>6} FAIL: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            results.append({'nodes': nodes, 'failures': [f"worker exited with {proc.returncode}"]})
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        r['failures'] = failures(r, args.ticks, args.interval)
+        failed = failed or bool(r['failures'])
+        results.append(r)
+        print(f"{r['nodes']:>6} {r['cold_tick_s']:>8} {r['tick_p50_s']!s:>9} {r['tick_max_s']!s:>9} "
+              f"{r['errors']:>7} {r['overruns']:>8} {r['cpu_self_s']:>9} {r['cpu_children_s']:>8} "
+              f"{r['peak_rss_self_mb']:>8} {r['peak_rss_tree_mb']:>8} {r['peak_threads']:>8} {r['peak_processes']:>6}  "
+              f"{'FAIL: ' + ', '.join(r['failures']) if r['failures'] else 'ok'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+def check_parsers(directory, update=False):
+    """Run the output parsers over every recording and compare with the stored expectations."""
+    from ipmi_sensors import parse_sdr_elist
+    from ipmi_snapshot import parse_power_status
+
+    parsers = {
+        "chassis power status": lambda out: parse_power_status(out),
+        "sdr elist full": lambda out: [record.to_dict() for record in parse_sdr_elist(out).values()],
+    }
+    failures = 0
+    checked = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*", "*.json"))):
+        if path.endswith(".expected.json"):
+            continue
+        with open(path) as f:
+            recording = json.load(f)
+        parser = parsers.get(recording['command'])
+        if parser is None:
+            continue
+        # Round-trip through JSON so tuples and dict keys compare the way they are stored
+        parsed = json.loads(json.dumps(parser(recording['stdout'])))
+        expected_path = path[:-len(".json")] + ".expected.json"
+        checked += 1
+        if update or not os.path.exists(expected_path):
+            with open(expected_path, 'w') as f:
+                json.dump(parsed, f, indent=1, sort_keys=True)
+            continue
+        with open(expected_path) as f:
+            expected = json.load(f)
+        if parsed != expected:
+            failures += 1
+            print(f"MISMATCH {recording['host']} '{recording['command']}':\n  expected {expected}\n  got      {parsed}")
+    print(f"{checked} recordings checked, {failures} mismatches")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["parsers"]:
+        parser = argparse.ArgumentParser(prog="bench.py parsers")
+        parser.add_argument("directory", help="Directory recorded with IPMI_SIM_RECORD_DIR")
+        parser.add_argument("--update", action="store_true", help="Rewrite the expected results")
+        args = parser.parse_args(argv[1:])
+        return check_parsers(args.directory, args.update)
+
+    parser = argparse.ArgumentParser(description="Poll simulated BMCs at several fleet sizes and report the cost.")
+    parser.add_argument("--nodes", default=DEFAULT_SCALES, help=f"Comma separated fleet sizes (default {DEFAULT_SCALES})")
+    parser.add_argument("--ticks", type=int, default=5, help="Warm ticks to measure after the first one (default 5)")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between ticks (default 2)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated seconds per BMC command")
+    parser.add_argument("--jitter", type=float, default=0.002, help="Extra random latency per command")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of commands that time out")
+    parser.add_argument("--profile", default="supermicro", help="supermicro, dell, hpe or mixed")
+    parser.add_argument("--replay-dir", help="Serve recorded BMC output instead of generated readings")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_scale(args.worker, args.ticks, args.interval)))
+        return 0
+    return run_benchmarks(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,49 @@
-import subprocess
-import ipaddress
 import os  # For clearing the screen
 import sys
-import termios
-import tty
-import select  # For non-blocking input checking
-from colorama import Fore, Style, init
-import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import asyncio
+import argparse
+import shutil
+from ipmi_adaptive import MAX_INTERVAL, AdaptiveSampler
+from ipmi_alerts import ALERT_RULES_PATH, CRITICAL, WARNING, AlertEngine, load_rules, make_sink
+from ipmi_daemon import DAEMON_SOCKET, MIN_REFRESH, DaemonClient, DaemonTrustError
+from ipmi_discovery import (INVENTORY_PATH, PING_RATE, PING_TIMEOUT, RMCP_PORT, expand_range_spec, ip_sort_key,
+                            iter_range_spec, load_inventory, parse_mc_info, ping_sweep, save_inventory)
+from ipmi_fetch import FetchEngine, subnet_of
+from ipmi_fleet import FLEET_TOP, FleetFrame
+from ipmi_history import HistoryStore, TimeSeriesStore
+from ipmi_power import CONFIRM_TIMEOUT, POWER_BATCH_SIZE, POWER_STAGGER, BulkPowerAction, summarize_power_results
+from ipmi_sched import PollScheduler
+from ipmi_session import SESSIONS_PER_SLOT, SessionPool
+from ipmi_ssh import SSH_COMMAND_TIMEOUT, SSH_MAX_CONCURRENT, SshPool
+from ipmi_sdr import SdrCache
+from ipmi_sel import SelTailer, active_events
+from ipmi_sensors import records_by_role
+from ipmi_state import STATE_PATH, WarmState
+from ipmi_stats import latency, profile_report
+from ipmi_snapshot import POWER_COMMAND, NodeSnapshot, PowerCache, parse_power_status, take_snapshot
 
-# Initialize colorama for cross-platform compatibility
-init(autoreset=True)
+# colorama and the full-screen / HTTP modules are imported on first use so one-shot CLI runs start fast
+COLOR_ENABLED = True
+
+def _colorama():
+    import colorama
+    return colorama
+
+class _LazyColor:
+    """Stands in for colorama's Fore / Style, importing colorama the first time a color is used."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        if not COLOR_ENABLED:
+            return ""
+        return getattr(getattr(_colorama(), self.name), attr)
+
+Fore = _LazyColor("Fore")
+Style = _LazyColor("Style")
 
 # Set your IPMI credentials here
 IPMI_USER = "ADMIN"         # Username for IPMI access
@@ -20,104 +52,147 @@ IPMI_PASSWORD = "ADMIN"     # Password for IPMI access
 PASTEL_PINK = "\033[38;5;207m"  # Define pastel pink color
 RESET_COLOR = "\033[0m"  # Reset to default terminal color
 
+fetch_engine = FetchEngine()  # Bounded concurrency no matter how many BMCs are in the range
+# Persistent lanplus sessions shared by every status function, a few per fetch slot kept open
+session_pool = SessionPool(IPMI_USER, IPMI_PASSWORD, max_sessions=fetch_engine.max_in_flight * SESSIONS_PER_SLOT)
+power_cache = PowerCache()
+sdr_cache = SdrCache()  # On-disk SDR per BMC so polls read sensors by number
+history = HistoryStore()  # Ring buffer per (host, sensor); main() adds the on-disk store
+sampler = AdaptiveSampler()  # Stable sensors are re-read less often, down to once a minute
+sel_tailer = SelTailer()  # New System Event Log records per BMC, read incrementally on every poll
+alerts = AlertEngine()  # Threshold rules evaluated on every fresh reading; main() loads the rules and sinks
+ssh_pool = SshPool()  # CVM / AHV / Prism Central commands, one multiplexed SSH connection per host
+profile = False  # --profile: break every tick down by phase and name the slowest BMCs
+stats_json = None  # --stats-json: where the latency histograms are written on exit
+daemon = None  # DaemonClient when a shared polling daemon is running; all BMC I/O then goes through it
+daemon_max_age = MIN_REFRESH  # Oldest daemon snapshot accepted, raised to the poll interval by watch / exporter
+warm_state = None  # WarmState loaded by main() unless --cold; shutdown() saves what this run learned into it
+warm_snapshots = {}  # ip -> last run's snapshot (all sensors stale), shown until the node's first fresh reading
+latest_snapshots = {}  # ip -> newest snapshot this run, for the next run's first screen
+
 def run_ipmitool_command(ip, command):
-    """Runs an ipmitool command for a specific IP address and returns the output."""
+    """Runs an ipmitool command for a specific IP address over its persistent session and returns the output."""
     try:
-        full_command = f"ipmitool -I lanplus -H {ip} -U {IPMI_USER} -P {IPMI_PASSWORD} {command}"
-        result = subprocess.run(full_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode == 0:
-            return result.stdout.decode('utf-8')
+        with latency.timer('ipmitool', ip, command):
+            stdout, stderr, ok = session_pool.run(ip, command)
+        if ok:
+            return stdout
         else:
-            return f"{Fore.RED}Error on {ip}: {result.stderr.decode('utf-8')}"
+            return f"{Fore.RED}Error on {ip}: {stderr}"
     except Exception as e:
         return f"{Fore.RED}Exception occurred on {ip}: {str(e)}"
 
-def get_temperature_color(temp_value):
-    """Return a color based on the temperature range."""
-    return PASTEL_PINK  # Use pastel pink for all temperatures
+def get_temperature_color(temp_value, level=None):
+    """Return a color based on the temperature range: red when critical, yellow when warning, else pastel pink.
 
-def parse_temperature(temp_str):
-    """Extract temperature value from a string using regex and convert to int."""
-    temp_match = re.search(r"(\d+)\s*degrees", temp_str)
-    if temp_match:
-        try:
-            return int(temp_match.group(1))  # Return temperature value
-        except (IndexError, ValueError):
-            return None
-    return None
-
-def parse_fan_speed(fan_str):
-    """Extract fan speed value from a string using regex and convert to int."""
-    fan_match = re.search(r"(\d+)\s*RPM", fan_str)
-    if fan_match:
-        try:
-            return int(fan_match.group(1))  # Return fan speed value
-        except (IndexError, ValueError):
-            return None
-    return None
+    level is the sensor's alert level; without it the value is judged by the default temperature rule.
+    """
+    if level is None:
+        level = alerts.classify('temp', temp_value)
+    return level_color(level)
+
+def level_color(level):
+    if level == CRITICAL:
+        return Fore.RED
+    if level == WARNING:
+        return Fore.YELLOW
+    return PASTEL_PINK
+
+def alert_suffix(level, reason):
+    """Return ' LEVEL (reason)' for an alerting reading, or ''."""
+    return f" {level.upper()} ({reason})" if reason else ""
+
+def get_node_snapshot(ip):
+    """Get power state, temperatures and fan speeds for a node in one batched request."""
+    if daemon is not None:
+        snapshot = NodeSnapshot.from_dict(daemon.request("snapshot", ip=ip, max_age=daemon_max_age))
+    else:
+        snapshot = take_snapshot(session_pool, power_cache, ip, sdr_cache, sampler, sel_tailer)
+        snapshot.events = sel_tailer.recent_events(ip)
+    history.record_snapshot(snapshot)
+    alerts.observe_snapshot(snapshot)
+    latest_snapshots[ip] = snapshot
+    return snapshot
+
+def get_node_events(ip):
+    """SEL events of a node: new ones since the last call, or its recent ones when served by the daemon."""
+    if daemon is not None:
+        return get_node_snapshot(ip).events
+    return sel_tailer.poll(session_pool, ip)
+
+def sel_marks(snapshot, sensor_type):
+    """One line per SEL event still asserted on a sensor of this type, or on the node's power."""
+    lines = ""
+    for event in active_events(snapshot.events):
+        if event.sensor_type == sensor_type or event.kind == 'power':
+            when = time.strftime("%H:%M:%S", time.localtime(event.timestamp)) if event.timestamp else "Pre-Init"
+            lines += f"{Fore.YELLOW}SEL {when} {event.sensor}: {event.description}\n"
+    return lines
+
+def node_error_text(ip, snapshot):
+    """Error line for a node, shown as unreachable right away once its circuit has tripped."""
+    down = session_pool.health.describe(ip)
+    if down:
+        return f"{Fore.RED}{down}"
+    return f"{Fore.RED}Error on {ip}: {snapshot.error}"
 
 def check_power_status(ip):
-    """Check if the node is powered on or off."""
-    power_status = run_ipmitool_command(ip, "chassis power status")
-    if "off" in power_status.lower():
-        return False
-    return True
+    """Check if the node is powered on or off, using the cached state while it is fresh."""
+    power = power_cache.get(ip)
+    if power is None:
+        power = get_node_snapshot(ip).power
+    return power is not False
 
 def get_cpu_temps(ip):
-    """Get CPU1 and CPU2 temperatures using IPMI for a specific IP and format the output."""
-    if not check_power_status(ip):
-        return f"{Fore.RED}Node Powered Off"
-
-    output = run_ipmitool_command(ip, "sdr type temperature")
-    cpu_temps = {}
-    for line in output.splitlines():
-        if "CPU1" in line or "CPU 1" in line:
-            cpu_temps['CPU1'] = line.strip()
-        elif "CPU2" in line or "CPU 2" in line:
-            cpu_temps['CPU2'] = line.strip()
-    
-    if not cpu_temps:
-        return f"{Fore.RED}CPU1 and CPU2 temperatures not found."
+    """Get every temperature sensor (CPUs first) using IPMI for a specific IP and format the output."""
+    return format_cpu_temps(ip, get_node_snapshot(ip))
 
-    # Simplified formatting for CPU temperature display with pastel pink
-    formatted_output = ""
-    
-    for cpu_label, temp_info in cpu_temps.items():
-        temp_value = parse_temperature(temp_info)
-        if temp_value is not None:
-            temp_color = get_temperature_color(temp_value)
-            formatted_output += f"{Fore.GREEN}{cpu_label:<10}: {temp_color}{temp_value} Celsius{RESET_COLOR}\n"
+def format_cpu_temps(ip, snapshot):
+    marks = sel_marks(snapshot, "Temperature")
+    if snapshot.power is False:
+        return f"{marks}{Fore.RED}Node Powered Off"
+    if snapshot.error:
+        return node_error_text(ip, snapshot)
+
+    temps = records_by_role(snapshot.records, 'temp')
+    if not temps:
+        return f"{marks}{Fore.RED}No temperature sensors found."
+
+    formatted_output = marks
+    for record in temps:
+        if record.value is not None:
+            level, reason = alerts.level(ip, record.name)
+            temp_color = get_temperature_color(record.value, level)
+            formatted_output += (f"{Fore.GREEN}{record.label:<16}: {temp_color}{record.value:.0f} Celsius"
+                                 f"{alert_suffix(level, reason)}{RESET_COLOR}\n")
         else:
-            formatted_output += f"{Fore.RED}{cpu_label:<10}: No Valid Temp\n"
-    
+            formatted_output += f"{Fore.RED}{record.label:<16}: No Valid Temp\n"
     return formatted_output
 
 def get_fan_speeds(ip):
-    """Get FAN1 and FAN2 fan speeds using IPMI for a specific IP and format the output."""
-    if not check_power_status(ip):
-        return f"{Fore.RED}Node Powered Off"
-
-    output = run_ipmitool_command(ip, "sdr type fan")
-    fan_speeds = {}
-    for line in output.splitlines():
-        if "FAN1" in line or "Fan 1" in line:
-            fan_speeds['FAN1'] = line.strip()
-        elif "FAN2" in line or "Fan 2" in line:
-            fan_speeds['FAN2'] = line.strip()
-    
-    if not fan_speeds:
-        return f"{Fore.RED}FAN1 and FAN2 fan speeds not found."
+    """Get every fan sensor using IPMI for a specific IP and format the output."""
+    return format_fan_speeds(ip, get_node_snapshot(ip))
 
-    # Simplified formatting for Fan Speed display with pastel pink
-    formatted_output = ""
-    
-    for fan_label, fan_info in fan_speeds.items():
-        fan_speed = parse_fan_speed(fan_info)
-        if fan_speed is not None:
-            formatted_output += f"{Fore.GREEN}{fan_label:<10}: {PASTEL_PINK}{fan_speed} RPM{RESET_COLOR}\n"
+def format_fan_speeds(ip, snapshot):
+    marks = sel_marks(snapshot, "Fan")
+    if snapshot.power is False:
+        return f"{marks}{Fore.RED}Node Powered Off"
+    if snapshot.error:
+        return node_error_text(ip, snapshot)
+
+    fans = records_by_role(snapshot.records, 'fan')
+    if not fans:
+        return f"{marks}{Fore.RED}No fan sensors found."
+
+    formatted_output = marks
+    for record in fans:
+        if record.value is not None:
+            unit = "%" if record.unit == "percent" else " RPM"
+            level, reason = alerts.level(ip, record.name)
+            formatted_output += (f"{Fore.GREEN}{record.label:<16}: {level_color(level)}{record.value:.0f}{unit}"
+                                 f"{alert_suffix(level, reason)}{RESET_COLOR}\n")
         else:
-            formatted_output += f"{Fore.RED}{fan_label:<10}: No Valid Fan Speed\n"
-    
+            formatted_output += f"{Fore.RED}{record.label:<16}: No Valid Fan Speed\n"
     return formatted_output
 
 def power_action(ip, action):
@@ -131,82 +206,720 @@ def power_action(ip, action):
     
     if action in power_commands:
         result = run_ipmitool_command(ip, power_commands[action])
+        power_cache.invalidate(ip)  # The cached state is stale once the chassis is told to change
+        sampler.forget(ip)  # Readings from before the action say nothing about the node afterwards
         return result.strip()
     else:
         return f"{Fore.RED}Invalid power action"
 
+def send_power_action(ip, action):
+    """Send a power action and return (ok, detail) for the bulk power engine."""
+    if daemon is not None:
+        ok, result = daemon.request("power", ip=ip, action=action)
+        return ok, result
+    result = power_action(ip, action)
+    ok = not result.startswith((f"{Fore.RED}Error on", f"{Fore.RED}Exception occurred", f"{Fore.RED}Invalid"))
+    return ok, result
+
+def get_power_state(ip):
+    """Read the chassis power state straight from the BMC, refreshing the cache."""
+    if daemon is not None:
+        return daemon.request("power_state", ip=ip)
+    stdout, stderr, ok = session_pool.run(ip, POWER_COMMAND)
+    if not ok:
+        raise RuntimeError(stderr.strip() or "No response")
+    power = parse_power_status(stdout)
+    power_cache.set(ip, power)
+    return power
+
+def run_bulk_power_action(ip_list, action, on_result=None, **options):
+    """Send a power action in staggered batches and wait for every node to reach the target state."""
+    bulk = BulkPowerAction(fetch_engine, send_power_action, get_power_state, **options)
+    return asyncio.run(bulk.run(ip_list, action, on_result))
+
 def perform_power_action(ip_list, action):
-    """Perform the selected power action on all servers in parallel."""
-    results = fetch_data_in_parallel(ip_list, lambda ip: power_action(ip, action))
-    for ip, result in results.items():
-        print(f"{Fore.CYAN}{ip}: {result}")
+    """Perform the selected power action on all servers in staggered batches and confirm the result."""
+    def on_result(result):
+        state = "unknown" if result.state is None else ("ON" if result.state else "OFF")
+        if result.converged:
+            print(f"{Fore.CYAN}{result.ip}: {Fore.GREEN}{state} after {result.latency:.1f}s")
+        elif result.done:
+            print(f"{Fore.CYAN}{result.ip}: {Fore.YELLOW}{result.detail}")
+        else:
+            print(f"{Fore.CYAN}{result.ip}: {Fore.RED}{state} - {result.detail}")
         print("-" * 40)
 
+    results = run_bulk_power_action(ip_list, action, on_result)
+    print(f"{Fore.YELLOW}{summarize_power_results(results)}")
+
 def fetch_data_in_parallel(ip_list, status_func):
-    """Fetch data (temperature, fan speeds, power) from servers in parallel."""
+    """Fetch data (temperature, fan speeds, power) from servers in parallel through the bounded fetch engine."""
     results = {}
-    with ThreadPoolExecutor(max_workers=len(ip_list)) as executor:
-        futures = {executor.submit(status_func, ip): ip for ip in ip_list}
-        for future in as_completed(futures):
-            ip = futures[future]
-            try:
-                results[ip] = future.result()
-            except Exception as e:
-                results[ip] = f"{Fore.RED}Error occurred: {str(e)}"
+    for ip, (ok, result) in fetch_engine.fetch_all(ip_list, status_func).items():
+        results[ip] = format_fetch_result(ok, result)
     return results
 
-def display_real_time_output(ip_list, status_func, description):
-    """Displays real-time output for CPU temperatures or fan speeds, refreshing every 2 seconds."""
+def format_fetch_result(ok, result):
+    """Turn a fetch engine (ok, result) pair into display text."""
+    if ok:
+        return result
+    return f"{Fore.RED}Error occurred: {str(result)}"
+
+def format_age(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.0f}h"
+
+def last_known(ip):
+    """The node's newest snapshot from this run, else from the last run (stale), else None."""
+    return latest_snapshots.get(ip) or warm_snapshots.get(ip)
+
+def warm_view(ip_list, formatter):
+    """{ip: text} of the last known readings, marked with their age, for the first screen of a live view."""
+    now = time.time()
+    view = {}
+    for ip in ip_list:
+        snapshot = last_known(ip)
+        if snapshot is not None:
+            view[ip] = (f"{Fore.YELLOW}Last known, {format_age(now - snapshot.timestamp)} old; refreshing...\n"
+                        f"{formatter(ip, snapshot)}")
+    return view
+
+async def run_live_view(ip_list, status_func, description, scheduler, initial=None):
+    """Full-screen view where each node's row is redrawn as soon as its own result arrives."""
+    from ipmi_render import LiveRenderer
+    with LiveRenderer(ip_list, description, show_panel=profile) as renderer:
+        for ip, text in (initial or {}).items():
+            renderer.update(ip, text)
+        def on_result(tick, ip, ok, result):
+            renderer.update(ip, format_fetch_result(ok, result))
+
+        def on_tick_done(tick, results):
+            renderer.set_status(f"tick {tick}  overruns {scheduler.last_tick_overruns}/{scheduler.overruns}  "
+                                f"skipped ticks {scheduler.skipped_ticks}  {sensor_reads_saved()}  {alerts.summary()}")
+            renderer.set_panel(stats_panel(tick))
+
+        poller = asyncio.ensure_future(scheduler.run(ip_list, status_func, on_result, on_tick_done))
+        quitter = asyncio.ensure_future(renderer.wait())
+        try:
+            await asyncio.wait([poller, quitter], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            poller.cancel()
+            quitter.cancel()
+        if poller.done() and not poller.cancelled() and poller.exception():
+            raise poller.exception()
+
+def display_real_time_output(ip_list, status_func, description, initial=None):
+    """Displays real-time output for CPU temperatures or fan speeds, refreshing every 2 seconds.
+
+    initial ({ip: text}, e.g. from warm_view) is shown until each node's first reading arrives.
+    """
     previous_lines = 0
+    latest = dict(initial or {})  # Last result per IP, kept when a slow node is skipped for a tick
 
-    # Sort the IP list by the last octet for consistent output order
-    sorted_ip_list = sorted(ip_list, key=lambda ip: int(ip.split('.')[-1]))
+    # Sort the IP list numerically for consistent output order
+    sorted_ip_list = sorted(ip_list, key=ip_sort_key)
 
     # Print the static header once
     print(f"{Fore.CYAN}Real-Time {description} Readings\n")
-    print(f"Press CTRL-C to return to the menu.\n")
+    print(f"Press CTRL-C (or q in a terminal) to return to the menu.\n")
 
-    try:
-        while True:
-            # Move the cursor up to the previous data block and overwrite it
-            if previous_lines > 0:
-                sys.stdout.write(f"\033[{previous_lines}F")  # Move cursor to the top of previous output
-            
-            # Fetch data in parallel
-            results = fetch_data_in_parallel(sorted_ip_list, status_func)
-            
-            # Print new output and count the number of lines printed
-            previous_lines = 0  # Reset line counter
-            for ip in sorted_ip_list:  # Ensure the order is maintained during output
-                result = results[ip]  # Print the result in the same order as sorted IPs
-                sys.stdout.write(f"{Fore.CYAN}{ip}:\n")
-                sys.stdout.write(result + "\n")
-                sys.stdout.write("-" * 40 + "\n")
-                previous_lines += result.count('\n') + 3  # Each block has 3 lines (header, content, divider)
-            
-            time.sleep(2)  # Refresh every 2 seconds
+    scheduler = PollScheduler(fetch_engine, interval=2)  # Refresh every 2 seconds, without drift
+
+    def redraw(tick, results):
+        with latency.timer('render'):
+            draw(tick, results)
+
+    def draw(tick, results):
+        nonlocal previous_lines
+        for ip, (ok, result) in results.items():
+            latest[ip] = format_fetch_result(ok, result)
+
+        # Move the cursor up to the previous data block and overwrite it
+        if previous_lines > 0:
+            sys.stdout.write(f"\033[{previous_lines}F")  # Move cursor to the top of previous output
+
+        # Print new output and count the number of lines printed
+        previous_lines = 0  # Reset line counter
+        for ip in sorted_ip_list:  # Ensure the order is maintained during output
+            result = latest.get(ip, "Waiting for first reading...\n")
+            sys.stdout.write(f"{Fore.CYAN}{ip}:\n")
+            sys.stdout.write(result + "\n")
+            sys.stdout.write("-" * 40 + "\n")
+            previous_lines += result.count('\n') + 3  # Each block has 3 lines (header, content, divider)
+
+        # Report nodes still busy from an earlier tick and ticks the loop had to drop
+        sys.stdout.write(f"{Fore.YELLOW}Overruns this tick: {scheduler.last_tick_overruns:<6} "
+                         f"Total overruns: {scheduler.overruns:<6} Skipped ticks: {scheduler.skipped_ticks:<6} "
+                         f"{sensor_reads_saved()} {alerts.summary()}\n")
+        previous_lines += 1
+        if profile:
+            for line in stats_panel(tick):
+                sys.stdout.write(f"{Fore.MAGENTA}{line}\n")
+                previous_lines += 1
+        sys.stdout.flush()
 
+    try:
+        if sys.stdin.isatty() and sys.stdout.isatty():
+            asyncio.run(run_live_view(sorted_ip_list, status_func, description, scheduler, latest))
+        else:
+            if latest:
+                redraw(0, {})  # The last run's readings right away, fresh ones replace them on the first tick
+            asyncio.run(scheduler.run(sorted_ip_list, status_func, on_tick_done=redraw))
     except KeyboardInterrupt:
         pass  # Handle CTRL-C gracefully
 
     # Clear screen before returning to the menu
     os.system('clear')
 
+def sensor_reads_saved():
+    """Share of sensor reads adaptive sampling has skipped so far (the daemon's, when connected to one)."""
+    reads, skips = sampler.reads, sampler.skips
+    if daemon is not None:
+        try:
+            stats = daemon.request("stats")
+            reads, skips = stats.get('sensor_reads', 0), stats.get('sensor_skips', 0)
+        except (OSError, RuntimeError):
+            pass
+    total = reads + skips
+    return f"Sensor reads saved: {100 * skips / total:.0f}%" if total else "Sensor reads saved: 0%"
+
+def stats_panel(tick):
+    """Latency panel lines: this tick's phase breakdown first when profiling, then the running histograms."""
+    lines = latency.panel_lines()
+    if profile:
+        lines.insert(0, profile_report(tick, *latency.take_window()))
+    return lines
+
+def show_latency_stats():
+    """Print the latency histograms per phase and per command, slowest hosts last."""
+    summary = latency.to_dict(buckets=False)
+    for phase, commands in summary['commands'].items():
+        for command, stats in sorted(commands.items(), key=lambda item: item[1]['p95'], reverse=True):
+            print(f"{Fore.GREEN}{phase:<10} {command:<24}: {PASTEL_PINK}n={stats['count']:<7} "
+                  f"p50 {stats['p50'] * 1000:.1f}ms  p95 {stats['p95'] * 1000:.1f}ms  "
+                  f"max {stats['max'] * 1000:.1f}ms{RESET_COLOR}")
+    for line in latency.panel_lines():
+        print(f"{Fore.CYAN}{line}")
+
+def configure_sampler(interval, max_interval):
+    """Match the sampler's floor to the poll interval; a ceiling at or below it turns adaptive sampling off."""
+    global daemon_max_age
+    daemon_max_age = interval
+    sampler.min_interval = interval
+    sampler.max_interval = max(interval, max_interval)
+
+def show_history(ip_list, minutes):
+    """Print min/max/mean/p95 per sensor over the last minutes, from the in-memory history."""
+    since = time.time() - minutes * 60
+    for ip in sorted(ip_list, key=ip_sort_key):
+        print(f"{Fore.CYAN}{ip}:")
+        series = history.series(ip)
+        if not series:
+            print(f"{Fore.RED}No readings recorded yet.")
+        for _, sensor in series:
+            stats = history.stats(ip, sensor, since)
+            if stats is None:
+                continue
+            print(f"{Fore.GREEN}{sensor:<16}: {PASTEL_PINK}min {stats['min']:.0f}  max {stats['max']:.0f}  "
+                  f"mean {stats['mean']:.1f}  p95 {stats['p95']:.0f}  ({stats['count']} samples){RESET_COLOR}")
+        print("-" * 40)
+
+def shutdown():
+    """Save the warm-start state, close BMC sessions, SSH connections, the worker pool and the history files."""
+    if stats_json:
+        try:
+            latency.dump(stats_json)
+        except OSError as e:
+            print(f"Could not write latency stats: {e}", file=sys.stderr)
+    if warm_state is not None:
+        try:
+            warm_state.capture(session_pool, sdr_cache, latest_snapshots)
+            warm_state.save()
+        except OSError as e:
+            print(f"Could not save the warm-start state: {e}", file=sys.stderr)
+    session_pool.close_all()  # Close the lanplus sessions instead of leaving them to time out
+    ssh_pool.close_all()
+    fetch_engine.shutdown()
+    if history.disk is not None:
+        history.disk.close()
+
 def show_menu():
     """Display the action menu and return the selected option."""
     print(f"{Fore.CYAN}\nMenu:")
     print(f"{Fore.YELLOW}1. View Server Power Status")
-    print(f"{Fore.YELLOW}2. View Real-Time Server Temperatures (CPU1 and CPU2)")
+    print(f"{Fore.YELLOW}2. View Real-Time Server Temperatures")
     print(f"{Fore.YELLOW}3. View Real-Time Server Fan Speeds")
     print(f"{Fore.YELLOW}4. Power Action (on, off, reset, cycle)")
-    print(f"{Fore.YELLOW}5. Exit")
+    print(f"{Fore.YELLOW}5. View Sensor History (min/max/mean over the last minutes)")
+    print(f"{Fore.YELLOW}6. View Latency Stats (per phase, command and BMC)")
+    print(f"{Fore.YELLOW}7. Fleet Summary (aggregates and heatmap by rack)")
+    print(f"{Fore.YELLOW}8. Exit")
     
     choice = input(f"{Fore.GREEN}Select an option: ").strip()
     return choice
 
-def main():
-    ip_range_str = input(f"{Fore.GREEN}Enter the IP range (e.g., 192.168.1.100-105, 192.168.1.108-110): ")
-    
+def run_exporter(ip_range_str, address, port, interval):
+    """Exporter mode: poll in the background and serve the cached snapshot on /metrics."""
+    from ipmi_exporter import EXPORTER_ADDRESS, EXPORTER_PORT, serve_metrics
+    address = address or EXPORTER_ADDRESS
+    port = port or EXPORTER_PORT
+    ip_list = get_ip_range_from_string(ip_range_str)
+    if not ip_list:
+        print(f"{Fore.RED}No valid IP addresses found in the range.")
+        return
+    scheduler = PollScheduler(fetch_engine, interval=interval)
+    print(f"{Fore.CYAN}Serving metrics for {len(ip_list)} nodes on http://{address}:{port}/metrics")
+    try:
+        serve_metrics(scheduler, ip_list, get_node_snapshot, address, port, sampler)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+
+def snapshot_record(snapshot, fields):
+    """Turn a NodeSnapshot into an NDJSON record with the requested fields."""
+    record = {'ip': snapshot.ip, 'power': None if snapshot.power is None else ("on" if snapshot.power else "off")}
+    if 'temps' in fields:
+        record['temps'] = snapshot.temps
+    if 'fans' in fields:
+        record['fans'] = snapshot.fans
+        record['fan_units'] = snapshot.fan_units
+    record['error'] = snapshot.error
+    record['timestamp'] = snapshot.timestamp
+    return record
+
+def write_record(record, ok=True):
+    """Write one NDJSON line (green/red when --color is on) and flush it right away."""
+    line = json.dumps(record)
+    if COLOR_ENABLED:
+        line = f"{Fore.GREEN if ok else Fore.RED}{line}{Style.RESET_ALL}"
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+def stream_records(ip_list, status_func, to_record, ordered=False):
+    """Run status_func on every node and write each node's record as soon as it is ready.
+
+    With ordered=True records come out in IP range order, each one as soon as
+    every node before it has answered. Returns the number of failed nodes.
+    """
+    position = {ip: i for i, ip in enumerate(ip_list)}
+    waiting = {}
+    next_index = 0
+    failures = 0
+
+    async def run():
+        nonlocal next_index, failures
+        async for ip, ok, result in fetch_engine.iter_results(ip_list, status_func):
+            record, record_ok = to_record(ip, ok, result)
+            failures += 0 if record_ok else 1
+            if not ordered:
+                write_record(record, record_ok)
+                continue
+            waiting[position[ip]] = (record, record_ok)
+            while next_index in waiting:
+                write_record(*waiting.pop(next_index))
+                next_index += 1
+
+    asyncio.run(run())
+    return failures
+
+def cli_snapshot_record(fields):
+    def to_record(ip, ok, result):
+        if not ok:
+            return {'ip': ip, 'power': None, 'error': str(result)}, False
+        return snapshot_record(result, fields), result.error is None
+    return to_record
+
+def run_watch(ip_list, interval, fields, ordered):
+    """Stream a snapshot record per node per tick until interrupted."""
+    scheduler = PollScheduler(fetch_engine, interval=interval)
+    to_record = cli_snapshot_record(fields)
+
+    def on_result(tick, ip, ok, result):
+        if not ordered:
+            record, record_ok = to_record(ip, ok, result)
+            write_record(dict(record, tick=tick), record_ok)
+
+    def on_tick_done(tick, results):
+        if ordered:
+            for ip in ip_list:
+                if ip in results:
+                    record, record_ok = to_record(ip, *results[ip])
+                    write_record(dict(record, tick=tick), record_ok)
+        if profile:
+            print(profile_report(tick, *latency.take_window()), file=sys.stderr)
+
+    try:
+        asyncio.run(scheduler.run(ip_list, get_node_snapshot, on_result, on_tick_done))
+    except KeyboardInterrupt:
+        pass
+
+def fleet_group_of(group_by):
+    """Group key per node: its inventory 'rack' (falling back to its /24), or just its /24 subnet."""
+    if group_by == "subnet":
+        return subnet_of
+    racks = {ip: entry.get('rack') for ip, entry in load_inventory().items()}
+    return lambda ip: racks.get(ip) or subnet_of(ip)
+
+def temp_limits():
+    """(warning, critical) of the default temperature alert rule, for the heatmap shades."""
+    rule = alerts.default_rule('temp')
+    warning, critical = rule.limits() if rule is not None else (None, None)
+    return warning if warning is not None else 80, critical if critical is not None else 90
+
+def fleet_lines(frame, summary, warning, critical):
+    """Screen lines of the fleet summary: spread of readings, outliers, then the heatmap per group."""
+    def spread(stats):
+        if stats is None:
+            return "no readings"
+        return f"min {stats['min']:.0f}  mean {stats['mean']:.1f}  p95 {stats['p95']:.0f}  max {stats['max']:.0f}"
+
+    def sensors(entries):
+        parts = []
+        for entry in entries:
+            value = "-" if entry['value'] is None else f"{entry['value']:.0f}"
+            if entry['value'] is not None and entry['unit'] == "percent":
+                value += "%"
+            parts.append(f"{entry['ip']} {entry['sensor']} {value}")
+        return ", ".join(parts) or "none"
+
+    lines = [
+        f"{Fore.CYAN}Nodes {summary['nodes']}  reporting {summary['reporting']}  powered on {summary['powered_on']}",
+        f"{Fore.GREEN}CPU temp : {PASTEL_PINK}{spread(summary['cpu_temp'])}{RESET_COLOR}",
+        f"{Fore.GREEN}Fan speed: {PASTEL_PINK}{spread(summary['fan_rpm'])}{RESET_COLOR}",
+    ]
+    if summary['fan_duty'] is not None:
+        lines.append(f"{Fore.GREEN}Fan duty : {PASTEL_PINK}{spread(summary['fan_duty'])} %{RESET_COLOR}")
+    lines += [
+        f"{Fore.GREEN}Hottest  : {sensors(summary['hottest_cpus'])}",
+        f"{Fore.GREEN}Slowest  : {sensors(summary['slowest_fans'])}",
+        f"{Fore.RED if summary['stalled_count'] else Fore.GREEN}Stalled  : {summary['stalled_count']}"
+        f"{' (' + sensors(summary['stalled_fans']) + ')' if summary['stalled_count'] else ''}",
+        "",
+    ]
+    width = max(16, shutil.get_terminal_size().columns - 40)
+    return lines + frame.heatmap_lines(warning, critical, width=width, color=COLOR_ENABLED)
+
+def run_fleet(ip_list, interval, group_by="rack", top=FLEET_TOP, ticks=None, screen=False):
+    """Fleet summary: every tick the latest readings are aggregated as a whole.
+
+    On screen the summary and the heatmap are redrawn each tick; otherwise one
+    NDJSON record per tick is written. Returns False if NumPy is missing.
+    """
+    try:
+        frame = FleetFrame(sorted(ip_list, key=ip_sort_key), fleet_group_of(group_by))
+    except ImportError:
+        print(f"{Fore.RED}The fleet summary needs NumPy (pip install numpy).", file=sys.stderr)
+        return False
+    warning, critical = temp_limits()
+    scheduler = PollScheduler(fetch_engine, interval=interval)
+
+    def on_result(tick, ip, ok, result):
+        frame.update(ip, result if ok else None)
+
+    def draw(tick, summary, status):
+        with latency.timer('render'):
+            lines = fleet_lines(frame, summary, warning, critical)
+            lines.append(f"{Fore.YELLOW}{status}  (CTRL-C to return)")
+            if profile and tick is not None:
+                lines += [f"{Fore.MAGENTA}{line}" for line in stats_panel(tick)]
+            sys.stdout.write("\033[H\033[J" + "\n".join(lines) + "\n")
+            sys.stdout.flush()
+
+    def on_tick_done(tick, results):
+        with latency.timer('aggregate'):
+            summary = frame.aggregate(top)
+        if screen:
+            draw(tick, summary, f"tick {tick}  overruns {scheduler.overruns}  {sensor_reads_saved()}  "
+                                f"{alerts.summary()}")
+            return
+        hot = summary['cpu_temp'] is not None and summary['cpu_temp']['max'] >= critical
+        write_record(dict(summary, tick=tick), not hot and not summary['stalled_count'])
+        if profile:
+            print(profile_report(tick, *latency.take_window()), file=sys.stderr)
+
+    if screen:
+        known = [ip for ip in ip_list if last_known(ip) is not None]
+        for ip in known:
+            frame.update(ip, last_known(ip))
+        if known:
+            draw(None, frame.aggregate(top), f"Last known readings of {len(known)} nodes; refreshing...")
+    try:
+        asyncio.run(scheduler.run(ip_list, get_node_snapshot, on_result, on_tick_done, ticks=ticks))
+    except KeyboardInterrupt:
+        pass
+    if screen:
+        os.system('clear')
+    return True
+
+def run_events(ip_list, interval):
+    """Stream the fleet's SEL events, merged in BMC time order per poll, until interrupted."""
+    scheduler = PollScheduler(fetch_engine, interval=interval)
+    seen = {}  # ip -> keys of the events already written
+
+    def on_tick_done(tick, results):
+        events = []
+        for ip, (ok, result) in results.items():
+            if not ok:
+                continue
+            keys = {(event.record_id, event.timestamp, event.description) for event in result}
+            events += [event for event in result
+                       if (event.record_id, event.timestamp, event.description) not in seen.get(ip, ())]
+            seen[ip] = keys
+        events.sort(key=lambda event: (event.timestamp or 0, event.ip, event.record_id or 0))
+        for event in events:
+            critical = event.kind == 'fan_failure' or event.severity in ('cr', 'nr')
+            write_record(event.to_dict(), not (critical and event.asserted))
+
+    try:
+        asyncio.run(scheduler.run(ip_list, get_node_events, on_tick_done=on_tick_done))
+    except KeyboardInterrupt:
+        pass
+
+def run_power_command(ip_list, args):
+    """Bulk power action with one record per node once it converges (or gives up)."""
+    def on_result(result):
+        if not args.ordered:
+            write_record(result.to_dict(), result.done)
+
+    results = run_bulk_power_action(ip_list, args.action, on_result, batch_size=args.batch_size,
+                                    stagger=args.stagger, confirm_timeout=args.timeout)
+    if args.ordered:
+        for ip in ip_list:
+            write_record(results[ip].to_dict(), results[ip].done)
+    print(summarize_power_results(results), file=sys.stderr)
+    return sum(1 for result in results.values() if not result.done)
+
+def run_ssh_command(ip_list, args):
+    """Run one shell command on every host over pooled SSH, one record per host with its exit status."""
+    global ssh_pool
+    password = os.environ.get(args.password_env) if args.password_env else None
+    ssh_pool = SshPool(password, max_concurrent=args.max_concurrent)
+
+    def on_line(ip, line):
+        print(f"{ip}: {line}", file=sys.stderr, flush=True)
+
+    position = {ip: i for i, ip in enumerate(ip_list)}
+    waiting = {}
+    next_index = 0
+    failures = 0
+    for ip, status, output in ssh_pool.iter_run(ip_list, args.user, args.remote_command,
+                                                on_line=on_line if args.stream else None, timeout=args.timeout):
+        record = {'ip': ip, 'user': args.user, 'exit_status': status, 'output': output}
+        failures += 0 if status == 0 else 1
+        if not args.ordered:
+            write_record(record, status == 0)
+            continue
+        waiting[position[ip]] = (record, status == 0)
+        while next_index in waiting:
+            write_record(*waiting.pop(next_index))
+            next_index += 1
+    return failures
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="IPMI status and power control for cluster nodes. Without a command, the interactive menu starts.")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help=f"Polling daemon socket (default {DAEMON_SOCKET})")
+    parser.add_argument("--no-daemon", dest="use_daemon", action="store_false",
+                        help="Talk to the BMCs directly even if a polling daemon is running")
+    parser.add_argument("--profile", action="store_true",
+                        help="Break every tick (or the whole run) down by phase and name the slowest BMCs, on stderr")
+    parser.add_argument("--stats-json", metavar="PATH", help="Write per-host, per-command latency histograms here on exit")
+    parser.add_argument("--state", default=STATE_PATH,
+                        help=f"Warm-start state: last range, negotiated BMC settings, last readings ({STATE_PATH})")
+    parser.add_argument("--cold", dest="warm", action="store_false",
+                        help="Start from nothing: neither read nor update the warm-start state")
+    parser.add_argument("--alert-rules", default=ALERT_RULES_PATH, help=f"Alert rules file (default {ALERT_RULES_PATH})")
+    parser.add_argument("--alert-sink", action="append", default=[],
+                        help="Also send alerts to: syslog, http(s)://URL (webhook), file:PATH or - (stderr); repeatable")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    def add_command(name, help_text, *leading):
+        command = commands.add_parser(name, help=help_text)
+        for positional, options in leading:
+            command.add_argument(positional, **options)
+        command.add_argument("ip_range", help="IP range, e.g. 192.168.1.100-105,10.1.0.0/24, or 'inventory'")
+        command.add_argument("--ordered", action="store_true", help="Write records in IP range order")
+        command.add_argument("--color", action="store_true", help="Color records green (ok) / red (error)")
+        return command
+
+    add_command("power-status", "Chassis power state per node")
+    add_command("temps", "Temperature readings per node")
+    add_command("fans", "Fan readings per node")
+    power = add_command("power", "Run a power action on every node and confirm the resulting state",
+                        ("action", {'choices': ["on", "off", "reset", "cycle"]}))
+    power.add_argument("--batch-size", type=int, default=POWER_BATCH_SIZE, help="Nodes switched together")
+    power.add_argument("--stagger", type=float, default=POWER_STAGGER, help="Seconds between batches")
+    power.add_argument("--timeout", type=float, default=CONFIRM_TIMEOUT,
+                       help="Seconds each node gets to reach the target state")
+    watch = add_command("watch", "Stream power, temperatures and fans every interval")
+    watch.add_argument("--interval", type=float, default=2, help="Seconds between polls")
+    watch.add_argument("--max-sensor-interval", type=float, default=MAX_INTERVAL,
+                       help="Longest a stable sensor goes unread (default 60; set to --interval to read every poll)")
+
+    fleet = add_command("fleet", "Aggregate the whole fleet every interval: spread, hottest CPUs, slow fans, per group")
+    fleet.add_argument("--interval", type=float, default=2, help="Seconds between polls")
+    fleet.add_argument("--group-by", choices=["rack", "subnet"], default="rack",
+                       help="Group by the inventory's 'rack' field (falling back to the /24) or by /24 subnet")
+    fleet.add_argument("--top", type=int, default=FLEET_TOP, help="Hottest CPUs / slowest fans listed")
+    fleet.add_argument("--once", action="store_true", help="Write one summary and exit")
+    fleet.add_argument("--max-sensor-interval", type=float, default=MAX_INTERVAL,
+                       help="Longest a stable sensor goes unread (default 60; set to --interval to read every poll)")
+
+    events = add_command("events", "Stream new System Event Log records of every node, merged in time order")
+    events.add_argument("--interval", type=float, default=2, help="Seconds between SEL checks")
+
+    ssh = add_command("ssh", "Run a shell command on every host (CVM, AHV, Prism Central) over pooled SSH",
+                      ("remote_command", {'help': "Command line to run, quoted as one argument"}))
+    ssh.add_argument("--user", default="root", help="SSH user (default root; nutanix for CVMs)")
+    ssh.add_argument("--password-env", help="Environment variable holding the password (default: key authentication)")
+    ssh.add_argument("--max-concurrent", type=int, default=SSH_MAX_CONCURRENT, help="Hosts running the command at once")
+    ssh.add_argument("--timeout", type=float, default=SSH_COMMAND_TIMEOUT, help="Seconds the command may run per host")
+    ssh.add_argument("--stream", action="store_true", help="Also print every output line on stderr as it arrives")
+
+    exporter = commands.add_parser("exporter", help="Serve the latest readings on a Prometheus /metrics endpoint")
+    exporter.add_argument("ip_range", help="IP range, e.g. 192.168.1.100-105,10.1.0.0/24, or 'inventory'")
+    exporter.add_argument("--listen", help="Listen address (default 127.0.0.1)")
+    exporter.add_argument("--port", type=int, help="Listen port (default 9290)")
+    exporter.add_argument("--interval", type=float, default=2, help="Seconds between polls")
+    exporter.add_argument("--max-sensor-interval", type=float, default=MAX_INTERVAL,
+                          help="Longest a stable sensor goes unread (default 60; set to --interval to read every poll)")
+    discover = commands.add_parser("discover", help="Find BMCs with RMCP presence pings and save them to the inventory")
+    discover.add_argument("ip_range", help="Addresses to scan, e.g. 10.1.0.0/16,10.2.1.10-200")
+    discover.add_argument("--timeout", type=float, default=PING_TIMEOUT, help="Seconds to wait for replies")
+    discover.add_argument("--rate", type=int, default=PING_RATE, help="Pings per second")
+    discover.add_argument("--port", type=int, default=RMCP_PORT, help="RMCP UDP port (default 623)")
+    discover.add_argument("--inventory", default=INVENTORY_PATH, help="Inventory file to update")
+    discover.add_argument("--no-identify", dest="identify", action="store_false",
+                          help="Don't ask each BMC for its vendor (no credentials needed)")
+    discover.add_argument("--user", help="IPMI user to store for the hosts found")
+    discover.add_argument("--password-env", help="Environment variable holding that user's password")
+    daemon_command = commands.add_parser("daemon", help="Own all BMC I/O and serve snapshots to every other ipmi.py")
+    daemon_command.add_argument("--min-refresh", type=float, default=MIN_REFRESH,
+                                help="Seconds a snapshot is reused for, however many clients ask (default 2)")
+    daemon_command.add_argument("--max-sensor-interval", type=float, default=MAX_INTERVAL,
+                                help="Longest a stable sensor goes unread (default 60)")
+    daemon_command.add_argument("--status", action="store_true", help="Print the running daemon's counters and exit")
+    return parser
+
+def run_command(args):
+    """Headless mode: run one subcommand and write NDJSON records. Returns the exit status."""
+    global COLOR_ENABLED
+
+    if args.command in ("watch", "exporter", "fleet"):
+        configure_sampler(args.interval, args.max_sensor_interval)
+    if args.command == "exporter":
+        COLOR_ENABLED = False   # Its output ends up in logs / journald
+        run_exporter(args.ip_range, args.listen, args.port, args.interval)
+        return 0
+    if args.command == "discover":
+        COLOR_ENABLED = False
+        try:
+            return run_discover(args)
+        finally:
+            shutdown()
+    if args.command == "daemon":
+        COLOR_ENABLED = False
+        return run_daemon(args)
+
+    COLOR_ENABLED = args.color
+    try:
+        ip_list = get_ip_range_from_string(args.ip_range)
+    except ValueError as e:
+        print(f"Error parsing IP range: {e}", file=sys.stderr)
+        return 2
+    if not ip_list:
+        print("No valid IP addresses found in the range.", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "power-status":
+            failures = stream_records(ip_list, get_node_snapshot, cli_snapshot_record(()), args.ordered)
+        elif args.command == "temps":
+            failures = stream_records(ip_list, get_node_snapshot, cli_snapshot_record(('temps',)), args.ordered)
+        elif args.command == "fans":
+            failures = stream_records(ip_list, get_node_snapshot, cli_snapshot_record(('fans',)), args.ordered)
+        elif args.command == "power":
+            failures = run_power_command(ip_list, args)
+        elif args.command == "fleet":
+            if not run_fleet(ip_list, args.interval, args.group_by, args.top, ticks=1 if args.once else None):
+                return 2
+            failures = 0
+        elif args.command == "ssh":
+            failures = run_ssh_command(ip_list, args)
+        elif args.command == "events":
+            run_events(ip_list, args.interval)
+            failures = 0
+        else:
+            if daemon is None:  # Otherwise the daemon keeps the on-disk history
+                try:
+                    history.disk = TimeSeriesStore()
+                except OSError as e:
+                    print(f"History will not be saved to disk: {e}", file=sys.stderr)
+            run_watch(ip_list, args.interval, ('temps', 'fans'), args.ordered)
+            failures = 0
+        if profile and args.command in ("power-status", "temps", "fans", "power", "ssh"):
+            print(profile_report("run", *latency.take_window()), file=sys.stderr)
+            for line in latency.panel_lines():
+                print(line, file=sys.stderr)
+    finally:
+        shutdown()
+    return 1 if failures else 0
+
+def connect_daemon(path):
+    """Send all BMC I/O through the polling daemon if one is listening on path; returns True if so."""
+    global daemon
+    client = DaemonClient(path)
+    try:
+        if client.available():
+            daemon = client
+    except DaemonTrustError as e:
+        print(f"Not using the polling daemon: {e}", file=sys.stderr)
+    return daemon is not None
+
+def configure_alerts(rules_path, sink_specs):
+    """Load the alert rules (the defaults if there is no rules file) and attach the sinks."""
+    rules = load_rules(rules_path)
+    if rules is not None:
+        alerts.set_rules(rules)
+    alerts.sinks = [make_sink(spec) for spec in sink_specs]
+
+def main(argv=None):
+    global profile, stats_json, warm_state, warm_snapshots
+    args = build_parser().parse_args(argv)
+    profile, stats_json = args.profile, args.stats_json
+    if args.warm:
+        # Cipher suites, shell support and SDR keys learned by earlier runs; the first poll skips re-learning them
+        warm_state = WarmState(args.state).load()
+        warm_state.restore(session_pool, sdr_cache)
+    try:
+        configure_alerts(args.alert_rules, args.alert_sink)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Alert configuration: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.use_daemon and args.command not in ("daemon", "discover", "ssh") and connect_daemon(args.socket):
+        print(f"Using the polling daemon at {args.socket}", file=sys.stderr)
+    if args.command:
+        sys.exit(run_command(args))
+
+    # Initialize colorama for cross-platform compatibility
+    _colorama().init(autoreset=True)
+
+    if daemon is None:  # Otherwise the daemon keeps the on-disk history
+        try:
+            history.disk = TimeSeriesStore()
+        except OSError as e:
+            print(f"{Fore.YELLOW}History will not be saved to disk: {e}")
+
+    last_range = warm_state.ip_range if warm_state is not None else None
+    default = f"the last range, {last_range}" if last_range else "the inventory"
+    ip_range_str = input(f"{Fore.GREEN}Enter the IP range (e.g., 192.168.1.100-105, 10.1.0.0/24; Enter for {default}): ")
+    if not ip_range_str.strip() and last_range:
+        ip_range_str = last_range
+
     try:
         ip_list = get_ip_range_from_string(ip_range_str)
         if not ip_list:
@@ -215,6 +928,9 @@ def main():
     except Exception as e:
         print(f"{Fore.RED}Error parsing IP range: {e}")
         return
+    if warm_state is not None:
+        warm_state.ip_range = ip_range_str.strip() or "inventory"
+        warm_snapshots = warm_state.stale_snapshots(ip_list)
 
     while True:
         choice = show_menu()
@@ -222,19 +938,24 @@ def main():
         if choice == '1':
             # View server power status
             print(f"{Fore.CYAN}Gathering power status in parallel...")
-            results = fetch_data_in_parallel(ip_list, check_power_status)
-            for ip, result in results.items():
-                status = "ON" if result else "OFF"
+            results = fetch_data_in_parallel(ip_list, get_node_snapshot)
+            for ip, snapshot in results.items():
+                if isinstance(snapshot, str):
+                    status = snapshot
+                elif snapshot.power is None:
+                    status = f"{Fore.RED}UNKNOWN ({snapshot.error})"
+                else:
+                    status = "ON" if snapshot.power else "OFF"
                 print(f"{Fore.CYAN}{ip}: {status}")
                 print("-" * 40)
 
         elif choice == '2':
-            # View real-time server temperatures for CPU1 and CPU2 using a Python loop
-            display_real_time_output(ip_list, get_cpu_temps, "CPU Temperature")
+            # View real-time server temperatures using a Python loop
+            display_real_time_output(ip_list, get_cpu_temps, "Temperature", warm_view(ip_list, format_cpu_temps))
 
         elif choice == '3':
             # View real-time server fan speeds using a Python loop
-            display_real_time_output(ip_list, get_fan_speeds, "Fan Speed")
+            display_real_time_output(ip_list, get_fan_speeds, "Fan Speed", warm_view(ip_list, format_fan_speeds))
 
         elif choice == '4':
             # Power action menu
@@ -258,32 +979,107 @@ def main():
                 print(f"{Fore.RED}Invalid option.")
 
         elif choice == '5':
+            minutes = input(f"{Fore.GREEN}Minutes of history to summarize [10]: ").strip() or "10"
+            try:
+                show_history(ip_list, float(minutes))
+            except ValueError:
+                print(f"{Fore.RED}Invalid number of minutes.")
+
+        elif choice == '6':
+            show_latency_stats()
+
+        elif choice == '7':
+            run_fleet(ip_list, 2, screen=True)
+
+        elif choice == '8':
             print(f"{Fore.CYAN}Exiting...")
+            shutdown()
             break
 
         else:
             print(f"{Fore.RED}Invalid option. Please select a valid option.")
 
 def get_ip_range_from_string(ip_range_str):
-    """Parse an IP range string and return a list of IP addresses."""
-    ip_list = []
-    ranges = ip_range_str.split(',')
-    
-    for ip_range in ranges:
-        ip_range = ip_range.strip()  # Remove leading/trailing spaces
-        if '-' in ip_range:
-            start_ip, end_ip = ip_range.split('-')
-            start_ip = ipaddress.IPv4Address(start_ip.strip())
-            if '.' not in end_ip:
-                end_ip = ipaddress.IPv4Address(f"{start_ip.exploded.rsplit('.', 1)[0]}.{end_ip.strip()}")
-            else:
-                end_ip = ipaddress.IPv4Address(end_ip.strip())
-            for ip in range(int(start_ip), int(end_ip) + 1):
-                ip_list.append(str(ipaddress.IPv4Address(ip)))
-        else:
-            ip_list.append(ip_range.strip())
-    
-    return ip_list
+    """Parse an IP range string (dash ranges, CIDR, single addresses) into sorted, deduplicated IP addresses.
+
+    "inventory" (or nothing at all) stands for the BMCs in the discovery inventory.
+    """
+    if ip_range_str.strip() in ("", "inventory"):
+        return use_inventory()
+    return expand_range_spec(ip_range_str)
+
+def use_inventory(path=INVENTORY_PATH):
+    """Return the inventory's BMCs and hand their credentials to the session pool."""
+    hosts = load_inventory(path)
+    for ip, entry in hosts.items():
+        if entry.get('user'):
+            session_pool.set_credentials(ip, entry['user'], entry.get('password', IPMI_PASSWORD))
+    return sorted(hosts, key=ip_sort_key)
+
+def identify_host(ip):
+    """Ask a BMC who made it; returns (manufacturer id, vendor, sensor profile)."""
+    stdout, _, ok = session_pool.run_oneshot(ip, "mc info")
+    return parse_mc_info(stdout) if ok else (None, None, None)
+
+def run_daemon(args):
+    """Daemon mode: poll the BMCs on behalf of every client connected to the socket."""
+    if args.status:
+        try:
+            print(json.dumps(DaemonClient(args.socket).request("stats", latency=True)))
+            return 0
+        except (OSError, RuntimeError) as e:
+            print(f"No daemon on {args.socket}: {e}", file=sys.stderr)
+            return 1
+
+    from ipmi_daemon import SnapshotService, serve
+    configure_sampler(args.min_refresh, args.max_sensor_interval)
+    use_inventory()  # Clients may ask for any host; those in the inventory get their stored credentials
+    try:
+        history.disk = TimeSeriesStore()
+    except OSError as e:
+        print(f"History will not be saved to disk: {e}", file=sys.stderr)
+    service = SnapshotService(fetch_engine, get_node_snapshot, send_power_action, get_power_state,
+                              args.min_refresh, sampler)
+    print(f"Starting the polling daemon on {args.socket}", file=sys.stderr)
+    try:
+        asyncio.run(serve(service, args.socket))
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        shutdown()
+    return 0
+
+def run_discover(args):
+    """Ping-sweep a range for BMCs, identify them and merge them into the inventory file."""
+    start = time.monotonic()
+    found = ping_sweep(iter_range_spec(args.ip_range), timeout=args.timeout, rate=args.rate, port=args.port)
+    live = sorted((ip for ip, supported in found.items() if supported), key=ip_sort_key)
+    print(f"{len(live)} BMCs answered in {time.monotonic() - start:.1f}s", file=sys.stderr)
+
+    password = os.environ.get(args.password_env) if args.password_env else None
+    if args.user:
+        for ip in live:
+            session_pool.set_credentials(ip, args.user, password or IPMI_PASSWORD)
+    identified = fetch_engine.fetch_all(live, identify_host) if args.identify else {}
+
+    inventory = load_inventory(args.inventory)
+    for ip in live:
+        entry = inventory.setdefault(ip, {})
+        entry['last_seen'] = time.time()
+        if args.user:
+            entry['user'] = args.user
+            if password:
+                entry['password'] = password
+        ok, result = identified.get(ip, (False, None))
+        if ok and result[0] is not None:
+            entry['manufacturer_id'], entry['vendor'], entry['profile'] = result
+        write_record(dict({'ip': ip}, **{key: value for key, value in entry.items() if key != 'password'}))
+    save_inventory(inventory, args.inventory)
+    print(f"Inventory: {args.inventory} ({len(inventory)} hosts)", file=sys.stderr)
+    return 0
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
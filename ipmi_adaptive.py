@@ -0,0 +1,148 @@
+import threading
+import time
+
+MIN_INTERVAL = 2.0      # Floor: never read a sensor more often than the poll cadence
+MAX_INTERVAL = 60.0     # Ceiling: even a flat-lined sensor is read once a minute
+BACKOFF = 1.5           # Interval growth per stable reading
+DUE_SLACK = 0.5         # Seconds early a sensor may be read, so tick jitter doesn't push it a whole tick late
+
+# kind -> (change that counts as "moving", limit or None, margin, True if the limit is an upper bound)
+SENSOR_LIMITS = {
+    'temp': (2.0, 80.0, 10.0, True),    # degrees C; fast polling from 70 C up, 1 C flicker is noise
+    'fan': (300.0, 800.0, 500.0, False),  # RPM; fast polling from 1300 RPM down
+    # Percent duty (HPE): the BMC sets it, a low duty is a cool node rather than a failing fan
+    'fan percent': (10.0, None, 0.0, False),
+}
+
+
+def limits_key(record):
+    """SENSOR_LIMITS key of a record: its kind, with the unit for fans that report duty rather than RPM."""
+    if record.kind == 'fan' and record.unit == "percent":
+        return 'fan percent'
+    return record.kind
+
+
+class SensorState:
+    __slots__ = ('kind', 'record', 'value', 'time', 'interval', 'next_due')
+
+    def __init__(self, kind, interval):
+        self.kind = kind
+        self.record = None      # Last SensorRecord, handed out again while the sensor is not due
+        self.value = None
+        self.time = None
+        self.interval = interval
+        self.next_due = 0.0
+
+
+class AdaptiveSampler:
+    """Per (host, sensor) read intervals that back off while a reading is stable.
+
+    A sensor's interval grows by BACKOFF after every reading that barely moved,
+    up to max_interval, and drops back to min_interval as soon as the reading
+    jumps or gets within the margin of its limit. A steady rate of change
+    shortens the interval so the change between two reads stays small.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, backoff=BACKOFF, limits=None):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.limits = dict(SENSOR_LIMITS)
+        self.limits.update(limits or {})
+        self.states = {}    # ip -> {sensor name: SensorState}
+        self.reads = 0      # Sensor readings taken
+        self.skips = 0      # Sensor readings saved by backing off
+        self.lock = threading.Lock()
+
+    def due(self, ip, name, now=None):
+        """True if the sensor should be read on this poll."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self.states.get(ip, {}).get(name)
+            if state is None or now + DUE_SLACK >= state.next_due:
+                self.reads += 1
+                return True
+            self.skips += 1
+            return False
+
+    def node_due(self, ip, now=None):
+        """True if any sensor of the node is due (for BMCs that can only be read all at once)."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            sensors = self.states.get(ip)
+            due = not sensors or any(now + DUE_SLACK >= s.next_due for s in sensors.values())
+            if due:
+                self.reads += len(sensors or ()) or 1
+            else:
+                self.skips += len(sensors)
+            return due
+
+    def next_interval(self, state, value, now, thresholds=None):
+        change, limit, margin, upper = self.limits.get(state.kind, (None, None, None, True))
+        if thresholds:
+            # The BMC's own non-critical threshold beats the generic default
+            limit = thresholds.get('unc' if upper else 'lnc', limit)
+        if change is None:
+            # No notion of "moving" for this kind (voltages, discrete sensors): just back off
+            return min(self.max_interval, state.interval * self.backoff)
+        if limit is not None and ((value >= limit - margin) if upper else (value <= limit + margin)):
+            return self.min_interval
+        if state.value is None:
+            return self.min_interval
+        delta = abs(value - state.value)
+        if delta >= change:
+            return self.min_interval
+        interval = state.interval * self.backoff
+        elapsed = now - state.time
+        if delta and elapsed > 0:
+            # Read often enough that the next change stays below the threshold at the current rate
+            interval = min(interval, change / (delta / elapsed))
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def observe(self, ip, record, now=None):
+        """Record a fresh SensorRecord and schedule the sensor's next read.
+
+        A failed read (no value) makes the sensor due again on the next poll;
+        last() keeps handing out the last good record meanwhile, for at most
+        max_interval, as long as a stable sensor's value is held anyway.
+        """
+        now = time.monotonic() if now is None else now
+        value = record.value
+        with self.lock:
+            sensors = self.states.setdefault(ip, {})
+            state = sensors.get(record.name)
+            if state is None:
+                state = sensors[record.name] = SensorState(limits_key(record), self.min_interval)
+            if value is None:
+                state.interval = self.min_interval
+                state.next_due = 0.0
+                if state.time is None or now - state.time > self.max_interval:
+                    state.record = record
+                return
+            state.interval = self.next_interval(state, value, now, record.thresholds)
+            state.next_due = now + state.interval
+            state.record = record
+            state.value = value
+            state.time = now
+
+    def last(self, ip):
+        """Return {sensor name: last SensorRecord} for a node."""
+        with self.lock:
+            return {name: s.record for name, s in self.states.get(ip, {}).items()}
+
+    def forget(self, ip):
+        """Drop a node's state, e.g. when it powers off, so every sensor is read on the next poll."""
+        with self.lock:
+            self.states.pop(ip, None)
+
+    def wake(self, ip, name=None):
+        """Make a sensor (or, for an unknown name, every sensor of the node) due on the next poll."""
+        with self.lock:
+            sensors = self.states.get(ip, {})
+            for state in [sensors[name]] if name in sensors else sensors.values():
+                state.interval = self.min_interval
+                state.next_due = 0.0
+
+    def intervals(self, ip):
+        with self.lock:
+            return {name: s.interval for name, s in self.states.get(ip, {}).items()}
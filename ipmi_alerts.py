@@ -0,0 +1,333 @@
+import json
+import os
+import queue
+import re
+import sys
+import threading
+from ipmi_discovery import expand_range_spec
+
+ALERT_RULES_PATH = os.path.expanduser("~/.config/ntnx-cluster/alerts.json")
+WEBHOOK_TIMEOUT = 5     # Seconds per webhook POST
+WEBHOOK_QUEUE = 1000    # Alerts waiting for the webhook before new ones are dropped
+RATE_WINDOW = 60        # Seconds the rate of change is measured over, so reading noise doesn't look like a trend
+
+OK = "ok"
+WARNING = "warning"
+CRITICAL = "critical"
+LEVELS = (OK, WARNING, CRITICAL)
+
+# Used when there is no rules file. The BMC's own thresholds (UNC/UCR, LNC/LCR) replace
+# warning/critical for every sensor that has them.
+DEFAULT_RULES = (
+    {'name': "temperature", 'kind': 'temp', 'warning': 80, 'critical': 90, 'hysteresis': 3, 'rate': 5},
+    {'name': "fan", 'kind': 'fan', 'unit': "RPM", 'direction': 'low', 'warning': 700, 'critical': 500,
+     'hysteresis': 150},
+)
+
+# Which BMC thresholds stand for warning / critical, per direction
+BMC_THRESHOLDS = {'high': ('unc', 'ucr'), 'low': ('lnc', 'lcr')}
+
+
+class AlertRule:
+    """Warning / critical levels for the sensors it matches, with hysteresis, rate of change and debounce.
+
+    `hosts` (a range spec, e.g. "10.1.1.0/24") limits the rule to a node group;
+    `kind`, `role`, `unit` and `sensor` (a regex on the name) pick the sensors.
+    A rule only raises `rate` alerts when the reading moves towards its limit by
+    at least `rate` units per minute, measured over the last half to full `rate_window`.
+    """
+
+    def __init__(self, name, kind=None, warning=None, critical=None, direction='high', hysteresis=0, rate=None,
+                 rate_window=RATE_WINDOW, debounce=1, role=None, unit=None, sensor=None, hosts=None,
+                 bmc_thresholds=True):
+        if direction not in BMC_THRESHOLDS:
+            raise ValueError(f"Rule {name}: direction must be 'high' or 'low'")
+        self.name = name
+        self.kind = kind
+        self.warning = warning
+        self.critical = critical
+        self.direction = direction
+        self.hysteresis = hysteresis    # How far back past a limit a reading must go before the level clears
+        self.rate = rate                # Units per minute towards the limit that raise a warning
+        self.rate_window = rate_window
+        self.debounce = max(1, debounce)  # Consecutive samples needed before the level changes
+        self.role = role
+        self.unit = unit
+        self.sensor = re.compile(sensor) if sensor else None
+        self.hosts = set(expand_range_spec(hosts)) if hosts else None
+        self.bmc_thresholds = bmc_thresholds
+
+    def matches(self, ip, record):
+        return ((self.kind is None or record.kind == self.kind)
+                and (self.role is None or record.role == self.role)
+                and (self.unit is None or record.unit == self.unit)
+                and (self.sensor is None or self.sensor.search(record.name) is not None)
+                and (self.hosts is None or ip in self.hosts))
+
+    def limits(self, thresholds=None):
+        """(warning, critical) for a sensor, from its BMC thresholds when the rule trusts them."""
+        warning, critical = self.warning, self.critical
+        if self.bmc_thresholds and thresholds:
+            warning_key, critical_key = BMC_THRESHOLDS[self.direction]
+            warning = thresholds.get(warning_key, warning)
+            critical = thresholds.get(critical_key, critical)
+        return warning, critical
+
+    def beyond(self, value, limit, margin=0):
+        if limit is None:
+            return False
+        return value >= limit - margin if self.direction == 'high' else value <= limit + margin
+
+
+class Alert:
+    """A sensor changing alert level under one rule."""
+
+    __slots__ = ('ip', 'sensor', 'rule', 'level', 'previous', 'value', 'reason', 'timestamp')
+
+    def __init__(self, ip, sensor, rule, level, previous, value, reason, timestamp):
+        self.ip = ip
+        self.sensor = sensor
+        self.rule = rule
+        self.level = level
+        self.previous = previous
+        self.value = value
+        self.reason = reason
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'sensor': self.sensor,
+            'rule': self.rule,
+            'level': self.level,
+            'previous': self.previous,
+            'value': self.value,
+            'reason': self.reason,
+            'timestamp': self.timestamp,
+        }
+
+    def __str__(self):
+        if self.level == OK:
+            return f"{self.ip} {self.sensor}: back to ok at {self.value:g} (was {self.previous})"
+        return f"{self.ip} {self.sensor}: {self.level} - {self.reason}"
+
+
+class AlertState:
+    __slots__ = ('level', 'reason', 'pending', 'pending_count', 'time', 'ref_value', 'ref_time')
+
+    def __init__(self):
+        self.level = OK
+        self.reason = None
+        self.pending = None         # Level the sensor is heading for while debouncing
+        self.pending_count = 0
+        self.time = None            # Timestamp of the last sample
+        self.ref_value = None       # Sample the rate of change is measured from
+        self.ref_time = None
+
+
+class AlertEngine:
+    """Evaluates rules on each reading as it arrives; the work per reading does not grow with history."""
+
+    def __init__(self, rules=None, sinks=None):
+        self.rules = [AlertRule(**rule) for rule in DEFAULT_RULES] if rules is None else list(rules)
+        self.sinks = list(sinks or ())  # Callables taking an Alert
+        self.states = {}    # (ip, sensor, rule index) -> AlertState
+        self.matched = {}   # (ip, sensor) -> [(rule index, rule)]; rules are matched once per sensor
+        self.active = {}    # (ip, sensor) -> {rule name: (level, reason)} for sensors not at ok
+        self.lock = threading.Lock()
+
+    def set_rules(self, rules):
+        with self.lock:
+            self.rules = list(rules)
+            self.states.clear()
+            self.matched.clear()
+            self.active.clear()
+
+    def evaluate(self, rule, state, value, timestamp, thresholds):
+        """Return (level, reason) the reading calls for, hysteresis included."""
+        warning, critical = rule.limits(thresholds)
+        held = LEVELS.index(state.level)
+        for level, limit in ((CRITICAL, critical), (WARNING, warning)):
+            # A level already reached is kept until the reading is back past the limit by the hysteresis
+            margin = rule.hysteresis if held >= LEVELS.index(level) else 0
+            if rule.beyond(value, limit, margin):
+                sign = ">=" if rule.direction == 'high' else "<="
+                return level, f"{value:g} {sign} {limit:g}"
+        if rule.rate and state.ref_time is not None and timestamp - state.ref_time >= rule.rate_window / 2:
+            per_minute = (value - state.ref_value) * 60 / (timestamp - state.ref_time)
+            towards = per_minute if rule.direction == 'high' else -per_minute
+            if towards >= rule.rate:
+                return WARNING, f"{'rising' if per_minute > 0 else 'falling'} {abs(per_minute):.1f}/min"
+        return OK, None
+
+    def observe(self, ip, record, timestamp):
+        """Feed one reading; returns the alerts it raised or cleared (already sent to the sinks)."""
+        if record.value is None:
+            return []
+        alerts = []
+        with self.lock:
+            key = (ip, record.name)
+            rules = self.matched.get(key)
+            if rules is None:
+                rules = self.matched[key] = [(i, rule) for i, rule in enumerate(self.rules) if rule.matches(ip, record)]
+            for index, rule in rules:
+                state = self.states.get((ip, record.name, index))
+                if state is None:
+                    state = self.states[(ip, record.name, index)] = AlertState()
+                elif state.time is not None and timestamp <= state.time:
+                    continue    # Same sample again (e.g. a cached snapshot from the daemon)
+                level, reason = self.evaluate(rule, state, record.value, timestamp, record.thresholds)
+                state.time = timestamp
+                if state.ref_time is None or timestamp - state.ref_time >= rule.rate_window:
+                    state.ref_value, state.ref_time = record.value, timestamp
+                if level == state.level:
+                    state.pending, state.pending_count = None, 0
+                    if reason and reason != state.reason:
+                        state.reason = reason
+                        if level != OK:
+                            self.active[key][rule.name] = (level, reason)
+                    continue
+                if level == state.pending:
+                    state.pending_count += 1
+                else:
+                    state.pending, state.pending_count = level, 1
+                if state.pending_count < rule.debounce:
+                    continue
+                alerts.append(Alert(ip, record.name, rule.name, level, state.level, record.value,
+                                    reason, timestamp))
+                state.level, state.reason = level, reason
+                state.pending, state.pending_count = None, 0
+                active = self.active.setdefault(key, {})
+                if level == OK:
+                    active.pop(rule.name, None)
+                    if not active:
+                        del self.active[key]
+                else:
+                    active[rule.name] = (level, reason)
+        for alert in alerts:
+            self.emit(alert)
+        return alerts
+
+    def observe_snapshot(self, snapshot):
+        """Feed every fresh reading of a NodeSnapshot (carried-over stale values are not new samples)."""
+        alerts = []
+        for name, record in snapshot.records.items():
+            if name not in snapshot.stale:
+                alerts += self.observe(snapshot.ip, record, snapshot.timestamp)
+        return alerts
+
+    def emit(self, alert):
+        for sink in self.sinks:
+            try:
+                sink(alert)
+            except Exception as e:
+                print(f"Alert sink failed: {e}", file=sys.stderr)
+
+    def level(self, ip, sensor):
+        """(worst level, its reason) of a sensor across its rules."""
+        with self.lock:
+            active = self.active.get((ip, sensor))
+            if not active:
+                return OK, None
+            return max(active.values(), key=lambda entry: LEVELS.index(entry[0]))
+
+    def default_rule(self, kind):
+        """The first rule for a kind that applies to every host and sensor, or None."""
+        for rule in self.rules:
+            if rule.kind == kind and rule.hosts is None and rule.sensor is None:
+                return rule
+        return None
+
+    def classify(self, kind, value):
+        """Level of a bare value under the first rule for the kind, without any per-sensor state."""
+        rule = self.default_rule(kind)
+        if rule is None:
+            return OK
+        warning, critical = rule.limits()
+        if rule.beyond(value, critical):
+            return CRITICAL
+        if rule.beyond(value, warning):
+            return WARNING
+        return OK
+
+    def summary(self):
+        """Return 'Alerts: 1 critical, 2 warning' over every sensor currently alerting."""
+        with self.lock:
+            levels = [max((level for level, _ in active.values()), key=LEVELS.index)
+                      for active in self.active.values()]
+        if not levels:
+            return "Alerts: none"
+        return f"Alerts: {levels.count(CRITICAL)} critical, {levels.count(WARNING)} warning"
+
+
+def load_rules(path=ALERT_RULES_PATH):
+    """Rules from a JSON list of AlertRule arguments, or None (the defaults) if there is no file."""
+    try:
+        with open(path) as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        return None
+    return [AlertRule(**rule) for rule in rules]
+
+
+class FileSink:
+    """Appends one NDJSON line per alert."""
+
+    def __init__(self, path):
+        self.file = sys.stderr if path == "-" else open(path, 'a')
+        self.lock = threading.Lock()
+
+    def __call__(self, alert):
+        with self.lock:
+            self.file.write(json.dumps(alert.to_dict()) + "\n")
+            self.file.flush()
+
+
+class SyslogSink:
+    """Logs alerts to the local syslog (critical as LOG_CRIT, warning as LOG_WARNING)."""
+
+    def __init__(self, ident="ntnx-cluster"):
+        import syslog
+        self.syslog = syslog
+        syslog.openlog(ident, 0, syslog.LOG_DAEMON)
+        self.priorities = {CRITICAL: syslog.LOG_CRIT, WARNING: syslog.LOG_WARNING, OK: syslog.LOG_NOTICE}
+
+    def __call__(self, alert):
+        self.syslog.syslog(self.priorities[alert.level], str(alert))
+
+
+class WebhookSink:
+    """POSTs each alert as JSON from a background thread, so a slow endpoint never holds up a poll."""
+
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.queue = queue.Queue(WEBHOOK_QUEUE)
+        self.dropped = 0
+        threading.Thread(target=self.run, name="alert-webhook", daemon=True).start()
+
+    def __call__(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        import urllib.request
+        while True:
+            alert = self.queue.get()
+            request = urllib.request.Request(self.url, data=json.dumps(alert.to_dict()).encode('utf-8'),
+                                             headers={'Content-Type': "application/json"})
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError as e:
+                print(f"Alert webhook {self.url} failed: {e}", file=sys.stderr)
+
+
+def make_sink(spec):
+    """Build a sink from "syslog", "http(s)://...", "file:PATH", a bare path or "-" (stderr)."""
+    if spec == "syslog":
+        return SyslogSink()
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    return FileSink(spec[len("file:"):] if spec.startswith("file:") else spec)
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+from ipmi_stats import latency
+
+
+def default_socket():
+    """Socket path in a directory only this user can enter: under $XDG_RUNTIME_DIR, else a per-uid one in /tmp."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "ntnx-cluster", "ipmi.sock")
+    return os.path.join(tempfile.gettempdir(), f"ntnx-cluster-{os.getuid()}", "ipmi.sock")
+
+
+DAEMON_SOCKET = os.environ.get("NTNX_IPMI_SOCKET") or default_socket()
+MIN_REFRESH = 2.0       # A BMC is read at most once per this many seconds, however many clients ask
+CLIENT_TIMEOUT = 120    # Seconds a client waits for one answer (power actions can be slow)
+
+
+class DaemonTrustError(RuntimeError):
+    """The socket, or the process behind it, belongs to another user."""
+
+
+def private_dir(path):
+    """Create the socket's directory as 0700, refusing one another user owns or can get into."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise DaemonTrustError(f"{path} must be a directory owned by this user with mode 0700")
+
+
+def peer_uid(sock, path):
+    """uid of the process serving a connected Unix socket."""
+    if hasattr(socket, 'SO_PEERCRED'):
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        return struct.unpack('3i', creds)[1]    # pid, uid, gid
+    # No peer credentials here (macOS): the socket file is owned by whoever bound it
+    return os.stat(path).st_uid
+
+
+class SnapshotService:
+    """Owns all BMC I/O for the daemon: a freshness-bounded snapshot cache with single-flight fetches."""
+
+    def __init__(self, engine, snapshot_func, power_func, power_state_func, min_refresh=MIN_REFRESH, sampler=None):
+        self.engine = engine
+        self.snapshot_func = snapshot_func          # ip -> NodeSnapshot
+        self.power_func = power_func                # (ip, action) -> (ok, detail)
+        self.power_state_func = power_state_func    # ip -> True / False, raises on failure
+        self.min_refresh = min_refresh
+        self.sampler = sampler
+        self.cache = {}         # ip -> (snapshot dict, monotonic time)
+        self.in_flight = {}     # ip -> Future of the fetch everyone asking for the ip waits on
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'bmc_reads': 0, 'power_actions': 0,
+                      'clients': 0}
+
+    async def fetch(self, ip):
+        self.stats['bmc_reads'] += 1
+        _, ok, result = await self.engine.fetch_one(self.snapshot_func, ip)
+        if not ok:
+            raise RuntimeError(str(result))
+        snapshot = result.to_dict()
+        self.cache[ip] = (snapshot, time.monotonic())
+        return snapshot
+
+    async def snapshot(self, ip, max_age):
+        """Return a snapshot dict no older than max_age (but never fresher than min_refresh allows)."""
+        self.stats['requests'] += 1
+        max_age = max(self.min_refresh, max_age)
+        cached = self.cache.get(ip)
+        if cached is not None and time.monotonic() - cached[1] <= max_age:
+            self.stats['cache_hits'] += 1
+            return cached[0]
+        future = self.in_flight.get(ip)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        future = self.in_flight[ip] = asyncio.ensure_future(self.fetch(ip))
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self.in_flight.pop(ip, None)
+            else:
+                future.add_done_callback(lambda _: self.in_flight.pop(ip, None))
+
+    async def power(self, ip, action):
+        self.stats['power_actions'] += 1
+        _, ok, result = await self.engine.fetch_one(lambda ip: self.power_func(ip, action), ip)
+        self.cache.pop(ip, None)    # Whatever was cached predates the action
+        if not ok:
+            return False, str(result)
+        return result
+
+    async def power_state(self, ip):
+        # Always read fresh: power actions poll this to confirm the chassis reached its target
+        _, ok, result = await self.engine.fetch_one(self.power_state_func, ip)
+        if not ok:
+            raise RuntimeError(str(result))
+        return result
+
+    async def handle(self, request):
+        op = request.get('op')
+        if op == "snapshot":
+            return await self.snapshot(request['ip'], float(request.get('max_age', self.min_refresh)))
+        if op == "power":
+            return list(await self.power(request['ip'], request['action']))
+        if op == "power_state":
+            return await self.power_state(request['ip'])
+        if op == "stats":
+            stats = dict(self.stats, cached_hosts=len(self.cache), in_flight=len(self.in_flight))
+            if self.sampler is not None:
+                stats.update(sensor_reads=self.sampler.reads, sensor_skips=self.sampler.skips)
+            if request.get('latency'):
+                stats['latency'] = latency.to_dict(buckets=False)
+            return stats
+        raise ValueError(f"Unknown request: {op}")
+
+    async def serve_client(self, reader, writer):
+        self.stats['clients'] += 1
+        lock = asyncio.Lock()
+
+        async def send(response):
+            async with lock:
+                writer.write((json.dumps(response) + "\n").encode('utf-8'))
+                await writer.drain()
+
+        async def answer(request):
+            try:
+                response = {'id': request.get('id'), 'ok': True, 'result': await self.handle(request)}
+            except Exception as e:
+                response = {'id': request.get('id'), 'ok': False, 'error': str(e)}
+            await send(response)
+
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(request, dict):
+                    await send({'id': None, 'ok': False, 'error': "Request must be a JSON object"})
+                    continue
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['clients'] -= 1
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+
+async def serve(service, path=DAEMON_SOCKET):
+    """Serve the service on a Unix socket until cancelled or SIGTERM; only this user can reach the socket."""
+    private_dir(os.path.dirname(os.path.abspath(path)))
+    if os.path.exists(path):
+        if DaemonClient(path).available():
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        os.remove(path)     # Left behind by a daemon that died
+    server = await asyncio.start_unix_server(service.serve_client, path=path)
+    os.chmod(path, 0o600)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class DaemonClient:
+    """Blocking client of the daemon; each thread gets its own connection, one request at a time."""
+
+    def __init__(self, path=DAEMON_SOCKET, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        self.next_id = 0
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            # Snapshots and power actions are only trusted to a daemon run by this user (or root)
+            uid = peer_uid(sock, self.path)
+            if uid not in (os.getuid(), 0):
+                sock.close()
+                raise DaemonTrustError(f"The daemon at {self.path} runs as uid {uid}, not as this user")
+            conn = self.local.conn = (sock, sock.makefile('rb'))
+        return conn
+
+    def request(self, op, **params):
+        """Send one request and return its result; raises RuntimeError with the daemon's error."""
+        self.next_id += 1
+        params.update(op=op, id=self.next_id)
+        try:
+            with latency.timer('daemon', params.get('ip'), op):
+                sock, reader = self.connection()
+                sock.sendall((json.dumps(params) + "\n").encode('utf-8'))
+                line = reader.readline()
+        except OSError:
+            self.local.conn = None
+            raise
+        if not line:
+            self.local.conn = None
+            raise ConnectionError(f"Daemon at {self.path} closed the connection")
+        response = json.loads(line)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def available(self):
+        try:
+            self.request("stats")
+            return True
+        except (OSError, ValueError):
+            return False
@@ -0,0 +1,181 @@
+import ipaddress
+import json
+import os
+import select
+import socket
+import time
+
+RMCP_PORT = 623
+PING_TIMEOUT = 1.0      # Seconds to wait for pongs after the last ping of a pass
+PING_RATE = 20000       # Pings per second; a /16 goes out in ~3 s
+PING_PASSES = 2         # Addresses that stay silent are pinged once more (UDP loses packets)
+INVENTORY_PATH = os.path.expanduser("~/.config/ntnx-cluster/inventory.json")
+
+ASF_IANA = b"\x00\x00\x11\xbe"
+ASF_PRESENCE_PING = 0x80
+ASF_PRESENCE_PONG = 0x40
+
+# IPMI manufacturer ID (from `mc info`) -> (vendor, sensor profile in ipmi_sensors.PROFILES)
+MANUFACTURERS = {
+    10876: ("Supermicro", 'supermicro'),
+    674: ("Dell", 'dell'),
+    11: ("HPE", 'hpe'),
+    47196: ("HPE", 'hpe'),
+    52538: ("Nutanix", 'nutanix'),
+}
+
+
+def iter_range_spec(spec):
+    """Lazily yield the addresses of a comma separated spec.
+
+    Parts may be CIDR (10.1.0.0/16), full or short dash ranges (10.1.1.10-10.1.1.20, 10.1.1.10-20),
+    single addresses or hostnames (yielded as strings).
+    """
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '/' in part:
+            network = ipaddress.IPv4Network(part, strict=False)
+            if network.num_addresses == 1:
+                yield network.network_address
+            else:
+                yield from network.hosts()
+        elif '-' in part and part.replace('-', '').replace('.', '').replace(' ', '').isdigit():
+            start_ip, end_ip = part.split('-')
+            start_ip = ipaddress.IPv4Address(start_ip.strip())
+            if '.' not in end_ip:
+                end_ip = ipaddress.IPv4Address(f"{start_ip.exploded.rsplit('.', 1)[0]}.{end_ip.strip()}")
+            else:
+                end_ip = ipaddress.IPv4Address(end_ip.strip())
+            for ip in range(int(start_ip), int(end_ip) + 1):
+                yield ipaddress.IPv4Address(ip)
+        else:
+            try:
+                yield ipaddress.IPv4Address(part)
+            except ValueError:
+                yield part
+
+
+def ip_sort_key(ip):
+    """Sort addresses numerically (across subnets), hostnames after them."""
+    try:
+        return (0, int(ipaddress.IPv4Address(ip)), "")
+    except ValueError:
+        return (1, 0, ip)
+
+
+def expand_range_spec(spec):
+    """Return the spec's addresses as strings, deduplicated and sorted numerically."""
+    seen = set()
+    for ip in iter_range_spec(spec):
+        seen.add(str(ip))
+    return sorted(seen, key=ip_sort_key)
+
+
+def presence_ping(tag):
+    """RMCP header (ASF class, no ACK) + ASF Presence Ping."""
+    return bytes([0x06, 0x00, 0xff, 0x06]) + ASF_IANA + bytes([ASF_PRESENCE_PING, tag, 0x00, 0x00])
+
+
+def parse_pong(data):
+    """Return True / False for "IPMI supported" in an ASF Presence Pong, or None if it isn't one."""
+    if len(data) < 12 or data[3] != 0x06 or data[4:8] != ASF_IANA or data[8] != ASF_PRESENCE_PONG:
+        return None
+    if len(data) < 21:
+        return True
+    return bool(data[20] & 0x80)   # Supported entities, bit 7: IPMI
+
+
+def ping_sweep(addresses, timeout=PING_TIMEOUT, rate=PING_RATE, passes=PING_PASSES, port=RMCP_PORT):
+    """Send RMCP presence pings to every address and return {ip: ipmi supported} for those that answered.
+
+    One non-blocking UDP socket sends at `rate` per second while collecting replies,
+    so memory and time grow with the number of addresses, not with the timeout.
+    """
+    found = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+    except OSError:
+        pass
+
+    def drain(wait):
+        ready, _, _ = select.select([sock], [], [], wait)
+        while ready:
+            try:
+                data, (ip, _) = sock.recvfrom(512)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue    # ICMP port unreachable surfaced as an error on Linux
+            supported = parse_pong(data)
+            if supported is not None:
+                found[ip] = supported
+
+    try:
+        sent = []
+        for attempt in range(passes):
+            if attempt == 0:
+                pending = (str(ip) for ip in addresses)  # Consumed as it goes, the spec is never expanded up front
+            else:
+                pending = [ip for ip in sent if ip not in found]
+                if not pending:
+                    break
+            start = time.monotonic()
+            for i, ip in enumerate(pending):
+                if attempt == 0:
+                    sent.append(ip)
+                try:
+                    sock.sendto(presence_ping(attempt), (ip, port))
+                except BlockingIOError:
+                    drain(0.01)
+                except OSError:
+                    continue    # e.g. broadcast or unroutable address
+                if i % 256 == 255:
+                    # Pace the sends and pick up replies as we go
+                    while True:
+                        ahead = start + (i + 1) / rate - time.monotonic()
+                        if ahead <= 0:
+                            break
+                        drain(ahead)
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                drain(deadline - time.monotonic())
+    finally:
+        sock.close()
+    return found
+
+
+def parse_mc_info(output):
+    """Return (manufacturer id, vendor, sensor profile) from `mc info` output."""
+    for line in output.splitlines():
+        key, _, value = line.partition(':')
+        if key.strip() == "Manufacturer ID":
+            try:
+                manufacturer = int(value.strip())
+            except ValueError:
+                break
+            vendor, profile = MANUFACTURERS.get(manufacturer, (None, None))
+            return manufacturer, vendor, profile
+    return None, None, None
+
+
+def load_inventory(path=INVENTORY_PATH):
+    """Return {ip: host entry} from the inventory file, or {} if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f).get('hosts', {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_inventory(hosts, path=INVENTORY_PATH):
+    """Write the inventory atomically; it can hold passwords, so only the owner may read it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'hosts': {ip: hosts[ip] for ip in sorted(hosts, key=ip_sort_key)}}, f, indent=1)
+    os.replace(tmp_path, path)
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXPORTER_PORT = 9290
+EXPORTER_ADDRESS = "127.0.0.1"
+
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsCache:
+    """Latest snapshot per node, pre-rendered into exposition text after every poll tick.
+
+    Scrapes only hand out the already rendered bytes, so they never touch a BMC.
+    """
+
+    def __init__(self):
+        self.snapshots = {}     # ip -> NodeSnapshot
+        self.latency = {}       # ip -> seconds the last poll took
+        self.errors = {}        # ip -> error text when the poll itself failed
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.sensor_reads = 0
+        self.sensor_skips = 0
+        self.lock = threading.Lock()
+        self.payloads = {
+            PROMETHEUS_TYPE: b"",
+            OPENMETRICS_TYPE: b"# EOF\n",
+        }
+
+    def update(self, ip, ok, snapshot, latency):
+        with self.lock:
+            self.latency[ip] = latency
+            if ok:
+                self.snapshots[ip] = snapshot
+                self.errors.pop(ip, None)
+            else:
+                self.errors[ip] = str(snapshot)
+
+    def set_scheduler_stats(self, scheduler, sampler=None):
+        with self.lock:
+            self.ticks = scheduler.tick
+            self.overruns = scheduler.overruns
+            self.skipped_ticks = scheduler.skipped_ticks
+            if sampler is not None:
+                self.sensor_reads = sampler.reads
+                self.sensor_skips = sampler.skips
+
+    def render(self):
+        """Build both exposition formats from the current state and swap them in."""
+        with self.lock:
+            snapshots = dict(self.snapshots)
+            latency = dict(self.latency)
+            errors = set(self.errors)
+            ticks, overruns, skipped = self.ticks, self.overruns, self.skipped_ticks
+            sensor_reads, sensor_skips = self.sensor_reads, self.sensor_skips
+
+        families = {
+            'ipmi_up': ('gauge', "1 if the node's BMC answered the last poll.", []),
+            'ipmi_power_on': ('gauge', "1 if the chassis is powered on.", []),
+            'ipmi_temperature_celsius': ('gauge', "Temperature sensor reading.", []),
+            'ipmi_fan_speed_rpm': ('gauge', "Fan sensor reading.", []),
+            'ipmi_fan_duty_percent': ('gauge', "Fan duty of BMCs that report fans in percent.", []),
+            'ipmi_poll_duration_seconds': ('gauge', "Time the last poll of the node took.", []),
+            'ipmi_last_poll_timestamp_seconds': ('gauge', "Unix time of the last successful poll.", []),
+        }
+        for ip in sorted(set(snapshots) | set(latency)):
+            node = f'node="{escape_label(ip)}"'
+            snap = snapshots.get(ip)
+            up = snap is not None and ip not in errors and snap.error is None
+            families['ipmi_up'][2].append((node, 1 if up else 0))
+            if ip in latency:
+                families['ipmi_poll_duration_seconds'][2].append((node, latency[ip]))
+            if snap is None:
+                continue
+            families['ipmi_last_poll_timestamp_seconds'][2].append((node, snap.timestamp))
+            if snap.power is not None:
+                families['ipmi_power_on'][2].append((node, 1 if snap.power else 0))
+            for name, value in snap.temps.items():
+                if value is not None:
+                    families['ipmi_temperature_celsius'][2].append(
+                        (f'{node},sensor="{escape_label(name)}"', value))
+            for name, value in snap.fans.items():
+                if value is not None:
+                    family = 'ipmi_fan_duty_percent' if snap.fan_units[name] == "percent" else 'ipmi_fan_speed_rpm'
+                    families[family][2].append(
+                        (f'{node},sensor="{escape_label(name)}"', value))
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+        gauges = "\n".join(lines)
+
+        counters = (
+            ('ipmi_exporter_ticks', "Poll ticks started.", ticks),
+            ('ipmi_exporter_overruns', "Node polls skipped because the previous one was still running.", overruns),
+            ('ipmi_exporter_skipped_ticks', "Ticks dropped because the poll loop fell behind.", skipped),
+            ('ipmi_exporter_sensor_reads', "Sensor readings taken from BMCs.", sensor_reads),
+            ('ipmi_exporter_sensor_reads_skipped', "Sensor readings skipped by adaptive sampling.", sensor_skips),
+        )
+        prometheus = [gauges]
+        openmetrics = [gauges]
+        for name, help_text, value in counters:
+            prometheus.append(f"# HELP {name}_total {help_text}\n# TYPE {name}_total counter\n{name}_total {value}")
+            openmetrics.append(f"# HELP {name} {help_text}\n# TYPE {name} counter\n{name}_total {value}")
+        openmetrics.append("# EOF")
+
+        payloads = {
+            PROMETHEUS_TYPE: ("\n".join(prometheus) + "\n").encode('utf-8'),
+            OPENMETRICS_TYPE: ("\n".join(openmetrics) + "\n").encode('utf-8'),
+        }
+        self.payloads = payloads  # Single reference swap, scrapes see the old or the new payloads whole
+
+    def payload(self, accept):
+        """Return (content type, body) for a scrape's Accept header."""
+        content_type = OPENMETRICS_TYPE if "application/openmetrics-text" in (accept or "") else PROMETHEUS_TYPE
+        return content_type, self.payloads[content_type]
+
+
+def make_handler(cache):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            content_type, body = cache.payload(self.headers.get("Accept"))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the terminal
+
+    return MetricsHandler
+
+
+def start_poller(scheduler, ip_list, snapshot_func, cache, sampler=None):
+    """Run the poll scheduler in a background thread, feeding the metrics cache."""
+    def timed(ip):
+        start = time.perf_counter()
+        try:
+            return snapshot_func(ip)
+        finally:
+            cache.latency[ip] = time.perf_counter() - start
+
+    def on_result(tick, ip, ok, result):
+        cache.update(ip, ok, result, cache.latency.get(ip, 0.0))
+
+    def on_tick_done(tick, results):
+        cache.set_scheduler_stats(scheduler, sampler)
+        cache.render()
+
+    thread = threading.Thread(
+        target=lambda: asyncio.run(scheduler.run(ip_list, timed, on_result, on_tick_done)),
+        name="ipmi-exporter-poller",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def serve_metrics(scheduler, ip_list, snapshot_func, address=EXPORTER_ADDRESS, port=EXPORTER_PORT, sampler=None):
+    """Poll in the background and serve the latest snapshot on http://address:port/metrics until interrupted."""
+    cache = MetricsCache()
+    cache.render()
+    start_poller(scheduler, ip_list, snapshot_func, cache, sampler)
+    server = ThreadingHTTPServer((address, port), make_handler(cache))
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,147 @@
+import asyncio
+import ipaddress
+from collections import OrderedDict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipmi_stats import latency
+
+MAX_IN_FLIGHT = 64      # Global limit on BMC requests running at once
+PER_SUBNET_LIMIT = 16   # Limit per subnet so one big rack can't starve the others
+HOST_TIMEOUT = 30       # Seconds before a single host's request is given up on
+SUBNET_PREFIX = 24      # Hosts are grouped into /24s for fairness
+
+_deadline = threading.local()   # .at: monotonic time the engine gives up on the host this worker is fetching
+
+
+def time_left(timeout):
+    """Return `timeout`, cut short to what is left of the calling worker's per-host timeout."""
+    deadline = getattr(_deadline, 'at', None)
+    if deadline is None:
+        return timeout
+    return max(0.0, min(timeout, deadline - time.monotonic()))
+
+
+def subnet_of(ip, prefix=SUBNET_PREFIX):
+    """Return the subnet an address belongs to, or the address itself for hostnames."""
+    try:
+        return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+    except ValueError:
+        return ip
+
+
+def interleave_by_subnet(ip_list, prefix=SUBNET_PREFIX):
+    """Order hosts round-robin across subnets so dispatch alternates between them."""
+    groups = OrderedDict()
+    for ip in ip_list:
+        groups.setdefault(subnet_of(ip, prefix), []).append(ip)
+    queues = [iter(group) for group in groups.values()]
+    ordered = []
+    while queues:
+        remaining = []
+        for queue in queues:
+            ip = next(queue, None)
+            if ip is not None:
+                ordered.append(ip)
+                remaining.append(queue)
+        queues = remaining
+    return ordered
+
+
+class FetchEngine:
+    """asyncio fetch engine with a bounded number of in-flight requests, per-host timeouts and per-subnet fairness.
+
+    Status functions may be plain blocking callables (run on a bounded worker
+    pool that lives as long as the engine) or coroutine functions.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, per_subnet=PER_SUBNET_LIMIT,
+                 host_timeout=HOST_TIMEOUT, subnet_prefix=SUBNET_PREFIX):
+        self.max_in_flight = max_in_flight
+        self.per_subnet = per_subnet
+        self.host_timeout = host_timeout
+        self.subnet_prefix = subnet_prefix
+        self.executor = None
+        self.limits_loop = None
+        self.global_limit = None
+        self.subnet_limits = {}
+
+    def run_blocking(self, status_func, ip, deadline):
+        """Run a blocking status function on a worker, which gives up on its own at the host's deadline."""
+        _deadline.at = deadline
+        try:
+            return status_func(ip)
+        finally:
+            _deadline.at = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="ipmi-fetch")
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def call(self, status_func, ip):
+        """Run one status function for one host under the per-host timeout.
+
+        Blocking functions see the deadline through time_left(), so a hung BMC
+        frees its worker instead of holding one of the max_in_flight slots.
+        """
+        if asyncio.iscoroutinefunction(status_func):
+            coro = status_func(ip)
+        else:
+            loop = asyncio.get_running_loop()
+            coro = loop.run_in_executor(self.get_executor(), self.run_blocking, status_func, ip,
+                                        time.monotonic() + self.host_timeout)
+        return await asyncio.wait_for(coro, self.host_timeout)
+
+    def limits(self, ip):
+        """Return the (subnet, global) semaphores for a host, created for the running loop."""
+        loop = asyncio.get_running_loop()
+        if self.limits_loop is not loop:
+            self.limits_loop = loop
+            self.global_limit = asyncio.Semaphore(self.max_in_flight)
+            self.subnet_limits = {}
+        subnet = subnet_of(ip, self.subnet_prefix)
+        subnet_limit = self.subnet_limits.get(subnet)
+        if subnet_limit is None:
+            subnet_limit = self.subnet_limits[subnet] = asyncio.Semaphore(self.per_subnet)
+        return subnet_limit, self.global_limit
+
+    async def fetch_one(self, status_func, ip):
+        """Fetch one host within the global and subnet limits; returns (ip, ok, result_or_exception)."""
+        subnet_limit, global_limit = self.limits(ip)
+        queued = time.perf_counter()
+        # Semaphores are FIFO, so taking the subnet slot first keeps the interleaved order fair
+        async with subnet_limit:
+            async with global_limit:
+                started = time.perf_counter()
+                latency.record('queue', started - queued, ip)
+                try:
+                    return ip, True, await self.call(status_func, ip)
+                except asyncio.TimeoutError:
+                    return ip, False, TimeoutError(f"No answer within {self.host_timeout}s")
+                except Exception as e:
+                    return ip, False, e
+                finally:
+                    latency.record('fetch', time.perf_counter() - started, ip)
+
+    async def iter_results(self, ip_list, status_func):
+        """Async iterator of (ip, ok, result_or_exception) in completion order."""
+        tasks = [asyncio.ensure_future(self.fetch_one(status_func, ip))
+                 for ip in interleave_by_subnet(ip_list, self.subnet_prefix)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def fetch_all(self, ip_list, status_func):
+        """Blocking helper: run every host through the engine and return {ip: (ok, result)}."""
+        async def collect():
+            return {ip: (ok, result) async for ip, ok, result in self.iter_results(ip_list, status_func)}
+        return asyncio.run(collect())
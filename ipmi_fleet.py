@@ -0,0 +1,207 @@
+import time
+from ipmi_sensors import records_by_role
+
+MAX_CPUS = 4        # CPU temperature columns per node; extra sockets are ignored
+MAX_FANS = 8        # Fan columns per node (FAN1-6 plus FANA/FANB on most boards)
+FLEET_TOP = 5       # Hottest CPUs / slowest fans listed
+STALL_RPM = 300     # A fan of a powered-on node turning slower than this (or not reporting) counts as stalled
+STALL_PERCENT = 5   # The same for fans read in percent duty (HPE)
+HEAT_STEP = 10      # Degrees per heatmap shade below the warning level
+
+RESET = "\033[0m"
+# Heatmap cells by level: no reading, powered off, then coolest to hottest (the last two are warning / critical)
+HEAT_CELLS = (
+    ("?", "\033[38;5;240m"),
+    ("-", "\033[38;5;240m"),
+    ("·", "\033[38;5;67m"),
+    ("░", "\033[38;5;117m"),
+    ("▒", "\033[38;5;114m"),
+    ("▓", "\033[33m"),
+    ("█", "\033[31m"),
+)
+
+
+def _numpy():
+    # Optional dependency, only the fleet summary needs it
+    import numpy
+    return numpy
+
+
+class FleetFrame:
+    """Latest CPU temperatures and fan speeds of every node, packed into fixed-shape arrays.
+
+    update() writes one node's row as its snapshot arrives; aggregate() then
+    works on whole arrays at once, so its cost barely grows with the fleet.
+    Missing readings are NaN; fan_present tells a silent fan from an empty slot.
+    Fans read in percent duty go to their own arrays, never compared with RPM.
+    """
+
+    def __init__(self, ip_list, group_of=None, max_cpus=MAX_CPUS, max_fans=MAX_FANS):
+        np = self.np = _numpy()
+        self.ips = list(ip_list)
+        self.index = {ip: i for i, ip in enumerate(self.ips)}
+        count = len(self.ips)
+        self.cpu = np.full((count, max_cpus), np.nan)
+        self.fan = np.full((count, max_fans), np.nan)
+        self.fan_present = np.zeros((count, max_fans), dtype=bool)
+        self.duty = np.full((count, max_fans), np.nan)
+        self.duty_present = np.zeros((count, max_fans), dtype=bool)
+        self.power = np.full(count, -1, dtype=np.int8)     # 1 on, 0 off, -1 unknown
+        self.cpu_labels = [[] for _ in self.ips]
+        self.fan_labels = [[] for _ in self.ips]
+        self.duty_labels = [[] for _ in self.ips]
+        groups = [group_of(ip) if group_of else "fleet" for ip in self.ips]
+        self.group_names = list(dict.fromkeys(groups))
+        position = {name: i for i, name in enumerate(self.group_names)}
+        self.group_ids = np.array([position[name] for name in groups], dtype=np.intp)
+
+    def update(self, ip, snapshot):
+        """Replace a node's row with its snapshot (None when the node could not be read)."""
+        row = self.index[ip]
+        self.cpu[row] = self.np.nan
+        self.fan[row] = self.np.nan
+        self.fan_present[row] = False
+        self.duty[row] = self.np.nan
+        self.duty_present[row] = False
+        self.power[row] = -1
+        if snapshot is None:
+            return
+        if snapshot.power is not None:
+            self.power[row] = 1 if snapshot.power else 0
+        cpus = [r for r in records_by_role(snapshot.records, 'temp') if r.role == 'cpu'][:self.cpu.shape[1]]
+        fans = records_by_role(snapshot.records, 'fan')
+        rpm_fans = [r for r in fans if r.unit != "percent"][:self.fan.shape[1]]
+        duty_fans = [r for r in fans if r.unit == "percent"][:self.duty.shape[1]]
+        for column, record in enumerate(cpus):
+            if record.value is not None:
+                self.cpu[row, column] = record.value
+        for values, present, records in ((self.fan, self.fan_present, rpm_fans),
+                                         (self.duty, self.duty_present, duty_fans)):
+            for column, record in enumerate(records):
+                present[row, column] = True
+                if record.value is not None:
+                    values[row, column] = record.value
+        self.cpu_labels[row] = [record.label for record in cpus]
+        self.fan_labels[row] = [record.label for record in rpm_fans]
+        self.duty_labels[row] = [record.label for record in duty_fans]
+
+    def node_max(self):
+        """Hottest CPU per node, NaN for nodes without a reading."""
+        # Column by column: a reduction along a short row axis is an order of magnitude slower
+        hottest = self.cpu[:, 0].copy()
+        for column in range(1, self.cpu.shape[1]):
+            self.np.fmax(hottest, self.cpu[:, column], out=hottest)
+        return hottest
+
+    def _spread(self, values):
+        """min / max / mean / p95 (nearest rank) of a flat array of readings."""
+        if not values.size:
+            return None
+        rank = int(0.95 * (values.size - 1) + 0.5)
+        return {'min': float(values.min()), 'max': float(values.max()), 'mean': float(values.mean()),
+                'p95': float(self.np.partition(values, rank)[rank])}
+
+    def _pick(self, positions, values, count, largest):
+        """Flat positions of the `count` largest (or smallest) values, best first."""
+        count = min(count, values.size)
+        if not count:
+            return []
+        keys = -values if largest else values
+        best = self.np.argpartition(keys, count - 1)[:count]
+        return positions[best[self.np.argsort(keys[best], kind='stable')]]
+
+    def _sensor(self, labels, width, position, values, unit):
+        row, column = divmod(int(position), width)
+        value = values.flat[position]
+        return {'ip': self.ips[row], 'sensor': labels[row][column],
+                'value': None if self.np.isnan(value) else float(value), 'unit': unit}
+
+    def aggregate(self, top=FLEET_TOP, stall_rpm=STALL_RPM, stall_percent=STALL_PERCENT):
+        """Fleet and per-group statistics of the latest readings, as a JSON-ready dict."""
+        np = self.np
+        width_cpu, width_fan = self.cpu.shape[1], self.fan.shape[1]
+        # Readings that exist, compacted once and shared by the statistics and the rankings
+        cpu_positions = np.flatnonzero(~np.isnan(self.cpu))
+        temps = self.cpu.ravel()[cpu_positions]
+        fan_positions = np.flatnonzero(~np.isnan(self.fan))
+        rpms = self.fan.ravel()[fan_positions]
+        duties = self.duty.ravel()[np.flatnonzero(~np.isnan(self.duty))]
+
+        hottest = [self._sensor(self.cpu_labels, width_cpu, i, self.cpu, "degrees C")
+                   for i in self._pick(cpu_positions, temps, top, True)]
+        slowest = [self._sensor(self.fan_labels, width_fan, i, self.fan, "RPM")
+                   for i in self._pick(fan_positions, rpms, top, False)]
+        # A fan of a powered-off node is meant to be still
+        powered = (self.power == 1)[:, None]
+        stalled_mask = self.fan_present & powered & ~(self.fan >= stall_rpm)
+        duty_stalled_mask = self.duty_present & powered & ~(self.duty >= stall_percent)
+        stalled = np.flatnonzero(stalled_mask)
+        duty_stalled = np.flatnonzero(duty_stalled_mask)
+        stalled_fans = ([self._sensor(self.fan_labels, width_fan, i, self.fan, "RPM") for i in stalled[:top]] +
+                        [self._sensor(self.duty_labels, width_fan, i, self.duty, "percent")
+                         for i in duty_stalled[:top]])[:top]
+
+        node_max = self.node_max()
+        reporting = ~np.isnan(node_max)
+        group_count = len(self.group_names)
+        ids = self.group_ids[reporting]
+        values = node_max[reporting]
+        nodes = np.bincount(self.group_ids, minlength=group_count)
+        counts = np.bincount(ids, minlength=group_count)
+        sums = np.bincount(ids, weights=values, minlength=group_count)
+        peaks = np.full(group_count, -np.inf)
+        np.maximum.at(peaks, ids, values)
+        stalled_per_node = stalled_mask.sum(axis=1) + duty_stalled_mask.sum(axis=1)
+        stalled_per_group = np.bincount(self.group_ids, weights=stalled_per_node, minlength=group_count)
+        groups = [{'name': name, 'nodes': int(nodes[g]), 'reporting': int(counts[g]),
+                   'max': float(peaks[g]) if counts[g] else None,
+                   'mean': float(sums[g] / counts[g]) if counts[g] else None,
+                   'stalled_fans': int(stalled_per_group[g])}
+                  for g, name in enumerate(self.group_names)]
+
+        return {
+            'timestamp': time.time(),
+            'nodes': len(self.ips),
+            'reporting': int(reporting.sum()),
+            'powered_on': int((self.power == 1).sum()),
+            'cpu_temp': self._spread(temps),
+            'fan_rpm': self._spread(rpms),
+            'fan_duty': self._spread(duties),
+            'hottest_cpus': hottest,
+            'slowest_fans': slowest,
+            'stalled_fans': stalled_fans,
+            'stalled_count': int(stalled.size + duty_stalled.size),
+            'groups': groups,
+        }
+
+    def heat_levels(self, warning, critical):
+        """Index into HEAT_CELLS per node, from its hottest CPU."""
+        np = self.np
+        node_max = self.node_max()
+        bins = [warning - 2 * HEAT_STEP, warning - HEAT_STEP, warning, critical]
+        levels = np.digitize(np.nan_to_num(node_max, nan=-np.inf), bins) + 2
+        levels[np.isnan(node_max)] = 0
+        levels[np.isnan(node_max) & (self.power == 0)] = 1
+        return levels
+
+    def heatmap_lines(self, warning, critical, width=64, color=True):
+        """One block per group: a cell per node (in IP order) shaded by its hottest CPU, wrapped at width."""
+        cells = [f"{code}{char}{RESET}" if color else char for char, code in HEAT_CELLS]
+        levels = self.heat_levels(warning, critical)
+        node_max = self.node_max()
+        label_width = max(len(name) for name in self.group_names) if self.group_names else 0
+        lines = []
+        for g, name in enumerate(self.group_names):
+            members = self.np.flatnonzero(self.group_ids == g)
+            peak = self.np.fmax.reduce(node_max[members]) if members.size else self.np.nan
+            summary = "no readings" if self.np.isnan(peak) else f"max {peak:.0f}"
+            row = [cells[level] for level in levels[members]]
+            for start in range(0, len(row), width):
+                prefix = name if start == 0 else ""
+                suffix = f"  {len(members)} nodes, {summary}" if start == 0 else ""
+                lines.append(f"{prefix:<{label_width}}  {''.join(row[start:start + width])}{suffix}")
+        legend = "  ".join(f"{cells[i]} {text}" for i, text in enumerate(
+            ("no reading", "off", f"<{warning - 2 * HEAT_STEP:g}", f"<{warning - HEAT_STEP:g}", f"<{warning:g}",
+             f">={warning:g}", f">={critical:g}")))
+        lines.append(legend)
+        return lines
@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+
+FAILURE_THRESHOLD = 2   # Consecutive failures before a host's circuit opens (each already includes lanplus retries)
+BACKOFF_BASE = 5.0      # Seconds before the first probe of a host that just went down
+BACKOFF_MAX = 300.0     # Longest wait between probes
+BACKOFF_JITTER = 0.2    # +/- fraction added to each wait so a rack that died together isn't probed together
+PROBE_TIMEOUT = 60.0    # A probe that never reported back frees its slot after this long
+
+CLOSED = "closed"       # Healthy, requests go through
+OPEN = "open"           # Down, requests fail immediately until the next probe
+HALF_OPEN = "half-open"  # One probe request in flight, everything else still fails fast
+
+
+class HostState:
+    __slots__ = ('state', 'failures', 'down_since', 'retry_at', 'backoff', 'last_error')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.down_since = None  # Wall-clock time of the first failure in the current streak
+        self.retry_at = 0.0     # Monotonic time the next probe is allowed
+        self.backoff = BACKOFF_BASE
+        self.last_error = ""
+
+
+class HealthTracker:
+    """Per-BMC circuit breaker: trip after repeated failures, then probe with exponential backoff."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.threshold = threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _host(self, ip):
+        host = self.hosts.get(ip)
+        if host is None:
+            host = self.hosts[ip] = HostState()
+        return host
+
+    def allow(self, ip):
+        """True if a request to the host may go out now; claims the probe slot of an open circuit."""
+        with self.lock:
+            host = self._host(ip)
+            if host.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if (host.state == OPEN and now >= host.retry_at) or now >= host.retry_at + PROBE_TIMEOUT:
+                host.state = HALF_OPEN
+                host.retry_at = now
+                return True
+            return False
+
+    def record_success(self, ip):
+        with self.lock:
+            host = self._host(ip)
+            host.state = CLOSED
+            host.failures = 0
+            host.down_since = None
+            host.backoff = self.backoff_base
+            host.last_error = ""
+
+    def record_failure(self, ip, error=""):
+        with self.lock:
+            host = self._host(ip)
+            host.failures += 1
+            host.last_error = error
+            if host.down_since is None:
+                host.down_since = time.time()
+            if host.state == HALF_OPEN:
+                # Probe failed: stay open and wait longer before the next one
+                host.backoff = min(self.backoff_max, host.backoff * 2)
+            elif host.state == CLOSED and host.failures < self.threshold:
+                return
+            host.state = OPEN
+            wait = host.backoff * random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+            host.retry_at = time.monotonic() + wait
+
+    def is_down(self, ip):
+        with self.lock:
+            host = self.hosts.get(ip)
+            return host is not None and host.state != CLOSED
+
+    def describe(self, ip):
+        """Return "Unreachable since HH:MM:SS (...)" for a tripped host, or None."""
+        with self.lock:
+            host = self.hosts.get(ip)
+            if host is None or host.state == CLOSED:
+                return None
+            since = time.strftime("%H:%M:%S", time.localtime(host.down_since))
+            retry = max(0, host.retry_at - time.monotonic())
+            detail = f"next probe in {retry:.0f}s" if host.state == OPEN else "probing"
+            if host.last_error:
+                detail += f", last error: {host.last_error}"
+            return f"Unreachable since {since} ({detail})"
+
+    def down_hosts(self):
+        with self.lock:
+            return {ip: host.down_since for ip, host in self.hosts.items() if host.state != CLOSED}
@@ -0,0 +1,354 @@
+import bisect
+import fcntl
+import json
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+RING_CAPACITY = 900     # Samples kept in memory per (host, sensor): 15 minutes at 1 Hz
+HISTORY_DIR = os.path.expanduser("~/.local/share/ntnx-cluster/history")
+SEGMENT_GROW_ROWS = 1 << 20  # Rows added to the column files each time a segment fills up
+HISTORY_KEEP_DAYS = 30  # Daily segments older than this are deleted
+PRUNE_INTERVAL = 3600   # Seconds between prunes while recording
+
+# Column files of a segment: name -> array typecode
+COLUMNS = (("ts", 'd'), ("sid", 'I'), ("val", 'f'))
+
+
+class RingBuffer:
+    """Fixed-size ring of (timestamp, value) pairs held in two flat arrays."""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('f', bytes(4 * capacity))
+        self.head = 0   # Next slot to write
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, since=None, until=None):
+        """Return the values (oldest first) whose timestamps fall within [since, until]."""
+        start = (self.head - self.count) % self.capacity
+        # Unroll the ring into chronological order without copying samples into objects
+        if start + self.count <= self.capacity:
+            times = self.times[start:start + self.count]
+            values = self.values[start:start + self.count]
+        else:
+            times = self.times[start:] + self.times[:self.head]
+            values = self.values[start:] + self.values[:self.head]
+        lo = 0 if since is None else bisect.bisect_left(times, since)
+        hi = len(times) if until is None else bisect.bisect_right(times, until)
+        return values[lo:hi]
+
+    def last(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+
+def summarize(values, percentiles=(50, 95, 99)):
+    """Return min/max/mean and nearest-rank percentiles for a sequence of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    n = len(ordered)
+    stats = {
+        'count': n,
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': math.fsum(ordered) / n,
+    }
+    for p in percentiles:
+        stats[f'p{p}'] = ordered[max(0, math.ceil(p / 100 * n) - 1)]
+    return stats
+
+
+class HistoryStore:
+    """In-memory history: one RingBuffer per (host, sensor), optionally mirrored to a TimeSeriesStore."""
+
+    def __init__(self, capacity=RING_CAPACITY, disk=None):
+        self.capacity = capacity
+        self.disk = disk
+        self.rings = {}
+        self.lock = threading.Lock()
+
+    def _remember(self, host, sensor, timestamp, value):
+        key = (host, sensor)
+        with self.lock:
+            ring = self.rings.get(key)
+            if ring is None:
+                ring = self.rings[key] = RingBuffer(self.capacity)
+            ring.append(timestamp, value)
+
+    def record(self, host, sensor, timestamp, value):
+        if value is None:
+            return
+        self._remember(host, sensor, timestamp, value)
+        if self.disk is not None:
+            self.disk.append(f"{host}/{sensor}", timestamp, value)
+
+    def record_snapshot(self, snapshot):
+        """Record every fresh temperature and fan reading of a NodeSnapshot; the disk gets them in one batch."""
+        rows = []
+        for readings in (snapshot.temps, snapshot.fans):
+            for name, value in readings.items():
+                if name not in snapshot.stale and value is not None:
+                    self._remember(snapshot.ip, name, snapshot.timestamp, value)
+                    rows.append((f"{snapshot.ip}/{name}", snapshot.timestamp, value))
+        if self.disk is not None and rows:
+            self.disk.append_many(rows)
+
+    def series(self, host=None):
+        with self.lock:
+            return sorted(key for key in self.rings if host is None or key[0] == host)
+
+    def stats(self, host, sensor, since=None, until=None):
+        """min/max/mean/percentiles for one series over a window, from memory."""
+        with self.lock:
+            ring = self.rings.get((host, sensor))
+            values = ring.window(since, until) if ring is not None else array('f')
+        return summarize(values)
+
+
+class Segment:
+    """One day of samples: append-only, memory-mapped column files plus a row count.
+
+    The row count file is shared by every process writing the segment (under
+    the store's flock). Queries index the rows per series the first time they
+    look at a segment and only the rows added since on later queries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.files = {}
+        self.maps = {}
+        self.views = {}
+        self.count_file = open(os.path.join(path, "count"), 'a+b')
+        if os.path.getsize(self.count_file.name) < 8:
+            self.count_file.truncate(8)
+        self.count_map = mmap.mmap(self.count_file.fileno(), 8)
+        self.count_view = memoryview(self.count_map).cast('Q')
+        self.capacity = None
+        self.rows = {}      # series id -> array of its row numbers, up to `indexed`
+        self.indexed = 0
+        for name, typecode in COLUMNS:
+            self.files[name] = open(os.path.join(path, f"{name}.col"), 'a+b')
+        self.remap(self.count)
+
+    @property
+    def count(self):
+        return self.count_view[0]
+
+    def remap(self, rows):
+        """Make sure every column file holds at least `rows` rows and (re)map it."""
+        rows = max(rows, SEGMENT_GROW_ROWS)
+        for view in self.views.values():
+            view.release()
+        for mapping in self.maps.values():
+            mapping.close()
+        for name, typecode in COLUMNS:
+            f = self.files[name]
+            itemsize = array(typecode).itemsize
+            size = os.path.getsize(f.name)
+            if size < rows * itemsize:
+                f.truncate(rows * itemsize)
+                size = rows * itemsize
+            self.maps[name] = mmap.mmap(f.fileno(), size)
+            self.views[name] = memoryview(self.maps[name]).cast(typecode)
+        self.capacity = min(len(view) for view in self.views.values())
+
+    def ensure(self, rows):
+        """Map at least `rows` rows; another process may have grown the files past this one's mapping."""
+        if rows > self.capacity:
+            self.remap(max(rows, self.capacity + SEGMENT_GROW_ROWS))
+
+    def append(self, sid, timestamp, value):
+        n = self.count
+        self.ensure(n + 1)
+        if n and timestamp < self.views['ts'][n - 1]:
+            # Keep the time column sorted so range lookups can bisect it
+            timestamp = self.views['ts'][n - 1]
+        self.views['ts'][n] = timestamp
+        self.views['sid'][n] = sid
+        self.views['val'][n] = value
+        # Count is published last, so readers never see a half-written row
+        self.count_view[0] = n + 1
+
+    def index(self, n):
+        """Add rows [indexed, n) to the per-series row lists."""
+        rows = self.rows
+        for i, sid in enumerate(self.views['sid'][self.indexed:n].tolist(), self.indexed):
+            series = rows.get(sid)
+            if series is None:
+                series = rows[sid] = array('I')
+            series.append(i)
+        self.indexed = n
+
+    def select(self, sid, since, until):
+        """Return the values of one series between two timestamps."""
+        n = self.count
+        self.ensure(n)
+        self.index(n)
+        series = self.rows.get(sid)
+        if series is None:
+            return array('f')
+        ts = self.views['ts']
+        lo = 0 if since is None else bisect.bisect_left(ts, since, 0, n)
+        hi = n if until is None else bisect.bisect_right(ts, until, lo, n)
+        vals = self.views['val']
+        return array('f', (vals[i] for i in series[bisect.bisect_left(series, lo):bisect.bisect_left(series, hi)]))
+
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        for mapping in self.maps.values():
+            mapping.close()
+        for f in self.files.values():
+            f.close()
+        self.count_view.release()
+        self.count_map.close()
+        self.count_file.close()
+
+
+class TimeSeriesStore:
+    """On-disk history: a directory of daily segments with timestamp, series id and value columns.
+
+    Several processes may record into one directory. Writes hold an flock on
+    it; series ids go to an append-only log that each process catches up on
+    before adding its own. Segments older than keep_days are pruned while recording.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, keep_days=HISTORY_KEEP_DAYS):
+        self.directory = directory
+        self.keep_days = keep_days
+        os.makedirs(directory, exist_ok=True)
+        self.series_ids = {}
+        self.next_sid = 0
+        self.series_log = open(os.path.join(directory, "series.log"), 'a+b')
+        self.series_offset = 0
+        self.lock_file = open(os.path.join(directory, "lock"), 'a')
+        self.segments = {}
+        self.last_prune = None
+        self.lock = threading.Lock()
+        with self.lock, self.locked():
+            self.read_series()
+
+    @contextmanager
+    def locked(self):
+        """Hold the store's flock, shared with every other process recording into the directory."""
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def read_series(self):
+        """Take in the series ids added to the log since the last look, by this or any other process."""
+        self.series_log.seek(self.series_offset)
+        data = self.series_log.read()
+        end = data.rfind(b"\n") + 1     # A line without its newline was cut short by a crash
+        for line in data[:end].splitlines():
+            try:
+                sid, key = json.loads(line)
+            except ValueError:
+                continue
+            self.series_ids[key] = sid
+            self.next_sid = max(self.next_sid, sid + 1)
+        self.series_offset += end
+        return len(data) > end
+
+    def add_series(self, keys):
+        """Give ids to keys not seen before, in one write to the log; needs self.lock and the flock."""
+        torn = self.read_series()
+        lines = [b"\n"] if torn else []
+        for key in keys:
+            if key not in self.series_ids:
+                sid = self.series_ids[key] = self.next_sid
+                self.next_sid += 1
+                lines.append((json.dumps([sid, key]) + "\n").encode('utf-8'))
+        if lines:
+            self.series_log.write(b"".join(lines))
+            self.series_log.flush()
+            self.series_offset = self.series_log.tell()
+
+    def segment(self, day):
+        seg = self.segments.get(day)
+        if seg is None:
+            seg = self.segments[day] = Segment(os.path.join(self.directory, day))
+        return seg
+
+    def append(self, key, timestamp, value):
+        self.append_many([(key, timestamp, value)])
+
+    def append_many(self, rows):
+        """Append (key, timestamp, value) rows under one lock, registering any new series in one go."""
+        days = {}
+        with self.lock, self.locked():
+            if any(key not in self.series_ids for key, _, _ in rows):
+                self.add_series([key for key, _, _ in rows])
+            for key, timestamp, value in rows:
+                day = days.get(timestamp)
+                if day is None:
+                    day = days[timestamp] = time.strftime("%Y%m%d", time.gmtime(timestamp))
+                self.segment(day).append(self.series_ids[key], timestamp, value)
+            now = time.monotonic()
+            if self.last_prune is None or now - self.last_prune >= PRUNE_INTERVAL:
+                self.last_prune = now
+                self._prune(self.keep_days)
+
+    def days(self):
+        return sorted(name for name in os.listdir(self.directory) if name.isdigit())
+
+    def query(self, key, since=None, until=None):
+        """Return the values of one series in [since, until] across all segments."""
+        with self.lock:
+            if key not in self.series_ids:
+                self.read_series()  # Maybe added by another process since; whole lines only, no flock needed
+            sid = self.series_ids.get(key)
+            if sid is None:
+                return array('f')
+            first = None if since is None else time.strftime("%Y%m%d", time.gmtime(since))
+            last = None if until is None else time.strftime("%Y%m%d", time.gmtime(until))
+            values = array('f')
+            for day in self.days():
+                if (first is None or day >= first) and (last is None or day <= last):
+                    values.extend(self.segment(day).select(sid, since, until))
+            return values
+
+    def stats(self, key, since=None, until=None):
+        return summarize(self.query(key, since, until))
+
+    def prune(self, keep_days=None):
+        """Delete segments older than `keep_days` days (the store's keep_days by default)."""
+        with self.lock, self.locked():
+            self._prune(self.keep_days if keep_days is None else keep_days)
+
+    def _prune(self, keep_days):
+        cutoff = time.strftime("%Y%m%d", time.gmtime(time.time() - keep_days * 86400))
+        for day in self.days():
+            if day < cutoff:
+                seg = self.segments.pop(day, None)
+                if seg is not None:
+                    seg.close()
+                shutil.rmtree(os.path.join(self.directory, day), ignore_errors=True)
+
+    def close(self):
+        with self.lock:
+            for seg in self.segments.values():
+                seg.close()
+            self.segments.clear()
+            self.series_log.close()
+            self.lock_file.close()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+POWER_BATCH_SIZE = 8        # Nodes sent a power command together
+POWER_STAGGER = 2.0         # Seconds between batches, to keep PDU inrush current down
+CONFIRM_TIMEOUT = 180       # Seconds a node gets to reach the target state
+CONFIRM_INTERVAL = 2.0      # Seconds between power state checks while waiting
+
+# Power state each action should end in. Cycle and reset have none: a reset never turns the
+# power off and the off window of a cycle is usually shorter than a state check, so a node
+# that is on afterwards says nothing about either. They are reported as sent, not confirmed.
+TARGET_STATES = {
+    'on': True,
+    'off': False,
+}
+
+
+class PowerResult:
+    """Outcome of a power action on one node."""
+
+    def __init__(self, ip, action):
+        self.ip = ip
+        self.action = action
+        self.sent = False
+        self.detail = ""
+        self.converged = False      # Seen in the target state; never for actions without one
+        self.state = None           # Last power state seen (True on / False off / None unknown)
+        self.latency = None         # Seconds from command to confirmed target state
+
+    @property
+    def confirmable(self):
+        return self.action in TARGET_STATES
+
+    @property
+    def done(self):
+        """Confirmed in the target state or, for an action the power state cannot show, sent."""
+        return self.converged or (self.sent and not self.confirmable)
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'action': self.action,
+            'sent': self.sent,
+            'converged': self.converged if self.confirmable else None,
+            'state': None if self.state is None else ("on" if self.state else "off"),
+            'latency': self.latency,
+            'detail': self.detail,
+        }
+
+
+class BulkPowerAction:
+    """Sends a power action in staggered batches and confirms every node reaches the target state."""
+
+    def __init__(self, engine, send_func, state_func, batch_size=POWER_BATCH_SIZE, stagger=POWER_STAGGER,
+                 confirm_timeout=CONFIRM_TIMEOUT, confirm_interval=CONFIRM_INTERVAL):
+        self.engine = engine
+        self.send_func = send_func      # (ip, action) -> (ok, detail)
+        self.state_func = state_func    # ip -> True / False / None, read fresh from the BMC
+        self.batch_size = max(1, batch_size)
+        self.stagger = stagger
+        self.confirm_timeout = confirm_timeout
+        self.confirm_interval = confirm_interval
+
+    async def confirm(self, result, sent_at, on_result):
+        target = TARGET_STATES[result.action]
+        deadline = sent_at + self.confirm_timeout
+        while True:
+            _, ok, state = await self.engine.fetch_one(self.state_func, result.ip)
+            if ok:
+                result.state = state
+                if state is target:
+                    result.converged = True
+                    result.latency = time.monotonic() - sent_at
+                    break
+            now = time.monotonic()
+            if now >= deadline:
+                result.detail = result.detail or "did not reach target state"
+                break
+            await asyncio.sleep(min(self.confirm_interval, deadline - now))
+        if on_result is not None:
+            on_result(result)
+
+    async def send(self, result, on_result, confirmations):
+        _, ok, outcome = await self.engine.fetch_one(lambda ip: self.send_func(ip, result.action), result.ip)
+        sent_at = time.monotonic()
+        if ok:
+            result.sent, result.detail = outcome
+        else:
+            result.detail = str(outcome)
+        if result.sent and not result.confirmable:
+            result.detail = f"{result.action} sent, not confirmable from the power state"
+        if not result.sent or not result.confirmable:
+            if on_result is not None:
+                on_result(result)
+            return
+        confirmations.append(asyncio.ensure_future(self.confirm(result, sent_at, on_result)))
+
+    async def run(self, ip_list, action, on_result=None):
+        """Run the action on every node; on_result(PowerResult) fires as each node finishes."""
+        results = {ip: PowerResult(ip, action) for ip in ip_list}
+        confirmations = []
+        for start in range(0, len(ip_list), self.batch_size):
+            if start:
+                await asyncio.sleep(self.stagger)
+            batch = ip_list[start:start + self.batch_size]
+            await asyncio.gather(*(self.send(results[ip], on_result, confirmations) for ip in batch))
+        if confirmations:
+            await asyncio.gather(*confirmations)
+        return results
+
+
+def summarize_power_results(results):
+    """Return a short multi-line summary: converged count, latency spread and the stragglers."""
+    converged = [r for r in results.values() if r.converged]
+    stragglers = [r for r in results.values() if not r.done]
+    if results and not next(iter(results.values())).confirmable:
+        sent = len(results) - len(stragglers)
+        lines = [f"{sent}/{len(results)} nodes were sent the action (the power state cannot confirm it)"]
+    else:
+        lines = [f"{len(converged)}/{len(results)} nodes reached the target state"]
+    latencies = sorted(r.latency for r in converged)
+    if latencies:
+        lines.append(f"time to state: min {latencies[0]:.1f}s  median {latencies[len(latencies) // 2]:.1f}s  "
+                     f"max {latencies[-1]:.1f}s")
+    for r in stragglers:
+        state = "unknown" if r.state is None else ("on" if r.state else "off")
+        lines.append(f"NOT CONVERGED {r.ip}: state {state}, {r.detail}")
+    return "\n".join(lines)
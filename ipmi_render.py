@@ -0,0 +1,271 @@
+import asyncio
+import os
+import re
+import select
+import shutil
+import signal
+import sys
+import termios
+import tty
+from ipmi_stats import latency
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+RESET = "\033[0m"
+HEADER_LINES = 2    # Title + column hint
+FOOTER_LINES = 1    # Status / paging line
+PANEL_LINES = 8     # Height of the stats panel when it is shown
+IP_WIDTH = 17
+CELL_WIDTH = 26
+FRAME_INTERVAL = 1 / 30  # Coalesce updates into at most ~30 screen writes per second
+
+KEY_UP = ("k", "\033[A")
+KEY_DOWN = ("j", "\033[B")
+KEY_PAGE_UP = ("b", "\033[5~")
+KEY_PAGE_DOWN = (" ", "\033[6~")
+KEY_HOME = ("g", "\033[H")
+KEY_END = ("G", "\033[F")
+KEY_QUIT = ("q", "Q")
+KEY_PANEL = ("s",)
+
+
+def visible_len(text):
+    return len(ANSI_RE.sub("", text))
+
+
+def fit(text, width):
+    """Pad or cut a string with ANSI colors to exactly `width` visible characters."""
+    out = []
+    used = 0
+    pos = 0
+    while pos < len(text) and used < width:
+        match = ANSI_RE.match(text, pos)
+        if match:
+            out.append(match.group(0))
+            pos = match.end()
+            continue
+        out.append(text[pos])
+        used += 1
+        pos += 1
+    return "".join(out) + RESET + " " * (width - used)
+
+
+def split_cells(result):
+    """Split a multi-line status result into one cell per non-empty line."""
+    return [line.strip() for line in result.splitlines() if ANSI_RE.sub("", line).strip()]
+
+
+class LiveRenderer:
+    """Full-screen renderer: one row per node, updated in place as results arrive.
+
+    Only cells whose text changed are rewritten, and only the rows that fit
+    on screen are ever drawn, so the cost of a frame follows the terminal
+    size rather than the fleet size. Keys: j/k or arrows scroll, space/b or
+    PgDn/PgUp page, g/G jump to top/bottom, s toggles the stats panel, q quits.
+    """
+
+    def __init__(self, ip_list, title, out=None, show_panel=False):
+        self.ip_list = list(ip_list)
+        self.row_of = {ip: i for i, ip in enumerate(self.ip_list)}
+        self.title = title
+        self.out = out or sys.stdout
+        self.cells = {ip: ["Waiting for first reading..."] for ip in self.ip_list}
+        self.status = ""
+        self.panel = []         # Stats panel lines, shown above the footer while show_panel is set
+        self.show_panel = show_panel
+        self.top = 0
+        self.screen = {}        # (screen line, cell index) -> text last written there
+        self.flush_handle = None
+        self.loop = None
+        self.stopped = None
+        self.saved_attrs = None
+        self.key_buffer = ""
+        self.size = shutil.get_terminal_size()
+
+    # -- terminal setup ---------------------------------------------------
+
+    def __enter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        fd = sys.stdin.fileno()
+        self.saved_attrs = termios.tcgetattr(fd)
+        tty.setcbreak(fd)  # Keys arrive one at a time without echo; CTRL-C still works
+        self.loop.add_reader(fd, self.on_input)
+        self.loop.add_signal_handler(signal.SIGWINCH, self.on_resize)
+        # Alternate screen, hidden cursor
+        self.out.write("\033[?1049h\033[?25l\033[2J")
+        self.redraw_all()
+        return self
+
+    def __exit__(self, *exc):
+        fd = sys.stdin.fileno()
+        self.loop.remove_reader(fd)
+        self.loop.remove_signal_handler(signal.SIGWINCH)
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        termios.tcsetattr(fd, termios.TCSADRAIN, self.saved_attrs)
+        self.out.write("\033[?25h\033[?1049l")
+        self.out.flush()
+        return False
+
+    # -- model updates ----------------------------------------------------
+
+    def update(self, ip, result):
+        """Set a node's row from its status text; drawn on the next frame if visible."""
+        cells = split_cells(result) or [""]
+        if cells == self.cells.get(ip):
+            return
+        self.cells[ip] = cells
+        row = self.row_of[ip]
+        if self.top <= row < self.top + self.page_size():
+            self.schedule_flush()
+
+    def set_status(self, text):
+        if text != self.status:
+            self.status = text
+            self.schedule_flush()
+
+    def set_panel(self, lines):
+        lines = list(lines)[:PANEL_LINES]
+        if lines != self.panel:
+            self.panel = lines
+            if self.show_panel:
+                self.schedule_flush()
+
+    # -- input ------------------------------------------------------------
+
+    def on_input(self):
+        try:
+            data = os.read(sys.stdin.fileno(), 64).decode('utf-8', 'ignore')
+        except OSError:
+            return
+        self.key_buffer += data
+        while self.key_buffer:
+            key = self.next_key()
+            if key is None:
+                break
+            self.handle_key(key)
+
+    def next_key(self):
+        """Pop one key (or escape sequence) off the input buffer."""
+        buf = self.key_buffer
+        if buf.startswith("\033"):
+            match = re.match(r"\033\[[0-9;]*[~A-Za-z]", buf)
+            if match is None:
+                if len(buf) < 6 and not select.select([sys.stdin], [], [], 0)[0]:
+                    # Lone ESC or a sequence that will never complete
+                    self.key_buffer = ""
+                    return buf
+                return None
+            key = match.group(0)
+        else:
+            key = buf[0]
+        self.key_buffer = buf[len(key):]
+        return key
+
+    def handle_key(self, key):
+        page = self.page_size()
+        last_top = max(0, len(self.ip_list) - page)
+        if key in KEY_QUIT:
+            self.stopped.set()
+            return
+        if key in KEY_PANEL:
+            self.show_panel = not self.show_panel
+            self.top = min(self.top, max(0, len(self.ip_list) - self.page_size()))
+            self.redraw_all()
+            return
+        if key in KEY_UP:
+            top = self.top - 1
+        elif key in KEY_DOWN:
+            top = self.top + 1
+        elif key in KEY_PAGE_UP:
+            top = self.top - page
+        elif key in KEY_PAGE_DOWN:
+            top = self.top + page
+        elif key in KEY_HOME:
+            top = 0
+        elif key in KEY_END:
+            top = last_top
+        else:
+            return
+        top = min(max(top, 0), last_top)
+        if top != self.top:
+            self.top = top
+            self.schedule_flush()
+
+    def on_resize(self):
+        self.size = shutil.get_terminal_size()
+        self.redraw_all()
+
+    # -- drawing ----------------------------------------------------------
+
+    def page_size(self):
+        panel = PANEL_LINES if self.show_panel else 0
+        return max(1, self.size.lines - HEADER_LINES - FOOTER_LINES - panel)
+
+    def cells_per_row(self):
+        return max(1, (self.size.columns - IP_WIDTH) // CELL_WIDTH)
+
+    def redraw_all(self):
+        """Forget what is on screen and repaint everything (startup / resize)."""
+        self.screen.clear()
+        self.out.write("\033[2J")
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(FRAME_INTERVAL, self.flush)
+
+    def flush(self):
+        """Write only the cells that differ from what is already on screen."""
+        self.flush_handle = None
+        with latency.timer('render'):
+            self.draw()
+
+    def draw(self):
+        page = self.page_size()
+        per_row = self.cells_per_row()
+        last = min(len(self.ip_list), self.top + page)
+        pages = max(1, -(-len(self.ip_list) // page))
+        header = f"\033[36mReal-Time {self.title} Readings"
+        hint = f"{len(self.ip_list)} nodes  |  j/k scroll  space/b page  g/G top/bottom  s stats  q quit"
+        footer = (f"rows {self.top + 1}-{last} of {len(self.ip_list)}  "
+                  f"page {self.top // page + 1}/{pages}  {self.status}")
+
+        wanted = {(-2, 0): fit(header, self.size.columns), (-1, 0): fit(hint, self.size.columns)}
+        for line in range(page):
+            row = self.top + line
+            if row < len(self.ip_list):
+                ip = self.ip_list[row]
+                cells = self.cells[ip]
+                wanted[(line, 0)] = fit(f"\033[36m{ip}", IP_WIDTH)
+                for i in range(per_row):
+                    text = cells[i] if i < len(cells) else ""
+                    wanted[(line, i + 1)] = fit(text, CELL_WIDTH)
+            else:
+                wanted[(line, 0)] = fit("", self.size.columns)
+        if self.show_panel:
+            for i in range(PANEL_LINES):
+                text = self.panel[i] if i < len(self.panel) else ""
+                wanted[(page + i, 0)] = fit(f"\033[35m{text}", self.size.columns)
+            page += PANEL_LINES
+        wanted[(page, 0)] = fit(f"\033[33m{footer}", self.size.columns)
+
+        chunks = []
+        for (line, cell), text in wanted.items():
+            if self.screen.get((line, cell)) == text:
+                continue
+            self.screen[(line, cell)] = text
+            if cell == 0 and visible_len(text) > IP_WIDTH:
+                # A full-width line covers every cell on it, forget what they held
+                for other in range(1, per_row + 1):
+                    self.screen.pop((line, other), None)
+            column = 1 if cell == 0 else IP_WIDTH + (cell - 1) * CELL_WIDTH + 1
+            chunks.append(f"\033[{line + HEADER_LINES + 1};{column}H{text}")
+        if chunks:
+            self.out.write("".join(chunks))
+            self.out.flush()
+
+    async def wait(self):
+        """Wait until the user quits."""
+        await self.stopped.wait()
@@ -0,0 +1,107 @@
+import asyncio
+
+from ipmi_fetch import interleave_by_subnet
+from ipmi_stats import latency
+
+POLL_INTERVAL = 2.0     # Seconds between ticks
+MIN_STAGGER_GAP = 0.001  # Hosts closer together than this are dispatched in the same wake-up
+
+
+class PollScheduler:
+    """Fixed-cadence, drift-compensated poller that spreads each tick's requests across the interval.
+
+    Tick k starts at start + k * interval no matter how long earlier ticks took.
+    A host whose previous request is still in flight is skipped for the tick
+    and counted as an overrun; the late result is reported with the tick that
+    dispatched it, which completes once it arrives. Ticks that were missed
+    entirely are skipped and counted too.
+    """
+
+    def __init__(self, engine, interval=POLL_INTERVAL, stagger=True):
+        self.engine = engine
+        self.interval = interval
+        self.stagger = stagger
+        self.tick = 0
+        self.skipped_ticks = 0
+        self.overruns = 0
+        self.last_tick_overruns = 0
+        self.in_flight = {}     # ip -> task
+        self.start = 0.0        # Loop time tick 0 was due
+
+    async def _sleep_until(self, loop, when):
+        delay = when - loop.time()
+        if delay > MIN_STAGGER_GAP:
+            await asyncio.sleep(delay)
+
+    async def _poll(self, tick, ip, status_func, on_result, pending, on_tick_done):
+        ip, ok, result = await self.engine.fetch_one(status_func, ip)
+        del self.in_flight[ip]
+        if on_result is not None:
+            on_result(tick, ip, ok, result)
+        results, expected = pending[tick]
+        results[ip] = (ok, result)
+        if expected is not None and len(results) == expected:
+            del pending[tick]
+            self._tick_done(tick, results, on_tick_done)
+
+    def _tick_done(self, tick, results, on_tick_done):
+        latency.record('tick', asyncio.get_running_loop().time() - (self.start + tick * self.interval))
+        if on_tick_done is not None:
+            on_tick_done(tick, results)
+
+    async def run(self, ip_list, status_func, on_result=None, on_tick_done=None, ticks=None):
+        """Poll the hosts until cancelled (or for `ticks` ticks).
+
+        on_result(tick, ip, ok, result) is called as each result arrives;
+        on_tick_done(tick, {ip: (ok, result)}) once every host dispatched in a tick has answered.
+        """
+        loop = asyncio.get_running_loop()
+        order = interleave_by_subnet(ip_list, self.engine.subnet_prefix)
+        gap = self.interval / len(order) if self.stagger and order else 0
+        pending = {}    # tick -> (results, expected count or None while still dispatching)
+        start = self.start = loop.time()
+        self.tick = 0
+
+        try:
+            while ticks is None or self.tick < ticks:
+                tick_start = start + self.tick * self.interval
+                behind = loop.time() - tick_start
+                if behind >= self.interval:
+                    # The loop itself fell behind: drop the missed ticks rather than bursting to catch up
+                    missed = int(behind // self.interval)
+                    self.skipped_ticks += missed
+                    self.tick += missed
+                    continue
+                await self._sleep_until(loop, tick_start)
+
+                tick = self.tick
+                pending[tick] = ({}, None)
+                overruns = 0
+                dispatched = 0
+                for i, ip in enumerate(order):
+                    if gap:
+                        await self._sleep_until(loop, tick_start + i * gap)
+                    if ip in self.in_flight:
+                        overruns += 1
+                        continue
+                    self.in_flight[ip] = asyncio.ensure_future(
+                        self._poll(tick, ip, status_func, on_result, pending, on_tick_done))
+                    dispatched += 1
+
+                self.overruns += overruns
+                self.last_tick_overruns = overruns
+                results, _ = pending[tick]
+                if len(results) == dispatched:
+                    del pending[tick]
+                    self._tick_done(tick, results, on_tick_done)
+                else:
+                    pending[tick] = (results, dispatched)
+                self.tick += 1
+
+            # Let the last tick's requests finish when running a fixed number of ticks
+            if self.in_flight:
+                await asyncio.gather(*self.in_flight.values(), return_exceptions=True)
+        finally:
+            for task in list(self.in_flight.values()):
+                task.cancel()
+            self.in_flight.clear()
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import threading
+import time
+from ipmi_stats import latency
+
+SDR_CACHE_DIR = os.path.expanduser("~/.cache/ntnx-cluster/sdr")
+SDR_CHECK_INTERVAL = 600  # Seconds between checks of a BMC's firmware/SDR timestamps
+
+SDR_FULL_SENSOR = 0x01
+
+SENSOR_TYPE_TEMPERATURE = 0x01
+SENSOR_TYPE_FAN = 0x04
+
+UNIT_DEGREES_C = 1
+UNIT_RPM = 18
+
+BMC_OWNER_ID = 0x20
+
+# Threshold names in SDR byte order (Full Sensor Record bytes 37-42) and their readable-mask bits
+THRESHOLD_FIELDS = (('unr', 5), ('ucr', 4), ('unc', 3), ('lnr', 2), ('lcr', 1), ('lnc', 0))
+
+# Lines of `mc info` / `sdr info` that change whenever the SDR repository may have changed
+SDR_KEY_FIELDS = ("Firmware Revision", "Aux Firmware Rev Info", "Most recent Addition", "Most recent Erase")
+
+
+def _signed(value, bits):
+    """Interpret an n-bit two's complement field."""
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+    return value
+
+
+class SdrSensor:
+    """Conversion data for one analog sensor, taken from its Full Sensor Record."""
+
+    def __init__(self, number, name, kind, m, b, b_exp, r_exp, analog_format, raw_thresholds=None, unit=None):
+        self.number = number
+        self.name = name
+        self.kind = kind            # 'temp' or 'fan'
+        self.unit = unit            # "degrees C", "RPM" or "percent"
+        self.m = m
+        self.b = b
+        self.b_exp = b_exp
+        self.r_exp = r_exp
+        self.analog_format = analog_format  # 0 unsigned, 1 one's complement, 2 two's complement
+        self.thresholds = {name: int(round(self.convert(raw))) for name, raw in (raw_thresholds or {}).items()}
+
+    def convert(self, raw):
+        """Turn a raw 8-bit reading into Celsius / RPM: y = (M*x + B*10^Bexp) * 10^Rexp."""
+        if self.analog_format == 1:
+            x = raw - 0xff if raw & 0x80 else raw
+        elif self.analog_format == 2:
+            x = _signed(raw, 8)
+        else:
+            x = raw
+        return (self.m * x + self.b * 10 ** self.b_exp) * 10 ** self.r_exp
+
+
+def parse_sdr_dump(data):
+    """Return the temperature and fan SdrSensors from the bytes of an `sdr dump` file."""
+    sensors = []
+    offset = 0
+    while offset + 5 <= len(data):
+        record_type = data[offset + 3]
+        length = data[offset + 4]
+        record = data[offset:offset + 5 + length]
+        offset += 5 + length
+        if record_type != SDR_FULL_SENSOR or len(record) < 48:
+            continue
+
+        owner, lun, number = record[5], record[6] & 0x03, record[7]
+        sensor_type = record[12]
+        analog_format = record[20] >> 6
+        base_unit = record[21]
+        linearization = record[23] & 0x7f
+        if owner != BMC_OWNER_ID or lun != 0 or analog_format == 3 or linearization != 0:
+            # Only linear sensors on the BMC itself can be read and converted directly
+            continue
+        percentage = record[20] & 0x01
+        if sensor_type == SENSOR_TYPE_TEMPERATURE and base_unit == UNIT_DEGREES_C:
+            kind, unit = 'temp', "degrees C"
+        elif sensor_type == SENSOR_TYPE_FAN and base_unit == UNIT_RPM:
+            kind, unit = 'fan', "RPM"
+        elif sensor_type == SENSOR_TYPE_FAN and percentage:
+            kind, unit = 'fan', "percent"   # e.g. HPE iLO reports fan duty cycle instead of speed
+        else:
+            continue
+
+        m = _signed(record[24] | (record[25] & 0xc0) << 2, 10)
+        b = _signed(record[26] | (record[27] & 0xc0) << 2, 10)
+        r_exp = _signed(record[29] >> 4, 4)
+        b_exp = _signed(record[29] & 0x0f, 4)
+        name_len = record[47] & 0x1f
+        name = record[48:48 + name_len].decode('ascii', 'replace').strip()
+        readable = record[18] & 0x3f
+        raw_thresholds = {field: record[36 + i] for i, (field, bit) in enumerate(THRESHOLD_FIELDS)
+                          if readable & (1 << bit)}
+        sensors.append(SdrSensor(number, name, kind, m, b, b_exp, r_exp, analog_format, raw_thresholds, unit))
+    return sensors
+
+
+def reading_command(sensor):
+    """Get Sensor Reading (NetFn 0x04, Cmd 0x2d) for one sensor number."""
+    return f"raw 0x04 0x2d 0x{sensor.number:02x}"
+
+
+def parse_reading(sensor, output):
+    """Convert `raw 0x04 0x2d` output into a value, or None if the sensor has no reading."""
+    try:
+        response = [int(byte, 16) for byte in output.split()]
+    except ValueError:
+        return None
+    # Byte 2 bit 5 set means "reading unavailable" (e.g. sensor powered down)
+    if len(response) < 2 or response[1] & 0x20:
+        return None
+    return int(round(sensor.convert(response[0])))
+
+
+def reading_status(output):
+    """Threshold status of a `raw 0x04 0x2d` response: ok, nc, cr or nr (worst crossed level)."""
+    try:
+        response = [int(byte, 16) for byte in output.split()]
+    except ValueError:
+        return "ns"
+    if len(response) < 2 or response[1] & 0x20:
+        return "ns"
+    crossed = response[2] & 0x3f if len(response) > 2 else 0
+    if crossed & 0x24:
+        return "nr"
+    if crossed & 0x12:
+        return "cr"
+    if crossed & 0x09:
+        return "nc"
+    return "ok"
+
+
+class SdrCache:
+    """Downloads each BMC's SDR repository once and keeps it on disk, keyed by IP plus firmware/SDR timestamps."""
+
+    def __init__(self, cache_dir=SDR_CACHE_DIR, check_interval=SDR_CHECK_INTERVAL):
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self.entries = {}   # ip -> (sensors or None, monotonic time of last key check)
+        self.keys = {}      # ip -> (SDR key, wall-clock time it was checked), kept across runs
+        self.lock = threading.Lock()
+        self.host_locks = {}
+
+    def _host_lock(self, ip):
+        with self.lock:
+            return self.host_locks.setdefault(ip, threading.Lock())
+
+    def cache_path(self, ip, key):
+        return os.path.join(self.cache_dir, f"{ip}-{key}.sdr")
+
+    def sdr_key(self, pool, ip):
+        """Hash the firmware revision and SDR add/erase timestamps reported by the BMC."""
+        (mc_out, _, mc_ok), (info_out, _, info_ok) = pool.run_batch(ip, ["mc info", "sdr info"])
+        if not (mc_ok and info_ok):
+            return None
+        fields = [line.strip() for line in (mc_out + info_out).splitlines()
+                  if line.split(':', 1)[0].strip() in SDR_KEY_FIELDS]
+        return hashlib.sha1("\n".join(fields).encode('utf-8')).hexdigest()[:16]
+
+    def load(self, pool, ip):
+        """Return the cached SdrSensors for a BMC, downloading its SDR if the cache is missing or stale."""
+        key = self.sdr_key(pool, ip)
+        if key is None:
+            return None
+        self.keys[ip] = (key, time.time())
+        path = self.cache_path(ip, key)
+        if not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Drop dumps for older firmware / SDR contents of this BMC
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(f"{ip}-") and name.endswith(".sdr"):
+                    os.remove(os.path.join(self.cache_dir, name))
+            tmp_path = f"{path}.tmp"
+            _, _, ok = pool.run(ip, f"sdr dump {tmp_path}")
+            if not ok or not os.path.exists(tmp_path):
+                return None
+            os.replace(tmp_path, path)
+        with open(path, 'rb') as f:
+            return parse_sdr_dump(f.read()) or None
+
+    def restore_keys(self, keys):
+        """Trust SDR keys an earlier run checked ({ip: (key, wall time)}) until their check interval is up."""
+        for ip, (key, checked) in keys.items():
+            if 0 <= time.time() - checked < self.check_interval:
+                self.keys.setdefault(ip, (key, checked))
+
+    def warm_sensors(self, ip):
+        """(SdrSensors, monotonic check time) from a restored key's dump, or None if it can't be used."""
+        key, checked = self.keys.get(ip, (None, 0))
+        age = time.time() - checked
+        path = self.cache_path(ip, key)
+        if key is None or not 0 <= age < self.check_interval or not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            sensors = parse_sdr_dump(f.read())
+        return (sensors, time.monotonic() - age) if sensors else None
+
+    def sensors(self, pool, ip):
+        """Return the SdrSensors for a BMC, or None if direct reads are not possible for it."""
+        with self._host_lock(ip):
+            entry = self.entries.get(ip)
+            if entry is None:
+                # First use this run: a key checked shortly before a restart needs no new check
+                entry = self.warm_sensors(ip)
+                if entry is not None:
+                    self.entries[ip] = entry
+            if entry is not None and time.monotonic() - entry[1] < self.check_interval:
+                return entry[0]
+            with latency.timer('sdr', ip):
+                sensors = self.load(pool, ip)
+            if sensors is None and pool.health.is_down(ip):
+                return None  # Unreachable rather than unsupported: try again once it is back
+            self.entries[ip] = (sensors, time.monotonic())
+            return sensors
@@ -0,0 +1,248 @@
+import re
+import threading
+import time
+from collections import deque
+
+SEL_INFO_COMMAND = "sel info"
+SEL_FETCH_LIMIT = 64        # Most records fetched in one go; a BMC that logged more since the last poll leaves a gap
+SEL_RECENT = 600            # Seconds a node's events stay in its recent list (and marked in the views)
+SEL_RECENT_MAX = 20         # Recent events kept per node
+
+# `sel elist` line: id | date | time | sensor type and name | description | direction [| detail]
+SEL_LINE_RE = re.compile(
+    r"^ *(?P<id>[0-9a-fA-F]+) *\| *(?P<date>[^|]*?) *\| *(?P<time>[^|]*?) *\| *(?P<sensor>[^|]*?) *\| *"
+    r"(?P<description>[^|]*?) *(?:\| *(?P<direction>Asserted|Deasserted) *)?(?:\| *(?P<detail>[^|]*?) *)?$",
+    re.MULTILINE,
+)
+
+# Sensor types as ipmitool prints them in front of the sensor name, longest first
+SENSOR_TYPES = (
+    "System ACPI Power State", "Power Supply", "Power Unit", "Temperature", "Voltage", "Current", "Fan",
+    "Processor", "Memory", "Drive Slot / Bay", "Physical Security", "Watchdog2", "System Event",
+    "Critical Interrupt", "Event Logging Disabled", "OEM",
+)
+POWER_TYPES = ("System ACPI Power State", "Power Supply", "Power Unit")
+SEVERITIES = (("non-recoverable", "nr"), ("non-critical", "nc"), ("critical", "cr"))
+
+
+class SelEvent:
+    """One System Event Log record of one node, classified for the fleet event stream."""
+
+    __slots__ = ('ip', 'record_id', 'timestamp', 'sensor_type', 'sensor', 'description', 'asserted', 'detail',
+                 'kind', 'severity')
+
+    def __init__(self, ip, record_id, timestamp, sensor_type, sensor, description, asserted=True, detail=None):
+        self.ip = ip
+        self.record_id = record_id
+        self.timestamp = timestamp      # Epoch seconds from the BMC's clock, None for pre-init records
+        self.sensor_type = sensor_type
+        self.sensor = sensor
+        self.description = description
+        self.asserted = asserted
+        self.detail = detail
+        self.kind, self.severity = classify_event(sensor_type, description)
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'record_id': self.record_id,
+            'timestamp': self.timestamp,
+            'kind': self.kind,
+            'severity': self.severity,
+            'sensor_type': self.sensor_type,
+            'sensor': self.sensor,
+            'description': self.description,
+            'asserted': self.asserted,
+            'detail': self.detail,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['ip'], data['record_id'], data['timestamp'], data['sensor_type'], data['sensor'],
+                   data['description'], data['asserted'], data.get('detail'))
+
+
+def classify_event(sensor_type, description):
+    """Return (kind, severity): kind is 'threshold', 'fan_failure', 'power' or 'other'."""
+    text = description.lower()
+    severity = None
+    for fragment, code in SEVERITIES:
+        if fragment in text:
+            severity = code
+            break
+    if sensor_type == "Fan" and ("going low" in text or "absent" in text or "failure" in text):
+        return 'fan_failure', severity or 'cr'
+    if "going high" in text or "going low" in text:
+        return 'threshold', severity
+    if sensor_type in POWER_TYPES or "power off" in text or "power down" in text:
+        return 'power', severity
+    return 'other', severity
+
+
+def split_sensor(column):
+    """Split "Temperature CPU1 Temp" into ("Temperature", "CPU1 Temp")."""
+    for sensor_type in SENSOR_TYPES:
+        if column.startswith(sensor_type):
+            return sensor_type, column[len(sensor_type):].strip() or sensor_type
+    return column, column
+
+
+def parse_sel_time(date, clock):
+    try:
+        return time.mktime(time.strptime(f"{date} {clock}", "%m/%d/%Y %H:%M:%S"))
+    except ValueError:
+        return None     # "Pre-Init" and friends: logged before the BMC knew the time
+
+
+def parse_sel_elist(ip, output):
+    """Parse `sel elist` output into SelEvents, oldest first."""
+    events = []
+    for match in SEL_LINE_RE.finditer(output):
+        sensor_type, sensor = split_sensor(match.group('sensor'))
+        events.append(SelEvent(ip, int(match.group('id'), 16), parse_sel_time(match.group('date'), match.group('time')),
+                               sensor_type, sensor, match.group('description'),
+                               match.group('direction') != "Deasserted", match.group('detail')))
+    return events
+
+
+def parse_sel_info(output):
+    """Return {'entries', 'last_add', 'last_del', 'overflow'} from `sel info` output."""
+    info = {'entries': 0, 'last_add': None, 'last_del': None, 'overflow': False}
+    for line in output.splitlines():
+        key, _, value = line.partition(':')
+        key, value = key.strip(), value.strip()
+        if key == "Entries":
+            info['entries'] = int(value) if value.isdigit() else 0
+        elif key == "Last Add Time":
+            info['last_add'] = value
+        elif key == "Last Del Time":
+            info['last_del'] = value
+        elif key == "Overflow":
+            info['overflow'] = value == "true"
+    return info
+
+
+class SelCursor:
+    """How far a node's SEL has been read."""
+
+    __slots__ = ('entries', 'last_add', 'last_del', 'last_id', 'overflow', 'unsettled')
+
+    def __init__(self, info, last_id=None):
+        self.entries = info['entries']
+        self.last_add = info['last_add']
+        self.last_del = info['last_del']
+        self.overflow = info['overflow']
+        self.last_id = last_id
+        self.unsettled = True   # Read while records were coming in: look at the newest one next time
+
+
+class SelTailer:
+    """Reads each node's SEL incrementally: one `sel info` per poll, records only when something was added.
+
+    The first poll of a node only places the cursor at the newest record; older
+    records are history, not news. A clear (or deletion) is noticed through the
+    Last Del Time and the entry count, a circular SEL that wrapped through the
+    Last Add Time changing while the count stays put. After any change the
+    newest record ID is checked once more, for records logged in the same second.
+    """
+
+    def __init__(self, fetch_limit=SEL_FETCH_LIMIT, recent=SEL_RECENT):
+        self.fetch_limit = fetch_limit
+        self.recent_seconds = recent
+        self.cursors = {}   # ip -> SelCursor
+        self.recent = {}    # ip -> deque of (monotonic time seen, SelEvent)
+        self.lock = threading.Lock()
+
+    def fetch_count(self, cursor, info):
+        """Return (records to fetch, cleared) for a node whose SEL changed."""
+        cleared = info['last_del'] != cursor.last_del or info['entries'] < cursor.entries
+        if cleared:
+            return info['entries'], True
+        added = info['entries'] - cursor.entries
+        if added <= 0:
+            # Full circular SEL: the oldest records were overwritten, the count did not move
+            return self.fetch_limit, False
+        return added + 1, False     # One record of overlap to find where we left off
+
+    def fetch(self, pool, ip, count):
+        out, err, ok = pool.run(ip, f"sel elist last {min(count, self.fetch_limit)}")
+        if not ok:
+            raise RuntimeError(err.strip() or "No response")
+        return parse_sel_elist(ip, out)
+
+    def poll(self, pool, ip, info=None):
+        """Return the node's SelEvents logged since the last poll, oldest first.
+
+        info is the (stdout, stderr, ok) of a `sel info` already run, e.g. in a snapshot's batch.
+        """
+        out, err, ok = info if info is not None else pool.run(ip, SEL_INFO_COMMAND)
+        if not ok:
+            raise RuntimeError(err.strip() or "No response")
+        info = parse_sel_info(out)
+        with self.lock:
+            cursor = self.cursors.get(ip)
+        changed = cursor is None or (info['last_add'], info['last_del'], info['entries']) != \
+            (cursor.last_add, cursor.last_del, cursor.entries)
+        if not changed and not cursor.unsettled:
+            return []
+
+        cleared = False
+        if cursor is None:
+            count = 1 if info['entries'] else 0
+        elif changed:
+            count, cleared = self.fetch_count(cursor, info)
+        else:
+            # Records logged later in the same second as the last read neither move Last Add Time
+            # (one second resolution) nor the count of a full SEL: check the newest record once
+            newest = self.fetch(pool, ip, 1)
+            if not newest or newest[-1].record_id == cursor.last_id:
+                cursor.unsettled = False
+                return []
+            count = self.fetch_limit
+        records = self.fetch(pool, ip, count) if count else []
+
+        events = []
+        if cursor is not None:
+            events = records
+            if not cleared:
+                ids = [event.record_id for event in records]
+                if cursor.last_id in ids:
+                    events = records[ids.index(cursor.last_id) + 1:]
+            if info['overflow'] and not cursor.overflow:
+                events.append(SelEvent(ip, None, time.time(), "Event Logging Disabled", "SEL",
+                                       "Log full, new events are being dropped"))
+        if records:
+            last_id = records[-1].record_id
+        elif cursor is None or cleared:
+            last_id = None
+        else:
+            last_id = cursor.last_id
+        with self.lock:
+            self.cursors[ip] = SelCursor(info, last_id)
+            if events:
+                recent = self.recent.setdefault(ip, deque(maxlen=SEL_RECENT_MAX))
+                now = time.monotonic()
+                recent.extend((now, event) for event in events)
+        return events
+
+    def recent_events(self, ip):
+        """The node's events seen within the last SEL_RECENT seconds, oldest first."""
+        cutoff = time.monotonic() - self.recent_seconds
+        with self.lock:
+            recent = self.recent.get(ip)
+            while recent and recent[0][0] < cutoff:
+                recent.popleft()
+            return [event for _, event in recent or ()]
+
+    def forget(self, ip):
+        with self.lock:
+            self.cursors.pop(ip, None)
+            self.recent.pop(ip, None)
+
+
+def active_events(events, kinds=None):
+    """Latest event per sensor that is still asserted, optionally only of some kinds."""
+    latest = {}
+    for event in events:
+        latest[(event.sensor_type, event.sensor)] = event
+    return [event for event in latest.values() if event.asserted and (kinds is None or event.kind in kinds)]
@@ -0,0 +1,180 @@
+import re
+
+# Vendor naming, per role: regex for the full sensor name, `(?P<n>...)` captures the index.
+# Every pattern of every profile is compiled into a single matcher, so a node's vendor
+# never has to be known up front.
+PROFILES = {
+    'supermicro': (
+        ('cpu', r"CPU(?P<n>\d+) Temp"),
+        ('vrm', r"(?:CPU(?P<n>\d+) )?VRM\w* Temp"),
+        ('dimm', r"(?:P\d+-)?DIMM\w+ Temp"),
+        ('system', r"System Temp"),
+        ('pch', r"PCH Temp"),
+        ('inlet', r"Inlet Temp"),
+        ('fan', r"FAN(?P<n>\d+|[A-Z])"),
+    ),
+    'dell': (
+        ('cpu', r"CPU(?P<n>\d+) Temp"),
+        ('inlet', r"Inlet Temp"),
+        ('exhaust', r"Exhaust Temp"),
+        ('fan', r"Fan(?P<n>\d+)(?: RPM)?[AB]?"),
+    ),
+    'hpe': (
+        ('cpu', r"\d+-CPU (?P<n>\d+)"),
+        ('inlet', r"\d+-Inlet Ambient"),
+        ('dimm', r"\d+-P\d+ DIMM [\w-]+"),
+        ('vrm', r"\d+-VR P(?P<n>\d+)\S*"),
+        ('system', r"\d+-Sys Exhaust\S*"),
+        ('fan', r"Fan (?P<n>\d+)"),
+    ),
+    'nutanix': (
+        ('cpu', r"CPU(?P<n>\d+)[ _]Temp"),
+        ('dimm', r"DIMM\w+[ _]Temp"),
+        ('fan', r"FAN[ _]?(?P<n>\d+)"),
+    ),
+}
+
+# Shown first to last in the temperature and fan views
+ROLE_ORDER = ('cpu', 'vrm', 'dimm', 'pch', 'inlet', 'system', 'exhaust', 'fan', 'other')
+ROLE_LABELS = {'cpu': "CPU", 'vrm': "VRM", 'fan': "FAN"}
+
+# Reading unit -> sensor kind
+UNIT_KINDS = {
+    "degrees C": 'temp',
+    "RPM": 'fan',
+    "percent": 'fan',
+    "Volts": 'voltage',
+    "Amps": 'current',
+    "Watts": 'power',
+}
+
+# One `sdr elist full` line: name | id | status | entity | reading. Parsed for the whole output in one pass.
+ELIST_RE = re.compile(
+    r"^ *(?P<name>[^|\n]*?) *\| *(?P<number>[0-9A-Fa-f]+)h *\| *(?P<status>\w+) *\| *(?P<entity>[\d.]+) *\| *"
+    r"(?:(?P<value>-?\d+(?:\.\d+)?) (?P<unit>[^|\n]*?)|(?P<text>[^|\n]*?)) *$",
+    re.MULTILINE,
+)
+
+# Name / status keywords used when no profile matches
+GENERIC_KINDS = (('temp', re.compile(r"temp", re.I)), ('fan', re.compile(r"fan", re.I)))
+
+
+def compile_profiles(profiles):
+    """Combine every profile's name patterns into one regex plus a group -> role table."""
+    parts = []
+    roles = {}
+    for p, (profile, patterns) in enumerate(sorted(profiles.items())):
+        for i, (role, pattern) in enumerate(patterns):
+            group = f"p{p}_{i}"
+            parts.append(f"(?P<{group}>{pattern.replace('(?P<n>', f'(?P<{group}n>')})")
+            roles[group] = (profile, role)
+    return re.compile("|".join(parts)), roles
+
+
+NAME_MATCHER, NAME_ROLES = compile_profiles(PROFILES)
+_name_cache = {}    # sensor name -> (role, label, sort key); the same names repeat across a fleet
+
+
+def classify(name):
+    """Return (role, display label, sort key) for a sensor name."""
+    cached = _name_cache.get(name)
+    if cached is not None:
+        return cached
+    match = NAME_MATCHER.fullmatch(name)
+    if match is None:
+        role, index = 'other', None
+    else:
+        group = match.lastgroup
+        role = NAME_ROLES[group][1]
+        index = match.groupdict().get(f"{group}n")
+    if index is not None and role in ROLE_LABELS:
+        label = f"{ROLE_LABELS[role]}{index}"
+    else:
+        label = name
+    number = int(index) if index is not None and index.isdigit() else 0
+    cached = _name_cache[name] = (role, label, (ROLE_ORDER.index(role), number, name))
+    return cached
+
+
+class SensorRecord:
+    """One sensor reading: what it is, its value and the thresholds it is judged against."""
+
+    __slots__ = ('name', 'kind', 'value', 'unit', 'status', 'entity', 'number', 'thresholds', 'role', 'label',
+                 'sort_key')
+
+    def __init__(self, name, kind, value, unit, status="ok", entity=None, number=None, thresholds=None):
+        self.name = name
+        self.kind = kind            # 'temp', 'fan', 'voltage', 'current', 'power' or 'discrete'
+        self.value = value          # float, or None when the sensor has no reading
+        self.unit = unit
+        self.status = status        # ok, ns (no reading), nc / cr / nr (threshold crossed), ...
+        self.entity = entity
+        self.number = number
+        self.thresholds = thresholds or {}  # 'unc', 'ucr', 'unr', 'lnc', 'lcr', 'lnr' -> value
+        self.role, self.label, self.sort_key = classify(name)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'value': self.value,
+            'unit': self.unit,
+            'status': self.status,
+            'role': self.role,
+            'label': self.label,
+            'thresholds': self.thresholds,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['kind'], data['value'], data['unit'], data['status'],
+                   thresholds=data.get('thresholds'))
+
+
+def parse_sdr_elist(output, thresholds=None):
+    """Parse `sdr elist full` output into {name: SensorRecord} in a single pass.
+
+    `thresholds` ({name: {...}}, e.g. from the cached SDR) is attached to the records by name.
+    """
+    records = {}
+    thresholds = thresholds or {}
+    for match in ELIST_RE.finditer(output):
+        name, number, status, entity, value, unit, text = match.groups()
+        if value is not None:
+            kind = UNIT_KINDS.get(unit, 'discrete')
+            value = float(value)
+        else:
+            kind = 'discrete'
+            unit = None
+            if status == "ns":
+                # No reading (e.g. a CPU sensor of a node that is off): guess the kind from the name
+                for guess, pattern in GENERIC_KINDS:
+                    if pattern.search(name):
+                        kind = guess
+                        break
+        key = name if name not in records else f"{name} ({number}h)"   # Some BMCs reuse a name ("Temp")
+        records[key] = SensorRecord(key, kind, value, unit, status, entity, int(number, 16), thresholds.get(name))
+    return records
+
+
+def split_readings(records):
+    """Return ({temp name: Celsius}, {fan name: reading}, {fan name: unit}) from a set of records.
+
+    Fans read in RPM, or in percent duty on BMCs that report that instead (HPE).
+    """
+    temps = {}
+    fans = {}
+    fan_units = {}
+    for record in records.values():
+        value = None if record.value is None else int(record.value)
+        if record.kind == 'temp':
+            temps[record.name] = value
+        elif record.kind == 'fan':
+            fans[record.name] = value
+            fan_units[record.name] = "percent" if record.unit == "percent" else "RPM"
+    return temps, fans, fan_units
+
+
+def records_by_role(records, kind):
+    """Records of one kind, in display order (CPUs first, by index)."""
+    return sorted((r for r in records.values() if r.kind == kind), key=lambda r: r.sort_key)
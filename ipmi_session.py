@@ -0,0 +1,385 @@
+import subprocess
+import os
+import selectors
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from ipmi_fetch import time_left
+from ipmi_health import HealthTracker
+from ipmi_stats import latency
+
+# Prompt printed by `ipmitool shell` whenever it is ready for the next command
+SHELL_PROMPT = b"ipmitool> "
+
+SESSION_START_TIMEOUT = 15    # Seconds to wait for the RMCP+ handshake / first prompt
+COMMAND_TIMEOUT = 30          # Seconds to wait for a single command's output
+SESSION_IDLE_LIMIT = 50       # BMCs drop idle lanplus sessions after ~60s, reconnect before that
+SESSIONS_PER_SLOT = 4         # Open sessions kept per fetch slot; past that the least recently used is closed
+
+# lanplus retransmits (-R) and seconds per attempt (-N); the defaults (4 retries) take far longer
+# to give up on a dead BMC, and the health tracker now decides when to try again
+LANPLUS_RETRIES = 2
+LANPLUS_TIMEOUT = 1
+
+# Cipher suites tried, in order, once a BMC turns down ipmitool's default: 17 (AES-128, SHA256)
+# is what current BMCs want, 3 (AES-128, SHA1) is all that older firmware offers
+CIPHER_SUITES = (17, 3)
+CIPHER_REJECTED = "cipher suite"    # in "... : no matching cipher suite" / "Invalid cipher suite"
+
+# stderr fragments that mean the BMC has dropped or refused the session
+SESSION_ERRORS = (
+    "unable to establish",
+    "session",
+    "close session",
+    "no response",
+    "timeout",
+    "timed out",
+)
+
+
+class SessionError(Exception):
+    """Raised when a persistent ipmitool session cannot be used."""
+
+
+class IpmiSession:
+    """One long-lived `ipmitool -I lanplus ... shell` co-process for a single BMC."""
+
+    def __init__(self, ip, user, password, extra_args=None, cipher=None):
+        self.ip = ip
+        self.user = user
+        self.password = password
+        self.extra_args = list(extra_args or [])
+        self.cipher = cipher    # Cipher suite to ask for, None for ipmitool's default
+        self.proc = None
+        self.selector = None    # poll/epoll on the co-process's stdout and stderr (select() stops at fd 1024)
+        self.buffer = bytearray()
+        self.last_used = 0.0
+        self.evicted = False    # Dropped from the pool; whoever is still using it closes it afterwards
+        self.lock = threading.Lock()
+
+    def base_args(self):
+        """Return the ipmitool argument list shared by shell and one-shot calls."""
+        # -E reads the password from IPMI_PASSWORD so it never shows up in `ps`
+        args = ["ipmitool", "-I", "lanplus", "-H", self.ip, "-U", self.user, "-E",
+                "-R", str(LANPLUS_RETRIES), "-N", str(LANPLUS_TIMEOUT)]
+        if self.cipher is not None:
+            args += ["-C", str(self.cipher)]
+        return args + self.extra_args
+
+    def env(self):
+        env = dict(os.environ)
+        env["IPMI_PASSWORD"] = self.password
+        return env
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def open(self):
+        """Start the shell co-process and wait for its first prompt (the session handshake)."""
+        self.close()
+        self.proc = subprocess.Popen(
+            self.base_args() + ["shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env(),
+        )
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.proc.stdout.fileno(), selectors.EVENT_READ)
+        self.selector.register(self.proc.stderr.fileno(), selectors.EVENT_READ)
+        self.buffer = bytearray()
+        # Readiness is signalled by the first prompt; anything on stdout before it is banner noise
+        try:
+            with latency.timer('handshake', self.ip):
+                _, err = self._read_until_prompt(time_left(SESSION_START_TIMEOUT))
+        except SessionError:
+            self.close()    # A hung handshake would otherwise keep its ipmitool until the next open()
+            raise
+        if err.strip() and not self.is_alive():
+            self.close()
+            raise SessionError(err.strip())
+        self.last_used = time.monotonic()
+
+    def close(self):
+        """Terminate the co-process, letting ipmitool close the RMCP+ session if it can."""
+        if self.proc is None:
+            return
+        try:
+            if self.proc.poll() is None:
+                self.proc.stdin.write(b"exit\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+            self.proc.wait()
+        finally:
+            self.selector.close()
+            for stream in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            self.proc = None
+            self.selector = None
+
+    def _read_until_prompt(self, timeout):
+        """Read stdout until the next shell prompt, collecting stderr alongside it."""
+        err = bytearray()
+        deadline = time.monotonic() + timeout
+        stdout_fd = self.proc.stdout.fileno()
+        stderr_fd = self.proc.stderr.fileno()
+        fds = self.selector.get_map()   # Streams at EOF are unregistered
+        while True:
+            idx = self.buffer.find(SHELL_PROMPT)
+            if idx != -1:
+                # ipmitool writes a command's stderr before its prompt, so all of it is in the pipe by now
+                while stderr_fd in fds:
+                    if not any(key.fd == stderr_fd for key, _ in self.selector.select(0)):
+                        break
+                    chunk = os.read(stderr_fd, 65536)
+                    if not chunk:
+                        self.selector.unregister(stderr_fd)
+                    err += chunk
+                out = bytes(self.buffer[:idx])
+                del self.buffer[:idx + len(SHELL_PROMPT)]
+                return out.decode('utf-8', 'replace'), bytes(err).decode('utf-8', 'replace')
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SessionError(f"Timed out waiting for ipmitool on {self.ip}")
+            if stdout_fd not in fds:
+                raise SessionError(bytes(err).decode('utf-8', 'replace').strip() or f"ipmitool exited on {self.ip}")
+
+            for key, _ in self.selector.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    self.selector.unregister(key.fd)
+                elif key.fd == stdout_fd:
+                    self.buffer += chunk
+                else:
+                    err += chunk
+
+    def _send(self, commands):
+        """Send the commands one after the other, each once the previous prompt is back; one output block each.
+
+        Not pipelined: stderr has no prompt to split it on, so it only belongs to a
+        command if the next one has not started yet. ipmitool runs the commands one
+        at a time either way, so this costs a pipe turnaround, not a BMC round trip.
+        """
+        results = []
+        for command in commands:
+            started = time.perf_counter()
+            self.proc.stdin.write(f"{command}\n".encode('utf-8'))
+            self.proc.stdin.flush()
+            out, err = self._read_until_prompt(time_left(COMMAND_TIMEOUT))
+            latency.record('command', time.perf_counter() - started, self.ip, command)
+            # readline-enabled builds echo the command line back, drop it
+            first, sep, tail = out.partition("\n")
+            if first.strip() == command.strip():
+                out = tail
+            results.append((out, err))
+        self.last_used = time.monotonic()
+        return results
+
+    def run_batch(self, commands):
+        """Run several commands back to back over the session; returns [(stdout, stderr), ...].
+
+        The session is reopened once if it turns out to have expired.
+        """
+        with self.lock:
+            try:
+                return self._run_batch(commands)
+            finally:
+                if self.evicted:
+                    self.close()
+
+    def _run_batch(self, commands):
+        """run_batch() with the session lock held."""
+        for attempt in (1, 2):
+            expired = time.monotonic() - self.last_used > SESSION_IDLE_LIMIT
+            if not self.is_alive() or expired:
+                self.open()
+            try:
+                results = self._send(commands)
+            except (SessionError, OSError, ValueError):
+                self.close()
+                if attempt == 2:
+                    raise
+                continue
+            if attempt == 1 and any(_is_session_error(out, err) for out, err in results):
+                self.close()
+                continue
+            return results
+
+    def run(self, command):
+        """Run one command over the session and return (stdout, stderr)."""
+        return self.run_batch([command])[0]
+
+
+def _is_session_error(out, err):
+    """Return True if a command failed because the RMCP+ session itself is gone."""
+    if out.strip() or not err.strip():
+        return False
+    err = err.lower()
+    return any(fragment in err for fragment in SESSION_ERRORS)
+
+
+class SessionPool:
+    """Keeps persistent sessions to the BMCs and falls back to one-shot ipmitool when needed.
+
+    At most `max_sessions` shell co-processes are kept open: opening one more
+    closes the least recently used, and sessions idle past SESSION_IDLE_LIMIT
+    (which the BMC would have dropped anyway) are closed as well.
+    """
+
+    def __init__(self, user, password, extra_args=None, max_sessions=None):
+        self.user = user
+        self.password = password
+        self.extra_args = list(extra_args or [])
+        self.max_sessions = max_sessions    # None: no limit
+        self.sessions = OrderedDict()       # ip -> IpmiSession, least recently used first
+        self.used = {}                      # ip -> monotonic time the session was last handed out
+        self.no_shell = set()   # BMCs / ipmitool builds where `shell` could not be used
+        self.credentials = {}   # ip -> (user, password) for BMCs that don't use the defaults
+        self.ciphers = {}       # ip -> cipher suite the BMC accepted after turning down the default
+        self.ciphers_tried = {}  # ip -> cipher suites turned down this run (None: ipmitool's default)
+        self.health = HealthTracker()
+        self.lock = threading.Lock()
+
+    def get(self, ip):
+        with self.lock:
+            now = time.monotonic()
+            session = self.sessions.get(ip)
+            if session is None:
+                user, password = self.credentials.get(ip, (self.user, self.password))
+                session = IpmiSession(ip, user, password, self.extra_args, self.ciphers.get(ip))
+                self.sessions[ip] = session
+            else:
+                self.sessions.move_to_end(ip)
+            self.used[ip] = now
+            evicted = self._evict(now)
+        for old in evicted:
+            # One still in use is closed by its user once its batch is done (see IpmiSession.run_batch)
+            if old.lock.acquire(blocking=False):
+                try:
+                    old.close()
+                finally:
+                    old.lock.release()
+        return session
+
+    def _evict(self, now):
+        """Drop the sessions past max_sessions and the idle ones, oldest first; returns them for closing."""
+        evicted = []
+        for ip in list(self.sessions):
+            over = self.max_sessions is not None and len(self.sessions) > self.max_sessions
+            if not over and now - self.used[ip] <= SESSION_IDLE_LIMIT:
+                break
+            session = self.sessions.pop(ip)
+            del self.used[ip]
+            session.evicted = True
+            evicted.append(session)
+        return evicted
+
+    def set_credentials(self, ip, user, password):
+        """Use other credentials for one BMC (closing its session if it has one)."""
+        with self.lock:
+            self.credentials[ip] = (user, password)
+            session = self.sessions.pop(ip, None)
+            self.used.pop(ip, None)
+        if session is not None:
+            session.close()
+
+    def next_cipher(self, ip, error):
+        """After the BMC rejected a cipher suite, switch it to the next one; False once all were tried."""
+        if CIPHER_REJECTED not in error.lower():
+            return False
+        with self.lock:
+            tried = self.ciphers_tried.setdefault(ip, set())
+            tried.add(self.ciphers.get(ip))
+            remaining = [cipher for cipher in CIPHER_SUITES if cipher not in tried]
+            if not remaining:
+                return False
+            self.ciphers[ip] = remaining[0]
+            session = self.sessions.pop(ip, None)
+            self.used.pop(ip, None)
+        if session is not None:
+            session.close()
+        return True
+
+    def capabilities(self):
+        """What was learned about each BMC that a later run can reuse: {ip: {'cipher': n, 'shell': False}}."""
+        with self.lock:
+            hosts = {ip: {'cipher': cipher} for ip, cipher in self.ciphers.items()}
+            for ip in self.no_shell:
+                hosts.setdefault(ip, {})['shell'] = False
+        return hosts
+
+    def restore_capabilities(self, hosts):
+        """Start from what an earlier run learned (see capabilities()), skipping the failed attempts."""
+        with self.lock:
+            for ip, known in hosts.items():
+                if known.get('cipher') in CIPHER_SUITES:
+                    self.ciphers[ip] = known['cipher']
+                if known.get('shell') is False:
+                    self.no_shell.add(ip)
+
+    def run_batch(self, ip, commands):
+        """Run commands for one BMC, returning [(stdout, stderr, ok), ...].
+
+        Hosts whose circuit is open fail immediately with an "unreachable since" error.
+        A BMC that turns down the cipher suite is retried with the next one in CIPHER_SUITES.
+        """
+        if not self.health.allow(ip):
+            return [("", self.health.describe(ip), False) for _ in commands]
+        results = None
+        while results is None and ip not in self.no_shell:
+            try:
+                results = [(out, err, not (err.strip() and not out.strip()))
+                           for out, err in self.get(ip).run_batch(commands)]
+            except (SessionError, OSError, ValueError) as e:
+                if self.next_cipher(ip, str(e)):
+                    continue
+                if "invalid command" not in str(e).lower():
+                    self.health.record_failure(ip, str(e))
+                    return [("", str(e), False) for _ in commands]
+                # This ipmitool build has no `shell`, use one-shot calls for this BMC from now on
+                self.no_shell.add(ip)
+        if results is None:
+            results = [self.run_oneshot(ip, command) for command in commands]
+            while not any(ok for _, _, ok in results) and self.next_cipher(ip, results[0][1]):
+                results = [self.run_oneshot(ip, command) for command in commands]
+        if not any(ok for _, _, ok in results) and all(_is_session_error(out, err) for out, err, _ in results):
+            self.health.record_failure(ip, results[0][1].strip())
+        else:
+            self.health.record_success(ip)  # The BMC answered, even if a command was rejected
+        return results
+
+    def run(self, ip, command):
+        """Run one command for one BMC, returning (stdout, stderr, ok)."""
+        return self.run_batch(ip, [command])[0]
+
+    def run_oneshot(self, ip, command):
+        """Run one command in its own ipmitool process, returning (stdout, stderr, ok)."""
+        session = self.get(ip)
+        try:
+            with latency.timer('oneshot', ip, command):
+                result = subprocess.run(
+                    session.base_args() + shlex.split(command),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    env=session.env(),
+                    timeout=time_left(COMMAND_TIMEOUT),
+                )
+        except subprocess.TimeoutExpired:
+            return "", f"Timed out waiting for ipmitool on {ip}", False
+        return (result.stdout.decode('utf-8', 'replace'), result.stderr.decode('utf-8', 'replace'),
+                result.returncode == 0)
+
+    def close_all(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+            self.used.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,446 @@
+"""Stand-in for ipmitool used by the benchmarks: simulated BMCs with configurable latency and failures.
+
+Put sim/ on PATH so `ipmitool` resolves to it. Behaviour is set through environment variables:
+
+    IPMI_SIM_LATENCY        seconds per command (default 0.005)
+    IPMI_SIM_JITTER         extra random 0..JITTER seconds per command (default 0.002)
+    IPMI_SIM_HANDSHAKE      seconds for session setup (default 0.05)
+    IPMI_SIM_TIMEOUT_RATE   probability a command times out (default 0)
+    IPMI_SIM_TIMEOUT        seconds a timed out command hangs before failing (default 2)
+    IPMI_SIM_DOWN_HOSTS     comma separated hosts that never answer
+    IPMI_SIM_LEGACY_HOSTS   comma separated hosts that only accept cipher suite 3 (older firmware)
+    IPMI_SIM_PROFILE        supermicro, dell, hpe or mixed (default supermicro)
+    IPMI_SIM_STATE_DIR      where per-host power state and SEL are kept
+    IPMI_SIM_SEL_SIZE       SEL records kept before the oldest are overwritten (default 512)
+    IPMI_SIM_REPLAY_DIR     serve recorded output from here when a recording exists
+    IPMI_SIM_RECORD_DIR     run the real ipmitool (IPMI_SIM_REAL_IPMITOOL) and record its output here
+
+`python ipmi_sim.py sel-add HOST "Temperature CPU1 Temp" "Upper Critical going high" [Asserted|Deasserted] [DETAIL]`
+logs an event in a simulated BMC's SEL.
+"""
+import hashlib
+import math
+import os
+import random
+import sys
+import time
+
+# json/subprocess/tempfile are imported where used: every simulated BMC is its own process,
+# so start-up cost is multiplied by the fleet size
+
+PROFILES = {
+    'supermicro': [
+        # name, sensor number, kind, base value, unit multiplier in the SDR
+        ("CPU1 Temp", 0x01, 'temp', 45, 1),
+        ("CPU2 Temp", 0x02, 'temp', 47, 1),
+        ("System Temp", 0x0b, 'temp', 31, 1),
+        ("DIMMA1 Temp", 0xb0, 'temp', 38, 1),
+        ("FAN1", 0x41, 'fan', 3000, 75),
+        ("FAN2", 0x42, 'fan', 3100, 75),
+        ("FAN3", 0x43, 'fan', 2900, 75),
+        ("FAN4", 0x44, 'fan', 3200, 75),
+        ("12V", 0x30, 'volt', 12.1, None),
+    ],
+    'dell': [
+        ("Inlet Temp", 0x04, 'temp', 22, 1),
+        ("CPU1 Temp", 0x0e, 'temp', 52, 1),
+        ("CPU2 Temp", 0x0f, 'temp', 50, 1),
+        ("Fan1", 0x30, 'fan', 4800, 120),
+        ("Fan2", 0x31, 'fan', 4920, 120),
+        ("Fan3", 0x32, 'fan', 4680, 120),
+        ("Fan4", 0x33, 'fan', 4800, 120),
+        ("Fan5", 0x34, 'fan', 4800, 120),
+        ("Fan6", 0x35, 'fan', 4920, 120),
+    ],
+    'hpe': [
+        ("01-Inlet Ambient", 0x01, 'temp', 21, 1),
+        ("02-CPU 1", 0x02, 'temp', 40, 1),
+        ("03-CPU 2", 0x03, 'temp', 40, 1),
+        ("Fan 1", 0x20, 'percent', 23.5, 1),
+        ("Fan 2", 0x21, 'percent', 23.5, 1),
+        ("Fan 3", 0x22, 'percent', 27.4, 1),
+    ],
+}
+
+MC_INFO = """Device ID                 : 32
+Device Revision           : 1
+Firmware Revision         : 1.71
+IPM Version               : 2.0
+Manufacturer ID           : 10876
+Manufacturer Name         : Supermicro
+"""
+
+SDR_INFO = """SDR Version                         : 0x51
+Record Count                        : {count}
+Most recent Addition                : 01/01/2024 00:00:00
+Most recent Erase                   : 01/01/2024 00:00:00
+"""
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class SimBmc:
+    """One simulated BMC: power state on disk, sensor readings that drift around a base value."""
+
+    def __init__(self, host):
+        self.host = host
+        self.latency = env_float("IPMI_SIM_LATENCY", 0.005)
+        self.jitter = env_float("IPMI_SIM_JITTER", 0.002)
+        self.timeout_rate = env_float("IPMI_SIM_TIMEOUT_RATE", 0)
+        self.timeout = env_float("IPMI_SIM_TIMEOUT", 2)
+        self.down = host in os.environ.get("IPMI_SIM_DOWN_HOSTS", "").split(",")
+        profile = os.environ.get("IPMI_SIM_PROFILE", "supermicro")
+        if profile == "mixed":
+            names = sorted(PROFILES)
+            profile = names[int(hashlib.sha1(host.encode()).hexdigest(), 16) % len(names)]
+        self.sensors = PROFILES.get(profile, PROFILES['supermicro'])
+        state_dir = os.environ.get("IPMI_SIM_STATE_DIR")
+        if not state_dir:
+            import tempfile
+            state_dir = os.path.join(tempfile.gettempdir(), "ipmi-sim")
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_path = os.path.join(state_dir, f"{host}.power")
+        self.sel_path = os.path.join(state_dir, f"{host}.sel")
+        self.rng = random.Random(f"{host}-{os.getpid()}-{time.time()}")
+
+    @property
+    def power(self):
+        try:
+            with open(self.state_path) as f:
+                return f.read().strip() != "off"
+        except OSError:
+            return True
+
+    def set_power(self, on):
+        with open(self.state_path, 'w') as f:
+            f.write("on" if on else "off")
+        self.log_event("Power Unit Power Unit", "Power off/down", "Deasserted" if on else "Asserted")
+
+    def load_sel(self):
+        import json
+        try:
+            with open(self.sel_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'next_id': 1, 'last_add': None, 'last_del': None, 'records': []}
+
+    def save_sel(self, sel):
+        import json
+        tmp_path = f"{self.sel_path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(sel, f)
+        os.replace(tmp_path, self.sel_path)  # Shell sessions of the same host read it concurrently
+
+    def log_event(self, sensor, description, direction="Asserted", detail=None):
+        """Append a record, overwriting the oldest once the SEL is full (record IDs wrap at 0xffff)."""
+        sel = self.load_sel()
+        now = time.time()
+        sel['records'].append([sel['next_id'], now, sensor, description, direction, detail])
+        sel['records'] = sel['records'][-int(env_float("IPMI_SIM_SEL_SIZE", 512)):]
+        sel['next_id'] = sel['next_id'] % 0xffff + 1
+        sel['last_add'] = now
+        self.save_sel(sel)
+
+    def sel_info(self):
+        sel = self.load_sel()
+        stamp = lambda t: time.strftime("%m/%d/%Y %H:%M:%S", time.localtime(t)) if t else "Not Available"
+        return (f"SEL Information\nVersion          : 1.5 (v1.5, v2 compliant)\n"
+                f"Entries          : {len(sel['records'])}\nLast Add Time    : {stamp(sel['last_add'])}\n"
+                f"Last Del Time    : {stamp(sel['last_del'])}\nOverflow         : false\n")
+
+    def sel_elist(self, last=None):
+        records = self.load_sel()['records']
+        lines = []
+        for record_id, stamp, sensor, description, direction, detail in records[-last:] if last else records:
+            day, clock = time.strftime("%m/%d/%Y|%H:%M:%S", time.localtime(stamp)).split("|")
+            line = f"{record_id:>4x} | {day} | {clock} | {sensor} | {description} | {direction}"
+            lines.append(line + (f" | {detail}" if detail else ""))
+        return "".join(f"{line}\n" for line in lines)
+
+    def clear_sel(self):
+        sel = self.load_sel()
+        sel['records'] = []
+        sel['last_del'] = time.time()
+        self.save_sel(sel)
+
+    def wait(self):
+        """Sleep for one command's latency; returns False if the command should time out."""
+        if self.down or self.rng.random() < self.timeout_rate:
+            time.sleep(self.timeout)
+            return False
+        time.sleep(self.latency + self.rng.random() * self.jitter)
+        return True
+
+    def value(self, base, kind):
+        # Slow sine drift plus a little noise, so history and alerting have something to chew on
+        drift = math.sin(time.time() / 60 + sum(self.host.encode()) % 10)
+        if kind == 'temp':
+            return int(round(base + 3 * drift + self.rng.uniform(-1, 1)))
+        if kind == 'fan':
+            return int(round(base + 150 * drift + self.rng.uniform(-50, 50)))
+        return round(base + self.rng.uniform(-0.1, 0.1), 2)
+
+    def sdr_lines(self, kinds=None):
+        lines = []
+        for name, number, kind, base, _ in self.sensors:
+            if kinds is not None and kind not in kinds:
+                continue
+            entity = "3.1" if kind == 'temp' else "29.1" if kind in ('fan', 'percent') else "7.1"
+            if not self.power and kind in ('temp', 'fan', 'percent') and "CPU" in name:
+                lines.append(f"{name:<16} | {number:02X}h | ns  | {entity:>4} | No Reading")
+                continue
+            value = self.value(base, kind)
+            unit = {'temp': "degrees C", 'fan': "RPM", 'percent': "percent", 'volt': "Volts"}[kind]
+            lines.append(f"{name:<16} | {number:02X}h | ok  | {entity:>4} | {value} {unit}")
+        return "\n".join(lines) + "\n"
+
+    def sdr_dump(self):
+        """Full Sensor Records for the temperature and fan sensors, as `sdr dump` would write them."""
+        data = bytearray()
+        for record_id, (name, number, kind, _, m) in enumerate(self.sensors, 1):
+            if kind not in ('temp', 'fan', 'percent'):
+                continue
+            body = bytearray(43 + len(name))
+            body[0] = 0x20                          # Owner: BMC
+            body[2] = number
+            body[7] = 0x01 if kind == 'temp' else 0x04
+            body[15] = 0x01 if kind == 'percent' else 0x00  # Percentage flag
+            body[16] = {'temp': 1, 'fan': 18, 'percent': 0}[kind]  # degrees C / RPM / unspecified
+            body[19] = m & 0xff
+            body[20] = (m >> 2) & 0xc0
+            if kind == 'temp':
+                body[13] = 0x38                     # Readable: UNC, UCR, UNR
+                body[31:34] = bytes([95, 90, 85])   # UNR, UCR, UNC in degrees C
+            elif kind == 'fan':
+                body[13] = 0x07                     # Readable: LNC, LCR, LNR
+                body[34:37] = bytes([300 // m, 500 // m, 700 // m])  # LNR, LCR, LNC in RPM / m
+            body[42] = 0xc0 | len(name)
+            body[43:] = name.encode('ascii')
+            data += bytes([record_id & 0xff, record_id >> 8, 0x51, 0x01, len(body)]) + body
+        return bytes(data)
+
+    def raw_reading(self, number):
+        for name, sensor_number, kind, base, m in self.sensors:
+            if sensor_number == number and m:
+                if not self.power and "CPU" in name:
+                    return " 00 e0 c0 00"   # Reading unavailable
+                raw = max(0, min(255, int(round(self.value(base, kind) / m))))
+                return f" {raw:02x} c0 c0 00"
+        return None
+
+    def run(self, argv):
+        """Execute one ipmitool command; returns (stdout, stderr, exit status)."""
+        if not self.wait():
+            return "", "Unable to establish IPMI v2 / RMCP+ session\n", 1
+        command = " ".join(argv)
+        if command == "chassis power status":
+            return f"Chassis Power is {'on' if self.power else 'off'}\n", "", 0
+        if command in ("chassis power on", "chassis power off", "chassis power cycle", "chassis power reset"):
+            action = argv[-1]
+            self.set_power(action != "off")
+            return f"Chassis Power Control: {'Up/On' if action == 'on' else action.title()}\n", "", 0
+        if command == "sdr elist full" or command == "sdr elist":
+            return self.sdr_lines(), "", 0
+        if command == "sdr type temperature":
+            return self.sdr_lines(('temp',)), "", 0
+        if command == "sdr type fan":
+            return self.sdr_lines(('fan', 'percent')), "", 0
+        if command == "sel info":
+            return self.sel_info(), "", 0
+        if argv[:2] == ["sel", "elist"]:
+            last = int(argv[3]) if argv[2:3] == ["last"] and len(argv) == 4 else None
+            return self.sel_elist(last), "", 0
+        if command == "sel clear":
+            self.clear_sel()
+            return "Clearing SEL.  Please allow a few seconds to erase.\n", "", 0
+        if command == "mc info":
+            return MC_INFO, "", 0
+        if command == "sdr info":
+            return SDR_INFO.format(count=len(self.sensors)), "", 0
+        if argv[:2] == ["sdr", "dump"] and len(argv) == 3:
+            with open(argv[2], 'wb') as f:
+                f.write(self.sdr_dump())
+            return f"Dumping Sensor Data Repository to '{argv[2]}'\n", "", 0
+        if argv[:3] == ["raw", "0x04", "0x2d"] and len(argv) == 4:
+            reading = self.raw_reading(int(argv[3], 16))
+            if reading is None:
+                return "", "Unable to send RAW command (channel=0x0 netfn=0x4 lun=0x0 cmd=0x2d rsp=0xcb)\n", 1
+            return reading + "\n", "", 0
+        return "", f"Invalid command: {command}\n", 1
+
+
+def recording_path(directory, host, command):
+    key = hashlib.sha1(command.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory, host, f"{key}.json")
+
+
+def replay(host, command):
+    """Return a recorded (stdout, stderr, status) for this command, preferring the same host."""
+    directory = os.environ.get("IPMI_SIM_REPLAY_DIR")
+    if not directory:
+        return None
+    path = recording_path(directory, host, command)
+    if not os.path.exists(path):
+        # Any host's recording of the same command will do, so one real node can stand in for many
+        key = os.path.basename(path)
+        for other in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+            candidate = os.path.join(directory, other, key)
+            if os.path.exists(candidate):
+                path = candidate
+                break
+        else:
+            return None
+    import json
+    with open(path) as f:
+        record = json.load(f)
+    return record['stdout'], record['stderr'], record['returncode']
+
+
+def record(host, options, argv):
+    """Run the real ipmitool and save its output for later replay."""
+    import json
+    import subprocess
+    directory = os.environ["IPMI_SIM_RECORD_DIR"]
+    real = os.environ.get("IPMI_SIM_REAL_IPMITOOL", "/usr/bin/ipmitool")
+    env = dict(os.environ)
+    env.pop("IPMI_SIM_RECORD_DIR")  # In case the "real" ipmitool is another simulator
+    result = subprocess.run([real] + options + argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    stdout = result.stdout.decode('utf-8', 'replace')
+    stderr = result.stderr.decode('utf-8', 'replace')
+    command = " ".join(argv)
+    path = recording_path(directory, host, command)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'host': host, 'command': command, 'stdout': stdout, 'stderr': stderr,
+                   'returncode': result.returncode}, f, indent=1)
+    return stdout, stderr, result.returncode
+
+
+def execute(bmc, options, argv):
+    command = " ".join(argv)
+    if os.environ.get("IPMI_SIM_RECORD_DIR"):
+        return record(bmc.host, options, argv)
+    recorded = replay(bmc.host, command)
+    if recorded is not None:
+        bmc.wait()
+        return recorded
+    return bmc.run(argv)
+
+
+def split_args(args):
+    """Split ipmitool's argv into (connection options, host, command words)."""
+    options = []
+    host = "localhost"
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-I", "-H", "-U", "-P", "-C", "-S", "-R", "-N", "-L", "-p", "-y", "-k"):
+            if arg == "-H" and i + 1 < len(args):
+                host = args[i + 1]
+            options += args[i:i + 2]
+            i += 2
+        elif arg.startswith("-"):
+            options.append(arg)
+            i += 1
+        else:
+            break
+    return options, host, args[i:]
+
+
+def cipher_rejected(bmc, options):
+    """Older firmware only offers cipher suite 3; ipmitool asks for 17 unless told otherwise."""
+    if bmc.host not in os.environ.get("IPMI_SIM_LEGACY_HOSTS", "").split(","):
+        return False
+    cipher = options[options.index("-C") + 1] if "-C" in options[:-1] else "17"
+    if cipher == "3":
+        return False
+    sys.stderr.write("Error in open session response message : no matching cipher suite\n"
+                     "Unable to establish IPMI v2 / RMCP+ session\n")
+    return True
+
+
+def shell(bmc, options):
+    """`ipmitool shell`: one session, commands read line by line from stdin."""
+    time.sleep(env_float("IPMI_SIM_HANDSHAKE", 0.05))
+    if bmc.down:
+        time.sleep(bmc.timeout)
+        sys.stderr.write("Unable to establish IPMI v2 / RMCP+ session\n")
+        return 1
+    if cipher_rejected(bmc, options):
+        return 1
+    out = sys.stdout
+    out.write("ipmitool> ")
+    out.flush()
+    for line in sys.stdin:
+        words = line.split()
+        if words in (["exit"], ["quit"]):
+            break
+        if words:
+            stdout, stderr, _ = execute(bmc, options, words)
+            if stderr:
+                sys.stderr.write(stderr)
+                sys.stderr.flush()
+            out.write(stdout)
+        out.write("ipmitool> ")
+        out.flush()
+    return 0
+
+
+def rmcp_responder(bind="0.0.0.0", port=623):
+    """Answer RMCP/ASF presence pings; bound to 0.0.0.0 every 127.x address on loopback is a live BMC."""
+    import socket
+    import struct
+    pktinfo = getattr(socket, "IP_PKTINFO", 8)
+    down = set(os.environ.get("IPMI_SIM_DOWN_HOSTS", "").split(","))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, pktinfo, 1)
+    sock.bind((bind, port))
+    while True:
+        data, ancillary, _, (ip, src_port) = sock.recvmsg(512, 64)
+        if len(data) < 12 or data[3] != 0x06 or data[8] != 0x80:
+            continue
+        # The address the ping was sent to is the simulated BMC; answer from it
+        target = None
+        for level, kind, cmsg in ancillary:
+            if level == socket.IPPROTO_IP and kind == pktinfo:
+                target = socket.inet_ntoa(cmsg[8:12])
+        if target in down:
+            continue
+        pong = data[:4] + b"\x00\x00\x11\xbe" + bytes([0x40, data[9], 0x00, 0x10])
+        pong += b"\x00\x00\x11\xbe" + bytes(4) + bytes([0x81, 0x00]) + bytes(6)
+        if target is None:
+            sock.sendto(pong, (ip, src_port))
+        else:
+            info = struct.pack("I4s4s", 0, socket.inet_aton(target), bytes(4))
+            sock.sendmsg([pong], [(socket.IPPROTO_IP, pktinfo, info)], 0, (ip, src_port))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["rmcp-responder"]:
+        # ipmi_sim.py rmcp-responder [PORT]
+        rmcp_responder(port=int(argv[1]) if len(argv) > 1 else 623)
+        return 0
+    if argv[:1] == ["sel-add"] and len(argv) >= 4:
+        SimBmc(argv[1]).log_event(*argv[2:6])
+        return 0
+    options, host, command = split_args(argv)
+    bmc = SimBmc(host)
+    if command == ["shell"]:
+        return shell(bmc, options)
+    time.sleep(env_float("IPMI_SIM_HANDSHAKE", 0.05))
+    if cipher_rejected(bmc, options):
+        return 1
+    stdout, stderr, status = execute(bmc, options, command)
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import threading
+import time
+from ipmi_sdr import parse_reading, reading_command, reading_status
+from ipmi_sel import SEL_INFO_COMMAND, SelEvent
+from ipmi_sensors import SensorRecord, parse_sdr_elist, split_readings
+from ipmi_stats import latency
+
+POWER_STATE_TTL = 10  # Seconds a chassis power reading is trusted before asking the BMC again
+
+POWER_COMMAND = "chassis power status"
+SENSOR_COMMAND = "sdr elist full"
+
+
+class NodeSnapshot:
+    """Power state plus every temperature and fan reading of one node, taken in one go."""
+
+    def __init__(self, ip, power=None, records=None, error=None, timestamp=None, stale=None, events=None):
+        self.ip = ip
+        self.power = power              # True (on), False (off) or None (unknown)
+        self.records = records or {}    # sensor name -> SensorRecord
+        # name -> Celsius / fan reading (None if no reading), and each fan's unit ("RPM" or "percent")
+        self.temps, self.fans, self.fan_units = split_readings(self.records)
+        self.error = error              # Error text if the BMC could not be read
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.stale = stale or set()     # Sensors not re-read this time (adaptive sampling), values carried over
+        self.events = events or []      # The node's recent SelEvents, oldest first
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'power': self.power,
+            'temps': self.temps,
+            'fans': self.fans,
+            'fan_units': self.fan_units,
+            'sensors': [record.to_dict() for record in self.records.values()],
+            'error': self.error,
+            'timestamp': self.timestamp,
+            'stale': sorted(self.stale),
+            'events': [event.to_dict() for event in self.events],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a snapshot from to_dict() output, e.g. one served by the polling daemon."""
+        records = {}
+        for record in data.get('sensors', ()):
+            records[record['name']] = SensorRecord.from_dict(record)
+        events = [SelEvent.from_dict(event) for event in data.get('events', ())]
+        return cls(data['ip'], data['power'], records, data['error'], data['timestamp'], set(data.get('stale', ())),
+                   events)
+
+
+class PowerCache:
+    """Short-lived cache of chassis power state so it is not re-queried before every sensor read."""
+
+    def __init__(self, ttl=POWER_STATE_TTL):
+        self.ttl = ttl
+        self.states = {}  # ip -> (power, monotonic time)
+        self.lock = threading.Lock()
+
+    def get(self, ip):
+        """Return the cached power state, or None if there is no fresh entry."""
+        with self.lock:
+            entry = self.states.get(ip)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def set(self, ip, power):
+        with self.lock:
+            self.states[ip] = (power, time.monotonic())
+
+    def invalidate(self, ip):
+        """Forget the cached state, e.g. right after a power action."""
+        with self.lock:
+            self.states.pop(ip, None)
+
+
+def parse_power_status(output):
+    """Return True/False for `chassis power status` output."""
+    return "off" not in output.lower()
+
+
+def follow_sel(sel_tailer, pool, power_cache, sampler, ip, info):
+    """Take in a node's new SEL records: the sensors they name are re-read on the next poll, power changes too."""
+    try:
+        events = sel_tailer.poll(pool, ip, info)
+    except RuntimeError:
+        return  # The snapshot reports the node's error
+    for event in events:
+        if event.kind == 'power':
+            power_cache.invalidate(ip)
+        elif event.sensor_type in ("Temperature", "Fan") and sampler is not None:
+            sampler.wake(ip, event.sensor)
+
+
+def take_snapshot(pool, power_cache, ip, sdr_cache=None, sampler=None, sel_tailer=None):
+    """Read power state and all sensors for one node in a single batched request to its session.
+
+    With an SdrCache the sensors are read directly by number using the cached SDR,
+    otherwise the BMC is asked for a full `sdr elist`. With an AdaptiveSampler only
+    the sensors that are due are read; the others keep their last value and are
+    listed in the snapshot's `stale` set. With a SelTailer, `sel info` rides in the
+    same batch and the SEL is only read further when it changed.
+    """
+    power = power_cache.get(ip)
+    if power is False:
+        # Known to be off: sensors would only read "no reading", don't bother the BMC with them
+        if sel_tailer is not None:
+            follow_sel(sel_tailer, pool, power_cache, sampler, ip, None)
+        return NodeSnapshot(ip, power=False)
+
+    now = time.monotonic()
+    sensors = sdr_cache.sensors(pool, ip) if sdr_cache is not None else None
+    if sensors:
+        if sampler is not None:
+            sensors = [sensor for sensor in sensors if sampler.due(ip, sensor.name, now)]
+        commands = [reading_command(sensor) for sensor in sensors]
+    elif sampler is None or sampler.node_due(ip, now):
+        commands = [SENSOR_COMMAND]
+    else:
+        commands = []
+    if power is None:
+        commands.insert(0, POWER_COMMAND)
+    if sel_tailer is not None:
+        commands.append(SEL_INFO_COMMAND)
+    results = pool.run_batch(ip, commands) if commands else []
+    if sel_tailer is not None:
+        follow_sel(sel_tailer, pool, power_cache, sampler, ip, results.pop())
+
+    if power is None:
+        out, err, ok = results.pop(0)
+        if not ok:
+            return NodeSnapshot(ip, error=err.strip() or "No response")
+        power = parse_power_status(out)
+        power_cache.set(ip, power)
+    if not power:
+        if sampler is not None:
+            sampler.forget(ip)
+        return NodeSnapshot(ip, power=False)
+
+    records = {}
+    if sensors:
+        with latency.timer('parse', ip):
+            for sensor, (out, _, ok) in zip(sensors, results):
+                value = parse_reading(sensor, out) if ok else None
+                records[sensor.name] = SensorRecord(sensor.name, sensor.kind, value, sensor.unit,
+                                                    reading_status(out) if ok else "ns",
+                                                    number=sensor.number, thresholds=sensor.thresholds)
+    elif results:
+        out, err, ok = results[0]
+        if not ok:
+            return NodeSnapshot(ip, power=power, error=err.strip() or "No response")
+        with latency.timer('parse', ip):
+            records = parse_sdr_elist(out)
+    if sampler is None:
+        return NodeSnapshot(ip, power=power, records=records)
+
+    for record in records.values():
+        sampler.observe(ip, record, now)
+    stale = set()
+    for name, record in sampler.last(ip).items():
+        # Not read this time, or the read failed and the sampler still holds a good reading
+        if name not in records or (records[name].value is None and record.value is not None):
+            records[name] = record
+            stale.add(name)
+    return NodeSnapshot(ip, power=power, records=records, stale=stale)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ipmi_stats import latency
+
+SSH_CONNECT_TIMEOUT = 10    # Seconds for the TCP connect + handshake of a master connection
+SSH_COMMAND_TIMEOUT = 900   # Seconds one command may run (cluster start/stop take minutes)
+SSH_MAX_CONCURRENT = 32     # Commands running at once across all hosts
+SSH_PER_HOST = 8            # Commands at once over one master; sshd's MaxSessions defaults to 10
+CONTROL_PERSIST = 300       # Seconds an idle master connection stays up
+SSH_UNREACHABLE = 255       # ssh's own exit status when it could not connect
+
+
+class SshPool:
+    """Runs commands over one multiplexed OpenSSH master connection per (user, host).
+
+    The first command for a host opens a ControlMaster in the background (the
+    only handshake, with sshpass when a password is set); every later command
+    is a session on that connection. Masters that die (host shut down, idle
+    longer than CONTROL_PERSIST) are reopened on the next command.
+    """
+
+    def __init__(self, password=None, max_concurrent=SSH_MAX_CONCURRENT, per_host=SSH_PER_HOST,
+                 connect_timeout=SSH_CONNECT_TIMEOUT, persist=CONTROL_PERSIST, extra_args=None):
+        self.password = password
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.persist = persist
+        self.extra_args = list(extra_args or [])
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.control_dir = None
+        self.masters = {}       # (user, host) -> control socket path
+        self.host_locks = {}    # (user, host) -> Lock held while a master is being opened
+        self.host_slots = {}    # (user, host) -> BoundedSemaphore(per_host)
+        self.lock = threading.Lock()
+
+    def control_path(self, user, host):
+        with self.lock:
+            if self.control_dir is None:
+                self.control_dir = tempfile.mkdtemp(prefix="ntnx-ssh-")     # 0700: the sockets grant a shell
+        # Hashed so the path stays well under the 108 byte Unix socket limit
+        return os.path.join(self.control_dir, hashlib.sha1(f"{user}@{host}".encode()).hexdigest()[:16])
+
+    def ssh_args(self, user, host, control_path, options=()):
+        """ssh command line up to the destination; options go before the common ones."""
+        return ["ssh"] + list(options) + [
+                "-o", "StrictHostKeyChecking=no", "-o", "LogLevel=ERROR",
+                "-o", f"ConnectTimeout={self.connect_timeout}",
+                "-o", "ServerAliveInterval=5", "-o", "ServerAliveCountMax=2",    # Notice a host going down quickly
+                "-o", f"ControlPath={control_path}"] + self.extra_args + [f"{user}@{host}"]
+
+    def env_and_prefix(self, password):
+        if password is None:
+            return None, []
+        # sshpass -e reads the password from SSHPASS so it never shows up in `ps`
+        return dict(os.environ, SSHPASS=password), ["sshpass", "-e"]
+
+    def _host(self, user, host):
+        key = (user, host)
+        with self.lock:
+            if key not in self.host_locks:
+                self.host_locks[key] = threading.Lock()
+                self.host_slots[key] = threading.BoundedSemaphore(self.per_host)
+            return self.host_locks[key], self.host_slots[key]
+
+    def connect(self, host, user, password=None):
+        """Open (or reuse) the master connection; returns the control path, raises OSError on failure."""
+        password = self.password if password is None else password
+        host_lock, _ = self._host(user, host)
+        with host_lock:
+            path = self.masters.get((user, host)) or self.control_path(user, host)
+            if os.path.exists(path):
+                return path
+            env, prefix = self.env_and_prefix(password)
+            # -M -N -f: authenticate, then leave the master running in the background
+            options = ["-M", "-N", "-f", "-o", f"ControlPersist={self.persist}"]
+            if password is None:
+                options += ["-o", "BatchMode=yes"]
+            args = prefix + self.ssh_args(user, host, path, options)
+            with latency.timer('handshake', host):
+                try:
+                    result = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                            stderr=subprocess.STDOUT, env=env, timeout=self.connect_timeout * 3)
+                except subprocess.TimeoutExpired:
+                    raise OSError(f"Timed out connecting to {user}@{host}")
+            if result.returncode != 0 or not os.path.exists(path):
+                error = result.stdout.decode('utf-8', 'replace').strip()
+                raise OSError(error or f"ssh to {user}@{host} failed (exit {result.returncode})")
+            self.masters[(user, host)] = path
+            return path
+
+    def run(self, host, user, command, password=None, on_line=None, timeout=SSH_COMMAND_TIMEOUT):
+        """Run a command on host, returning (exit status, output); stdout and stderr are merged.
+
+        on_line(line) is called for every output line as it arrives. Connection
+        failures come back as exit status 255, like ssh itself reports them.
+        """
+        try:
+            path = self.connect(host, user, password)
+        except OSError as e:
+            return SSH_UNREACHABLE, str(e)
+        _, host_slots = self._host(user, host)
+        with host_slots, self.slots, latency.timer('ssh', host, command):
+            # ControlMaster=no: a master that died since the check makes ssh connect directly instead
+            proc = subprocess.Popen(self.ssh_args(user, host, path, ["-o", "ControlMaster=no", "-o", "BatchMode=yes"])
+                                    + [command],
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+            lines = []
+            try:
+                for raw in proc.stdout:
+                    line = raw.decode('utf-8', 'replace').rstrip("\r\n")
+                    lines.append(line)
+                    if on_line is not None:
+                        on_line(line)
+                status = proc.wait()
+            finally:
+                timer.cancel()
+                proc.stdout.close()
+        if status < 0:  # Killed by the timer
+            lines.append(f"Timed out after {timeout:g}s")
+            status = SSH_UNREACHABLE
+        return status, "\n".join(lines) + ("\n" if lines else "")
+
+    def iter_run(self, hosts, user, command, password=None, on_line=None, timeout=SSH_COMMAND_TIMEOUT):
+        """Run one command on every host at once (within the limits), yielding (host, status, output) as each ends.
+
+        on_line(host, line) gets the output of all hosts interleaved, line by line.
+        """
+        def run_one(host):
+            stream = None if on_line is None else (lambda line: on_line(host, line))
+            return (host,) + self.run(host, user, command, password, stream, timeout)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrent, len(hosts))),
+                                thread_name_prefix="ssh") as executor:
+            for future in as_completed([executor.submit(run_one, host) for host in hosts]):
+                yield future.result()
+
+    def run_many(self, hosts, user, command, password=None, on_line=None, timeout=SSH_COMMAND_TIMEOUT):
+        """Like iter_run, but returns {host: (status, output)} once every host is done."""
+        return {host: (status, output)
+                for host, status, output in self.iter_run(hosts, user, command, password, on_line, timeout)}
+
+    def close(self, host, user):
+        with self.lock:
+            path = self.masters.pop((user, host), None)
+        if path is not None and os.path.exists(path):
+            subprocess.run(self.ssh_args(user, host, path, ["-O", "exit"]),
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+
+    def close_all(self):
+        """Stop every master connection and remove the control socket directory."""
+        with self.lock:
+            keys = list(self.masters)
+        for user, host in keys:
+            try:
+                self.close(host, user)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        with self.lock:
+            control_dir, self.control_dir = self.control_dir, None
+        if control_dir is not None:
+            shutil.rmtree(control_dir, ignore_errors=True)
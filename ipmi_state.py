@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+from ipmi_snapshot import NodeSnapshot
+
+STATE_PATH = os.path.expanduser("~/.cache/ntnx-cluster/state.json")
+SNAPSHOT_MAX_AGE = 86400    # Older snapshots are not shown at start-up
+SNAPSHOT_KINDS = ('temp', 'fan')    # Sensor kinds kept; the views show nothing else
+
+
+def compact_snapshot(snapshot):
+    """to_dict() of a snapshot, reduced to what a warm start shows: temperatures and fans, no thresholds."""
+    return {
+        'ip': snapshot.ip,
+        'power': snapshot.power,
+        'error': snapshot.error,
+        'timestamp': snapshot.timestamp,
+        'sensors': [{'name': r.name, 'kind': r.kind, 'value': r.value, 'unit': r.unit, 'status': r.status}
+                    for r in snapshot.records.values() if r.kind in SNAPSHOT_KINDS],
+    }
+
+
+class WarmState:
+    """What one run leaves for the next: the IP range, what each BMC negotiated and its last snapshot.
+
+    Loaded at start-up so the first screen has the last readings to show (all
+    marked stale) and the first poll skips the cipher suite fallback, the SDR
+    key check and the shell probe it already went through. Saved at exit; the
+    file is merged with, not overwritten by, runs that covered other hosts.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.ip_range = None
+        self.hosts = {}         # ip -> {'cipher': n, 'shell': False, 'sdr_key': key, 'sdr_checked': wall time}
+        self.snapshots = {}     # ip -> compact_snapshot() dict
+
+    def load(self):
+        """Read the state file; a missing or unreadable one just means a cold start."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        self.ip_range = data.get('ip_range')
+        self.hosts = data.get('hosts', {})
+        self.snapshots = data.get('snapshots', {})
+        return self
+
+    def restore(self, pool, sdr_cache):
+        """Hand the negotiated cipher suites, shell support and SDR keys to the session pool and SDR cache."""
+        pool.restore_capabilities(self.hosts)
+        sdr_cache.restore_keys({ip: (host['sdr_key'], host['sdr_checked'])
+                                for ip, host in self.hosts.items() if 'sdr_key' in host})
+
+    def stale_snapshots(self, ip_list, max_age=SNAPSHOT_MAX_AGE):
+        """{ip: NodeSnapshot} of the last readings of these nodes, every sensor marked stale."""
+        cutoff = time.time() - max_age
+        snapshots = {}
+        for ip in ip_list:
+            data = self.snapshots.get(ip)
+            if data is None or data['timestamp'] < cutoff:
+                continue
+            snapshot = NodeSnapshot.from_dict(data)
+            snapshot.stale = set(snapshot.records)
+            snapshots[ip] = snapshot
+        return snapshots
+
+    def capture(self, pool, sdr_cache, snapshots):
+        """Take in what this run learned; snapshots is {ip: latest NodeSnapshot}."""
+        for ip, known in pool.capabilities().items():
+            self.hosts.setdefault(ip, {}).update(known)
+        for ip, (key, checked) in dict(sdr_cache.keys).items():
+            self.hosts.setdefault(ip, {}).update(sdr_key=key, sdr_checked=checked)
+        for ip, snapshot in list(snapshots.items()):
+            if snapshot.error is None and snapshot.power is not None:
+                self.snapshots[ip] = compact_snapshot(snapshot)
+
+    def save(self):
+        """Merge into the file on disk (other runs may have saved other hosts since) and replace it atomically."""
+        on_disk = WarmState(self.path).load()
+        on_disk.hosts.update(self.hosts)
+        on_disk.snapshots.update(self.snapshots)
+        data = {'ip_range': self.ip_range or on_disk.ip_range, 'saved': time.time(),
+                'hosts': on_disk.hosts, 'snapshots': on_disk.snapshots}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # A temp file of its own, so concurrent runs never write into each other's (mkstemp makes it 0600)
+        fd, tmp_path = tempfile.mkstemp(prefix=".state-", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
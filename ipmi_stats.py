@@ -0,0 +1,212 @@
+import json
+import math
+import re
+import threading
+import time
+from array import array
+
+BUCKET_BASE = 1e-4      # Upper bound of the first histogram bucket: 0.1 ms
+BUCKET_GROWTH = 1.25    # Each bucket is 25% wider than the one before it
+BUCKET_COUNT = 64       # Last bound ~160 s; anything slower lands in the last bucket
+SLOWEST_HOSTS = 5       # BMCs flagged per tick in --profile output
+
+# Phases in the order a request goes through them, for reports
+PHASES = ('tick', 'queue', 'fetch', 'daemon', 'sdr', 'handshake', 'oneshot', 'command', 'ipmitool', 'parse',
+          'aggregate', 'render', 'ssh')
+
+# Trailing numeric arguments (sensor numbers, counts) don't make a command a different command
+_ARGUMENT_RE = re.compile(r"(?:\s+(?:0x[0-9a-fA-F]+|\d+|/\S+))+$")
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+
+def command_key(command):
+    """Histogram key of a command: 'raw 0x04 0x2d 0x41' -> 'raw 0x04 0x2d', 'sel elist last 3' -> 'sel elist last'.
+
+    Raw commands keep their netfn and command bytes; other commands drop trailing arguments.
+    """
+    command = command.strip()
+    if command.startswith("raw "):
+        return " ".join(command.split()[:3])
+    return _ARGUMENT_RE.sub("", command) or command
+
+
+def bucket_bound(index):
+    return BUCKET_BASE * BUCKET_GROWTH ** index
+
+
+class Histogram:
+    """Log-bucketed latency histogram: recording is O(1) and the memory is fixed."""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = 0 if seconds <= BUCKET_BASE else math.ceil(math.log(seconds / BUCKET_BASE) / _LOG_GROWTH)
+        self.counts[min(index, BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (within 25% of the true value)."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bucket_bound(index), self.max)
+        return self.max
+
+    def summary(self, buckets=False):
+        summary = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+        if buckets:
+            summary['buckets'] = {f"{bucket_bound(i):.6g}": count for i, count in enumerate(self.counts) if count}
+        return summary
+
+
+class LatencyStats:
+    """Latency histograms per phase, per (phase, command) and per (host, phase, command).
+
+    Besides the running totals, a per-tick window (count, total, max per phase
+    and total time per host) is kept for --profile; take_window() hands it over
+    and starts a new one.
+    """
+
+    def __init__(self):
+        self.histograms = {}    # (phase, host or None, command or None) -> Histogram
+        self.window = {}        # phase -> [count, total, max]
+        self.window_hosts = {}  # host -> seconds spent fetching it this window
+        self.enabled = True
+        self.lock = threading.Lock()
+
+    def _add(self, key, seconds):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.add(seconds)
+
+    def record(self, phase, seconds, host=None, command=None):
+        if not self.enabled:
+            return
+        if command is not None:
+            command = command_key(command)
+        with self.lock:
+            self._add((phase, None, None), seconds)
+            if command is not None:
+                self._add((phase, None, command), seconds)
+            if host is not None:
+                self._add((phase, host, command), seconds)
+            entry = self.window.get(phase)
+            if entry is None:
+                self.window[phase] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+            if phase == 'fetch' and host is not None:
+                self.window_hosts[host] = self.window_hosts.get(host, 0.0) + seconds
+
+    def timer(self, phase, host=None, command=None):
+        return Timer(self, phase, host, command)
+
+    def take_window(self):
+        """Return ({phase: (count, total, max)}, {host: seconds}) since the last call and start over."""
+        with self.lock:
+            window, hosts = self.window, self.window_hosts
+            self.window, self.window_hosts = {}, {}
+        return {phase: tuple(entry) for phase, entry in window.items()}, hosts
+
+    def to_dict(self, buckets=True):
+        """Every histogram, grouped as phases / commands / hosts, for the JSON dump."""
+        with self.lock:
+            items = [(key, histogram.summary(buckets)) for key, histogram in self.histograms.items()]
+        phases, commands, hosts = {}, {}, {}
+        for (phase, host, command), summary in sorted(items, key=lambda item: tuple(str(part) for part in item[0])):
+            if host is None and command is None:
+                phases[phase] = summary
+            elif host is None:
+                commands.setdefault(phase, {})[command] = summary
+            else:
+                hosts.setdefault(host, {}).setdefault(phase, {})[command or "*"] = summary
+        return {'generated': time.time(), 'phases': phases, 'commands': commands, 'hosts': hosts}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def panel_lines(self, slowest=SLOWEST_HOSTS):
+        """Short text for the on-screen stats panel: p50/p95/max per phase, then the slowest hosts."""
+        with self.lock:
+            phases = {phase: h for (phase, host, command), h in self.histograms.items()
+                      if host is None and command is None}
+            fetches = [(h.percentile(95), host) for (phase, host, command), h in self.histograms.items()
+                       if phase == 'fetch' and host is not None and command is None]
+            lines = [f"{phase:<10} n={h.count:<7} p50 {format_seconds(h.percentile(50)):>7}  "
+                     f"p95 {format_seconds(h.percentile(95)):>7}  max {format_seconds(h.max):>7}"
+                     for phase, h in sorted(phases.items(), key=lambda item: phase_order(item[0]))]
+        fetches.sort(reverse=True)
+        if fetches:
+            lines.append("slowest p95: " + "  ".join(f"{host} {format_seconds(p95)}"
+                                                      for p95, host in fetches[:slowest]))
+        return lines
+
+
+class Timer:
+    """Context manager recording the time spent in its block."""
+
+    __slots__ = ('stats', 'phase', 'host', 'command', 'start')
+
+    def __init__(self, stats, phase, host=None, command=None):
+        self.stats = stats
+        self.phase = phase
+        self.host = host
+        self.command = command
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.phase, time.perf_counter() - self.start, self.host, self.command)
+        return False
+
+
+def phase_order(phase):
+    return (PHASES.index(phase) if phase in PHASES else len(PHASES), phase)
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+def profile_report(tick, window, hosts, slowest=SLOWEST_HOSTS):
+    """One --profile line per tick: time per phase, then the BMCs that took longest."""
+    parts = []
+    for phase, (count, total, longest) in sorted(window.items(), key=lambda item: phase_order(item[0])):
+        parts.append(f"{phase} {format_seconds(total)}/{count} (max {format_seconds(longest)})")
+    line = f"tick {tick}: " + "  ".join(parts)
+    if hosts:
+        worst = sorted(hosts.items(), key=lambda item: item[1], reverse=True)[:slowest]
+        line += "  | slowest: " + ", ".join(f"{host} {format_seconds(seconds)}" for host, seconds in worst)
+    return line
+
+
+latency = LatencyStats()  # Process-wide: the session, fetch, SDR and render layers all record here
@@ -0,0 +1,374 @@
+import argparse
+import json
+import socket
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ipmi_ssh import SSH_MAX_CONCURRENT, SshPool
+
+# Mirrors the hosts in playbooks/*.yaml; override with --config cluster.json
+DEFAULT_CLUSTER = {
+    'nodes': [
+        {'bmc': "192.168.1.224", 'ahv': "192.168.1.180", 'cvm': "192.168.1.184"},
+        {'bmc': "192.168.1.225", 'ahv': "192.168.1.181", 'cvm': "192.168.1.185"},
+        {'bmc': "192.168.1.226", 'ahv': "192.168.1.182", 'cvm': "192.168.1.186"},
+        {'bmc': "192.168.1.227"},
+    ],
+    'cluster_cvm': "192.168.1.184",     # CVM the cluster-wide commands are run on
+    'prism_central': "192.168.1.242",
+    'cvm_user': "nutanix",
+    'ahv_user': "root",
+    'ssh_password': "nutanix/4u",
+    'cluster_bin': "/usr/local/nutanix/cluster/bin/cluster",
+    'acli_bin': "/usr/local/nutanix/bin/acli",
+    'stop_script': "/home/nutanix/stop.sh",     # Modified `cluster stop` that does not prompt
+    'cvm_ready_command': "/usr/local/nutanix/cluster/bin/genesis status",
+}
+
+POLL_INTERVAL = 5       # Seconds between readiness checks
+MAX_WORKERS = 32        # Per-node steps run in parallel up to this many at once
+SSH_TIMEOUT = 10        # Seconds to connect to a host
+POLL_TIMEOUT = 60       # Seconds one readiness check may run; actions get what is left of their phase
+
+
+class Transport:
+    """How the orchestrator talks to BMCs and hosts; swap it out to test against fakes."""
+
+    def power(self, bmc, action):
+        """Run a chassis power action, returning (ok, detail)."""
+        raise NotImplementedError
+
+    def power_state(self, bmc):
+        """Return True (on), False (off) or None (unknown) straight from the BMC."""
+        raise NotImplementedError
+
+    def ssh(self, host, user, password, command, timeout=POLL_TIMEOUT, on_line=None):
+        """Run a command over SSH, returning (exit status, output); on_line(line) streams the output."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections held between steps."""
+
+    def reachable(self, host, port=22, timeout=3):
+        """Return True if a TCP connection to host:port succeeds."""
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+
+class LocalTransport(Transport):
+    """IPMI through ipmi.py's power helpers, SSH over one multiplexed connection per host (ipmi_ssh)."""
+
+    def __init__(self, max_ssh=SSH_MAX_CONCURRENT):
+        self.ssh_pool = SshPool(max_concurrent=max_ssh, connect_timeout=SSH_TIMEOUT)
+
+    def power(self, bmc, action):
+        import ipmi
+        return ipmi.send_power_action(bmc, action)
+
+    def power_state(self, bmc):
+        import ipmi
+        try:
+            return ipmi.get_power_state(bmc)  # Bypasses the power cache, readiness must be current
+        except RuntimeError:
+            return None
+
+    def ssh(self, host, user, password, command, timeout=POLL_TIMEOUT, on_line=None):
+        # Readiness polls reuse the host's master connection instead of a handshake each
+        return self.ssh_pool.run(host, user, command, password, on_line, timeout=timeout)
+
+    def close(self):
+        self.ssh_pool.close_all()
+
+
+class Step:
+    """One unit of work on one target: an optional action, then a readiness check polled until true."""
+
+    def __init__(self, target, action=None, ready=None):
+        self.target = target
+        self.action = action    # callable(seconds left in the phase) -> (ok, detail)
+        self.ready = ready      # callable() -> bool
+
+
+class Phase:
+    """A set of per-node steps that starts once all phases it depends on are done."""
+
+    def __init__(self, name, steps, deps=(), timeout=600, required=True):
+        self.name = name
+        self.steps = steps
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.required = required  # If False, a timeout is reported but dependents still run
+
+
+class PhaseResult:
+    def __init__(self, name, ok, elapsed, failed_targets=(), skipped=False):
+        self.name = name
+        self.ok = ok
+        self.elapsed = elapsed
+        self.failed_targets = list(failed_targets)
+        self.skipped = skipped
+
+
+def run_step(step, deadline, poll_interval):
+    """Run a step's action, then poll its readiness until it passes or the deadline is hit."""
+    if step.action is not None:
+        ok, detail = step.action(max(1, deadline - time.monotonic()))
+        if not ok:
+            return False, detail
+    if step.ready is None:
+        return True, "done"
+    while True:
+        try:
+            if step.ready():
+                return True, "ready"
+        except Exception as e:
+            last_error = str(e)
+        else:
+            last_error = "not ready"
+        if time.monotonic() + poll_interval > deadline:
+            return False, f"timed out ({last_error})"
+        time.sleep(poll_interval)
+
+
+def run_phase(phase, executor, poll_interval, log):
+    start = time.monotonic()
+    deadline = start + phase.timeout
+    log(f"[{phase.name}] starting {len(phase.steps)} step(s)")
+    futures = {executor.submit(run_step, step, deadline, poll_interval): step for step in phase.steps}
+    failed = []
+    for future, step in futures.items():
+        ok, detail = future.result()
+        log(f"[{phase.name}] {step.target}: {detail}")
+        if not ok:
+            failed.append(step.target)
+    elapsed = time.monotonic() - start
+    ok = not failed
+    log(f"[{phase.name}] {'done' if ok else 'FAILED'} in {elapsed:.0f}s")
+    return PhaseResult(phase.name, ok, elapsed, failed)
+
+
+def run_plan(phases, poll_interval=POLL_INTERVAL, max_workers=MAX_WORKERS, log=print):
+    """Run phases as a dependency graph: each one starts as soon as its dependencies have finished.
+
+    Returns {phase name: PhaseResult}. Dependents of a failed required phase are skipped.
+    """
+    by_name = {phase.name: phase for phase in phases}
+    results = {}
+    running = {}
+    # Steps and phases share one pool; phases only block on their own steps' futures
+    step_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orchestrate-step")
+    phase_pool = ThreadPoolExecutor(max_workers=max(1, len(phases)), thread_name_prefix="orchestrate-phase")
+    try:
+        while len(results) < len(phases):
+            progress = True
+            while progress:
+                # Skipping a phase can unblock (or skip) its dependents, so keep going until nothing changes
+                progress = False
+                for phase in phases:
+                    if phase.name in results or phase.name in running:
+                        continue
+                    if not all(dep in results for dep in phase.deps):
+                        continue
+                    blocked = [dep for dep in phase.deps if not results[dep].ok and by_name[dep].required]
+                    if blocked:
+                        log(f"[{phase.name}] skipped, {', '.join(blocked)} failed")
+                        results[phase.name] = PhaseResult(phase.name, False, 0, skipped=True)
+                        progress = True
+                        continue
+                    running[phase.name] = phase_pool.submit(run_phase, phase, step_pool, poll_interval, log)
+            if not running:
+                if len(results) < len(phases):
+                    missing = [p.name for p in phases if p.name not in results]
+                    raise ValueError(f"Unresolvable phase dependencies: {', '.join(missing)}")
+                break
+            done, _ = wait(list(running.values()), return_when=FIRST_COMPLETED)
+            for name, future in list(running.items()):
+                if future in done:
+                    results[name] = future.result()
+                    del running[name]
+    finally:
+        phase_pool.shutdown(wait=True)
+        step_pool.shutdown(wait=True)
+    return results
+
+
+def stream_to(log, host):
+    """on_line callback printing a host's output as it arrives, or None when not streaming."""
+    if log is None:
+        return None
+    return lambda line: log(f"  {host}: {line}")
+
+
+def ssh_step(transport, cluster, host, user, command, ready_command=None, log=None):
+    """Step that runs a command over SSH and, optionally, polls another until it exits 0."""
+    password = cluster['ssh_password']
+
+    def action(timeout):
+        status, output = transport.ssh(host, user, password, command, timeout, stream_to(log, host))
+        return status == 0, output.strip() or f"exit {status}"
+
+    ready = None
+    if ready_command is not None:
+        ready = lambda: transport.ssh(host, user, password, ready_command)[0] == 0
+    return Step(host, action, ready)
+
+
+def start_plan(cluster, transport, log=None):
+    """Phases for a cold start: power on, wait for CVMs, start the cluster, VMs, then Prism Central.
+
+    With log set, the output of every SSH action is passed to it line by line.
+    """
+    nodes = cluster['nodes']
+    cvm_user = cluster['cvm_user']
+    password = cluster['ssh_password']
+    cluster_cvm = cluster['cluster_cvm']
+    pc = cluster.get('prism_central')
+
+    def power_on(bmc):
+        return Step(bmc, lambda timeout: transport.power(bmc, 'on'), lambda: transport.power_state(bmc) is True)
+
+    def cvm_ready(cvm):
+        def ready():
+            return (transport.reachable(cvm) and
+                    transport.ssh(cvm, cvm_user, password, cluster['cvm_ready_command'])[0] == 0)
+        return Step(cvm, ready=ready)
+
+    phases = [
+        Phase("power-on", [power_on(node['bmc']) for node in nodes if node.get('bmc')], timeout=300),
+        Phase("cvms-up", [cvm_ready(node['cvm']) for node in nodes if node.get('cvm')],
+              deps=["power-on"], timeout=900),
+        Phase("cluster-start", [ssh_step(transport, cluster, cluster_cvm, cvm_user,
+                                         f"{cluster['cluster_bin']} start",
+                                         f"{cluster['cluster_bin']} status", log)],
+              deps=["cvms-up"], timeout=900),
+        Phase("vms-on", [ssh_step(transport, cluster, cluster_cvm, cvm_user,
+                                  f"{cluster['acli_bin']} vm.on '*'", log=log)],
+              deps=["cluster-start"], timeout=300),
+    ]
+    if pc:
+        phases.append(Phase("prism-central-up", [Step(pc, ready=lambda: transport.reachable(pc))],
+                            deps=["vms-on"], timeout=600))
+        phases.append(Phase("prism-central-start", [ssh_step(transport, cluster, pc, cvm_user,
+                                                             f"{cluster['cluster_bin']} start",
+                                                             f"{cluster['cluster_bin']} status", log)],
+                            deps=["prism-central-up"], timeout=900))
+    return phases
+
+
+def stop_plan(cluster, transport, log=None):
+    """Phases for a full stop: Prism Central, guest VMs, the cluster, CVMs, then AHV hosts.
+
+    Every host is reached over one SSH connection, opened by its first step and
+    reused by the polls and actions after it. With log set, the output of every
+    SSH action is passed to it line by line.
+    """
+    nodes = cluster['nodes']
+    cvm_user = cluster['cvm_user']
+    ahv_user = cluster['ahv_user']
+    password = cluster['ssh_password']
+    cluster_cvm = cluster['cluster_cvm']
+    pc = cluster.get('prism_central')
+    acli = cluster['acli_bin']
+
+    def no_vms_running():
+        status, output = transport.ssh(cluster_cvm, cvm_user, password, f"{acli} vm.list power_state=on")
+        # Only the header line is left once every VM is off
+        return status == 0 and len([line for line in output.splitlines() if line.strip()]) <= 1
+
+    def shutdown_vms(timeout):
+        status, output = transport.ssh(cluster_cvm, cvm_user, password, f"{acli} vm.shutdown '*'",
+                                       timeout, stream_to(log, cluster_cvm))
+        return status == 0, output.strip() or f"exit {status}"
+
+    def shutdown_host(host, user, ready):
+        command = "shutdown -h now" if user == "root" else "sudo shutdown -h now"
+
+        def action(timeout):
+            status, output = transport.ssh(host, user, password, command, timeout, stream_to(log, host))
+            # The connection usually drops as the host goes down, so any exit status is fine
+            return True, output.strip() or f"shutdown sent (exit {status})"
+        return Step(host, action, ready)
+
+    def cvm_down(cvm):
+        return lambda: not transport.reachable(cvm)
+
+    def ahv_down(node):
+        if node.get('bmc'):
+            return lambda: transport.power_state(node['bmc']) is False
+        return lambda: not transport.reachable(node['ahv'])
+
+    phases = []
+    first_deps = []
+    if pc:
+        # Like the playbook's ignore_errors: a Prism Central that is down already must not block the stop
+        phases.append(Phase("prism-central-stop", [ssh_step(transport, cluster, pc, cvm_user,
+                                                            cluster['stop_script'], log=log)],
+                            timeout=300, required=False))
+        first_deps = ["prism-central-stop"]
+    phases += [
+        # Guests get up to two minutes of ACPI shutdown before being forced off
+        Phase("vms-shutdown", [Step(cluster_cvm, shutdown_vms, no_vms_running)],
+              deps=first_deps, timeout=120, required=False),
+        Phase("vms-force-off", [ssh_step(transport, cluster, cluster_cvm, cvm_user, f"{acli} vm.off '*'",
+                                         log=log)],
+              deps=["vms-shutdown"], timeout=120),
+        Phase("cluster-stop", [ssh_step(transport, cluster, cluster_cvm, cvm_user, cluster['stop_script'],
+                                        log=log)],
+              deps=["vms-force-off"], timeout=600),
+        Phase("cvms-shutdown", [shutdown_host(node['cvm'], cvm_user, cvm_down(node['cvm']))
+                                for node in nodes if node.get('cvm')],
+              deps=["cluster-stop"], timeout=300),
+        Phase("ahv-shutdown", [shutdown_host(node['ahv'], ahv_user, ahv_down(node))
+                               for node in nodes if node.get('ahv')],
+              deps=["cvms-shutdown"], timeout=600),
+    ]
+    return phases
+
+
+def load_cluster(path):
+    cluster = dict(DEFAULT_CLUSTER)
+    if path:
+        with open(path) as f:
+            cluster.update(json.load(f))
+    return cluster
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Start or stop a Nutanix cluster, waiting on real readiness signals.")
+    parser.add_argument("action", choices=["start", "stop"])
+    parser.add_argument("--config", help="JSON file overriding the hosts and credentials in DEFAULT_CLUSTER")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, help="Seconds between readiness checks")
+    parser.add_argument("--dry-run", action="store_true", help="Print the phase graph without running it")
+    parser.add_argument("--max-ssh", type=int, default=SSH_MAX_CONCURRENT, help="SSH commands running at once")
+    parser.add_argument("--stream", action="store_true", help="Print the output of SSH actions as it arrives")
+    args = parser.parse_args(argv)
+
+    cluster = load_cluster(args.config)
+    transport = LocalTransport(args.max_ssh)
+    plan = start_plan if args.action == "start" else stop_plan
+    phases = plan(cluster, transport, print if args.stream else None)
+
+    if args.dry_run:
+        for phase in phases:
+            deps = ", ".join(phase.deps) or "-"
+            targets = ", ".join(step.target for step in phase.steps)
+            print(f"{phase.name:<22} after: {deps:<24} timeout: {phase.timeout:>4}s  targets: {targets}")
+        return 0
+
+    try:
+        results = run_plan(phases, poll_interval=args.poll_interval)
+    finally:
+        transport.close()
+    required = {phase.name: phase.required for phase in phases}
+    failed = [r for r in results.values() if not r.ok and required[r.name]]
+    for r in results.values():
+        status = "skipped" if r.skipped else ("ok" if r.ok else f"failed: {', '.join(r.failed_targets)}")
+        print(f"{r.name:<22} {r.elapsed:>6.0f}s  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+from ipmi_alerts import CRITICAL, OK, WARNING, AlertEngine, AlertRule
+from ipmi_sensors import SensorRecord
+
+TEMP_RULE = dict(name="temperature", kind='temp', warning=80, critical=90, hysteresis=3)
+
+
+def temp(value, thresholds=None):
+    return SensorRecord("CPU1 Temp", 'temp', value, "degrees C", thresholds=thresholds)
+
+
+def fan(value):
+    return SensorRecord("FAN1", 'fan', value, "RPM")
+
+
+def temp_with_bmc(value):
+    return temp(value, {'unc': 70, 'ucr': 75})
+
+
+def levels(engine, values, record=temp, ip="10.0.0.1"):
+    """Feed one reading per second and return the sensor's level after each."""
+    seen = []
+    for t, value in enumerate(values, 1):
+        reading = record(value)
+        engine.observe(ip, reading, t)
+        seen.append(engine.level(ip, reading.name)[0])
+    return seen
+
+
+def test_levels_hold_until_back_past_the_hysteresis():
+    engine = AlertEngine([AlertRule(**TEMP_RULE)])
+    assert levels(engine, [79, 80, 90, 88, 87, 86, 77, 76]) == [
+        OK, WARNING, CRITICAL, CRITICAL, CRITICAL, WARNING, WARNING, OK]
+
+
+def test_low_direction_rule():
+    engine = AlertEngine([AlertRule("fan", kind='fan', direction='low', warning=700, critical=500, hysteresis=150)])
+    assert levels(engine, [3000, 700, 500, 640, 660, 860], fan) == [OK, WARNING, CRITICAL, CRITICAL, WARNING, OK]
+
+
+def test_debounce_needs_consecutive_samples():
+    engine = AlertEngine([AlertRule(**dict(TEMP_RULE, debounce=3))])
+    assert levels(engine, [85, 85, 70, 85, 85, 85]) == [OK, OK, OK, OK, OK, WARNING]
+
+
+def test_bmc_thresholds_replace_the_rule_limits():
+    engine = AlertEngine([AlertRule(**TEMP_RULE)])
+    assert levels(engine, [69, 70, 75], temp_with_bmc) == [OK, WARNING, CRITICAL]
+    engine = AlertEngine([AlertRule(**dict(TEMP_RULE, bmc_thresholds=False))])
+    assert levels(engine, [75], temp_with_bmc) == [OK]
+
+
+def test_rate_of_change_warns_before_the_limit():
+    engine = AlertEngine([AlertRule(**dict(TEMP_RULE, rate=5, rate_window=60))])
+    engine.observe("h", temp(50), 0)
+    alerts = engine.observe("h", temp(56), 40)    # 9 C/min, measured over more than half the window
+    assert [(a.level, a.reason) for a in alerts] == [(WARNING, "rising 9.0/min")]
+
+
+def test_alerts_go_to_sinks_and_repeated_samples_are_ignored():
+    sent = []
+    engine = AlertEngine([AlertRule(**TEMP_RULE)], sinks=[sent.append])
+    engine.observe("h", temp(91), 5)
+    assert engine.observe("h", temp(50), 5) == []     # Same timestamp: a cached snapshot, not a new sample
+    engine.observe("h", temp(50), 6)
+    assert [(a.level, a.previous) for a in sent] == [(CRITICAL, OK), (OK, CRITICAL)]
+    assert engine.summary() == "Alerts: none"
+
+
+def test_active_reason_follows_the_latest_reading():
+    engine = AlertEngine([AlertRule(**TEMP_RULE)])
+    levels(engine, [95, 99])
+    assert engine.level("10.0.0.1", "CPU1 Temp") == (CRITICAL, "99 >= 90")
+    assert engine.summary() == "Alerts: 1 critical, 0 warning"
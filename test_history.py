@@ -0,0 +1,90 @@
+import os
+import time
+from ipmi_history import HistoryStore, RingBuffer, TimeSeriesStore, summarize
+from ipmi_snapshot import NodeSnapshot
+from ipmi_sensors import SensorRecord
+
+DAY = 86400
+
+
+def test_ring_buffer_wraps_and_windows_in_time_order():
+    ring = RingBuffer(capacity=4)
+    for t in range(1, 7):
+        ring.append(t, t * 10)
+    assert list(ring.window()) == [30, 40, 50, 60]
+    assert list(ring.window(since=4, until=5)) == [40, 50]
+    assert ring.last() == (6, 60)
+
+
+def test_summarize_nearest_rank():
+    stats = summarize(list(range(1, 101)))
+    assert (stats['min'], stats['max'], stats['mean']) == (1, 100, 50.5)
+    assert (stats['p50'], stats['p95'], stats['p99']) == (50, 95, 99)
+    assert summarize([]) is None
+
+
+def test_store_queries_across_days(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    now = time.time()
+    store.append_many([("h/CPU1 Temp", now - DAY, 40), ("h/CPU1 Temp", now, 42), ("h/FAN1", now, 3000)])
+    assert list(store.query("h/CPU1 Temp")) == [40, 42]
+    assert list(store.query("h/CPU1 Temp", since=now - 1)) == [42]
+    assert list(store.query("h/CPU1 Temp", until=now - 1)) == [40]
+    assert list(store.query("missing")) == []
+    assert store.stats("h/FAN1")['max'] == 3000
+    store.close()
+
+
+def test_reader_sees_series_added_later_by_another_store(tmp_path):
+    reader = TimeSeriesStore(str(tmp_path))
+    writer = TimeSeriesStore(str(tmp_path))
+    now = time.time()
+    writer.append("h/CPU1 Temp", now, 41)
+    assert list(reader.query("h/CPU1 Temp")) == [41]
+    # Each store catches up on the other's ids before adding its own, so no id is handed out twice
+    reader.append("h/FAN1", now, 3000)
+    writer.append("h/FAN2", now, 3100)
+    assert len(set(writer.series_ids.values())) == len(writer.series_ids) == 3
+    assert list(writer.query("h/FAN1")) == [3000]
+    reader.close()
+    writer.close()
+
+
+def test_torn_series_log_line_is_ignored(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("h/a", time.time(), 1)
+    store.close()
+    with open(os.path.join(str(tmp_path), "series.log"), 'ab') as f:
+        f.write(b'[7, "h/tor')     # A writer crashed mid-line
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("h/b", time.time(), 2)
+    assert store.series_ids == {"h/a": 0, "h/b": 1}
+    store.close()
+    assert TimeSeriesStore(str(tmp_path)).series_ids == {"h/a": 0, "h/b": 1}
+
+
+def test_prune_drops_old_segments(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), keep_days=60)
+    now = time.time()
+    store.append_many([("h/a", now - 40 * DAY, 1), ("h/a", now, 2)])
+    assert len(store.days()) == 2
+    store.prune(keep_days=30)
+    assert len(store.days()) == 1
+    assert list(store.query("h/a")) == [2]
+    store.close()
+    store = TimeSeriesStore(str(tmp_path), keep_days=30)
+    store.append("h/a", now - 40 * DAY, 1)     # The first recording prunes too
+    assert list(store.query("h/a")) == [2]
+    store.close()
+
+
+def test_history_records_fresh_readings_only(tmp_path):
+    disk = TimeSeriesStore(str(tmp_path))
+    history = HistoryStore(capacity=8, disk=disk)
+    records = {"CPU1 Temp": SensorRecord("CPU1 Temp", 'temp', 45, "degrees C"),
+               "FAN1": SensorRecord("FAN1", 'fan', 3000, "RPM")}
+    history.record_snapshot(NodeSnapshot("h", power=True, records=records, stale={"FAN1"}))
+    assert history.series() == [("h", "CPU1 Temp")]
+    assert history.stats("h", "CPU1 Temp")['mean'] == 45
+    assert list(disk.query("h/CPU1 Temp")) == [45] and list(disk.query("h/FAN1")) == []
+    disk.close()
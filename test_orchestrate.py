@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+import orchestrate
+from orchestrate import POLL_TIMEOUT, Phase, Step, Transport, run_plan, start_plan, stop_plan
+
+CLUSTER = dict(orchestrate.DEFAULT_CLUSTER)
+
+
+class FakeTransport(Transport):
+    """Every BMC powers on instantly and every SSH command succeeds unless listed in `fail`."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.powered = set()
+        self.calls = []         # (kind, target, detail, timeout) in call order
+        self.lock = threading.Lock()
+
+    def record(self, *call):
+        with self.lock:
+            self.calls.append(call)
+
+    def power(self, bmc, action):
+        self.record('power', bmc, action, None)
+        self.powered.add(bmc)
+        return True, "ok"
+
+    def power_state(self, bmc):
+        return bmc in self.powered
+
+    def ssh(self, host, user, password, command, timeout=POLL_TIMEOUT, on_line=None):
+        self.record('ssh', host, command, timeout)
+        if command in self.fail:
+            return 1, "failed"
+        if command.endswith("vm.list power_state=on"):
+            return 0, "VM name  VM UUID\n"
+        return 0, ""
+
+    def reachable(self, host, port=22, timeout=3):
+        return True
+
+
+def run(phases):
+    return run_plan(phases, poll_interval=0, log=lambda message: None)
+
+
+def ssh_commands(transport):
+    return [detail for kind, _, detail, _ in transport.calls if kind == 'ssh']
+
+
+def test_start_runs_phases_in_dependency_order():
+    transport = FakeTransport()
+    results = run(start_plan(CLUSTER, transport))
+    assert all(result.ok for result in results.values())
+    commands = ssh_commands(transport)
+    genesis = commands.index(CLUSTER['cvm_ready_command'])
+    cluster_start = commands.index(f"{CLUSTER['cluster_bin']} start")
+    vms_on = commands.index(f"{CLUSTER['acli_bin']} vm.on '*'")
+    assert genesis < cluster_start < vms_on
+    assert transport.calls[0][0] == 'power'
+
+
+def test_failed_required_phase_skips_its_dependents():
+    transport = FakeTransport(fail={f"{CLUSTER['cluster_bin']} start"})
+    results = run(start_plan(CLUSTER, transport))
+    assert results['cvms-up'].ok
+    assert not results['cluster-start'].ok and not results['cluster-start'].skipped
+    for name in ("vms-on", "prism-central-up", "prism-central-start"):
+        assert results[name].skipped
+    assert f"{CLUSTER['acli_bin']} vm.on '*'" not in ssh_commands(transport)
+
+
+def test_prism_central_failure_does_not_block_the_stop():
+    transport = FakeTransport(fail={CLUSTER['stop_script']})
+    results = run(stop_plan(CLUSTER, transport))
+    assert not results['prism-central-stop'].ok
+    assert not results['vms-shutdown'].skipped
+    assert not results['cluster-stop'].ok       # Same script fails on the CVM too
+    assert results['cvms-shutdown'].skipped and results['ahv-shutdown'].skipped
+
+
+def test_actions_get_the_phase_deadline_and_polls_the_short_timeout():
+    transport = FakeTransport()
+    run(start_plan(CLUSTER, transport))
+    timeouts = {detail: timeout for kind, _, detail, timeout in transport.calls if kind == 'ssh'}
+    assert timeouts[f"{CLUSTER['cluster_bin']} start"] > 800     # cluster-start has 900s
+    assert timeouts[f"{CLUSTER['cluster_bin']} status"] == POLL_TIMEOUT
+
+
+def test_readiness_timeout_fails_the_phase():
+    phases = [
+        Phase("never-ready", [Step("host", ready=lambda: False)], timeout=0.2),
+        Phase("after", [Step("host", ready=lambda: True)], deps=["never-ready"]),
+    ]
+    start = time.monotonic()
+    results = run_plan(phases, poll_interval=0.05, log=lambda message: None)
+    assert time.monotonic() - start < 2
+    assert results['never-ready'].failed_targets == ["host"]
+    assert results['after'].skipped
+
+
+def test_optional_phase_timeout_lets_dependents_run():
+    phases = [
+        Phase("optional", [Step("host", ready=lambda: False)], timeout=0.1, required=False),
+        Phase("after", [Step("host", ready=lambda: True)], deps=["optional"]),
+    ]
+    results = run_plan(phases, poll_interval=0.05, log=lambda message: None)
+    assert not results['optional'].ok
+    assert results['after'].ok
+
+
+def test_unresolvable_dependencies_raise():
+    with pytest.raises(ValueError):
+        run([Phase("orphan", [], deps=["missing"])])
@@ -0,0 +1,86 @@
+from ipmi_sdr import SdrSensor, parse_reading, parse_sdr_dump, reading_status
+from ipmi_sensors import parse_sdr_elist, split_readings
+
+
+def full_record(number, name, sensor_type=0x01, base_unit=1, m=1, b=0, b_exp=0, r_exp=0, analog_format=0,
+                percentage=False, owner=0x20, linearization=0, readable=0, thresholds=(0,) * 6):
+    """One Full Sensor Record (type 0x01) laid out as in `sdr dump`; thresholds are UNR, UCR, UNC, LNR, LCR, LNC."""
+    body = bytearray(43 + len(name))
+    body[0] = owner
+    body[2] = number
+    body[7] = sensor_type
+    body[13] = readable
+    body[15] = analog_format << 6 | int(percentage)
+    body[16] = base_unit
+    body[18] = linearization
+    body[19] = m & 0xff
+    body[20] = (m >> 2) & 0xc0
+    body[21] = b & 0xff
+    body[22] = (b >> 2) & 0xc0
+    body[24] = (r_exp & 0x0f) << 4 | (b_exp & 0x0f)
+    body[31:37] = bytes(thresholds)
+    body[42] = 0xc0 | len(name)
+    body[43:] = name.encode('ascii')
+    return bytes([1, 0, 0x51, 0x01, len(body)]) + bytes(body)
+
+
+def test_temperature_and_fan_records_are_decoded():
+    data = (full_record(0x01, "CPU1 Temp", readable=0x38, thresholds=(95, 90, 85, 0, 0, 0))
+            + full_record(0x41, "FAN1", sensor_type=0x04, base_unit=18, m=75, readable=0x07,
+                          thresholds=(0, 0, 0, 4, 6, 9)))
+    temp, fan = parse_sdr_dump(data)
+    assert (temp.number, temp.name, temp.kind, temp.unit) == (0x01, "CPU1 Temp", 'temp', "degrees C")
+    assert temp.thresholds == {'unr': 95, 'ucr': 90, 'unc': 85}
+    assert (fan.kind, fan.unit) == ('fan', "RPM")
+    assert fan.thresholds == {'lnr': 300, 'lcr': 450, 'lnc': 675}
+    assert fan.convert(40) == 3000
+
+
+def test_percent_fans_are_kept_and_other_records_skipped():
+    data = (full_record(0x20, "Fan 1", sensor_type=0x04, base_unit=0, percentage=True)
+            + full_record(0x30, "12V", sensor_type=0x02, base_unit=4)           # Voltage
+            + full_record(0x02, "Remote", owner=0x2c)                           # Not on the BMC
+            + full_record(0x03, "Log", linearization=1)                         # Non-linear
+            + bytes([2, 0, 0x51, 0x02, 3, 0, 0, 0]))                            # Compact record
+    sensors = parse_sdr_dump(data)
+    assert [(s.name, s.kind, s.unit) for s in sensors] == [("Fan 1", 'fan', "percent")]
+
+
+def test_conversion_factors_and_signed_formats():
+    # y = (M*x + B*10^Bexp) * 10^Rexp with a negative 10-bit M, B offset and negative result exponent
+    sensor, = parse_sdr_dump(full_record(0x05, "T", m=-2, b=3, b_exp=1, r_exp=-1))
+    assert (sensor.m, sensor.b, sensor.b_exp, sensor.r_exp) == (-2, 3, 1, -1)
+    assert abs(sensor.convert(10) - 1.0) < 1e-9
+    ones = SdrSensor(1, "T", 'temp', 1, 0, 0, 0, analog_format=1)
+    twos = SdrSensor(1, "T", 'temp', 1, 0, 0, 0, analog_format=2)
+    assert ones.convert(0xf5) == -10 and twos.convert(0xf6) == -10
+    assert ones.convert(0x7f) == twos.convert(0x7f) == 127
+
+
+def test_raw_readings_and_status_bits():
+    fan = SdrSensor(0x41, "FAN1", 'fan', 75, 0, 0, 0, 0)
+    assert parse_reading(fan, " 28 c0 00 00\n") == 3000
+    assert parse_reading(fan, " 28 e0 00 00\n") is None   # Reading unavailable
+    assert parse_reading(fan, "Unable to send RAW command") is None
+    assert reading_status(" 28 c0 00") == "ok"
+    assert reading_status(" 28 c0 01") == "nc"
+    assert reading_status(" 28 c0 12") == "cr"
+    assert reading_status(" 28 c0 24") == "nr"
+    assert reading_status(" 28 e0 00") == reading_status("") == "ns"
+
+
+def test_elist_parsing_and_fan_units():
+    output = ("CPU1 Temp        | 01h | ok  |  3.1 | 48 degrees C\n"
+              "Temp             | 02h | ok  |  7.1 | 30 degrees C\n"
+              "Temp             | 03h | ok  |  7.2 | 31 degrees C\n"
+              "CPU2 Temp        | 04h | ns  |  3.2 | No Reading\n"
+              "FAN1             | 41h | ok  | 29.1 | 3075 RPM\n"
+              "Fan 2            | 21h | ok  | 29.2 | 23.52 percent\n")
+    records = parse_sdr_elist(output, thresholds={"FAN1": {'lcr': 500}})
+    assert list(records) == ["CPU1 Temp", "Temp", "Temp (03h)", "CPU2 Temp", "FAN1", "Fan 2"]
+    assert records["CPU2 Temp"].kind == 'temp' and records["CPU2 Temp"].value is None
+    assert records["FAN1"].thresholds == {'lcr': 500}
+    temps, fans, units = split_readings(records)
+    assert temps == {"CPU1 Temp": 48, "Temp": 30, "Temp (03h)": 31, "CPU2 Temp": None}
+    assert fans == {"FAN1": 3075, "Fan 2": 23}
+    assert units == {"FAN1": "RPM", "Fan 2": "percent"}